@@ -1,127 +1,512 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Blueprint, Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
-import requests, joblib, os
+import os
+import json
+import time
 from pathlib import Path
-import pandas as pd, numpy as np
+import numpy as np
+import pandas as pd
+from model_registry import ModelRegistry
+import batch_io
+from train_jobs import TrainJobManager
+from data_store import load_table
+import upstream
+import allocation
+import features
+import forecast
+import backtest
+import price_index
+import feature_store
+import supply_analytics
+import metrics
 BASE = Path(__file__).resolve().parents[0]
 DATA_DIR = BASE / 'data'
 MODELS_DIR = BASE / 'models'
-app = Flask(__name__, static_folder='../frontend/build', static_url_path='/')
-CORS(app)
+api = Blueprint('api', __name__)
+registry = ModelRegistry(MODELS_DIR, max_price_models=int(os.environ.get('MAX_PRICE_MODELS', 32)))
+upstream_client = upstream.CachedUpstream()
+price_idx = price_index.PriceIndex(DATA_DIR / 'prices.csv')
+field_features = feature_store.SatelliteFeatures(DATA_DIR / 'satellite.csv')
+weather_asof = feature_store.WeatherAsOf(DATA_DIR / 'weather.csv')
+supply_idx = supply_analytics.SupplyIndex(DATA_DIR / 'supply.csv', DATA_DIR / 'demand.csv')
+trainer = TrainJobManager(DATA_DIR, MODELS_DIR, on_complete=lambda job: registry.evict())
 
-@app.route('/api/geocode')
+def proxy_response(value, cache_status):
+    resp = jsonify(value)
+    resp.headers['X-Cache'] = cache_status
+    return resp
+
+@api.route('/api/geocode')
 def geocode():
     q = request.args.get('q')
-    if not q:
+    if not q or not q.strip():
         return jsonify({'error':'missing q'}),400
-    url = 'https://nominatim.openstreetmap.org/search'
-    r = requests.get(url, params={'q':q,'format':'json','limit':1}, headers={'User-Agent':'agro-vision'})
-    return jsonify(r.json())
+    try:
+        return proxy_response(*upstream.geocode(upstream_client, q))
+    except upstream.UpstreamError as e:
+        return jsonify({'error':f'geocoding failed: {e}'}),502
 
-@app.route('/api/weather')
+@api.route('/api/weather')
 def weather():
     lat = request.args.get('lat'); lon = request.args.get('lon')
     if not lat or not lon: return jsonify({'error':'missing coords'}),400
-    url = 'https://api.open-meteo.com/v1/forecast'
-    params = {'latitude':lat,'longitude':lon,'daily':'temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max','timezone':'auto'}
-    r = requests.get(url, params=params, timeout=10)
-    return jsonify(r.json())
+    try:
+        return proxy_response(*upstream.forecast(upstream_client, lat, lon))
+    except ValueError as e:
+        return jsonify({'error':f'invalid coords: {e}'}),400
+    except upstream.UpstreamError as e:
+        return jsonify({'error':f'weather fetch failed: {e}'}),502
 
-@app.route('/api/train', methods=['POST'])
+@api.route('/api/train', methods=['POST'])
 def train():
-    sat = pd.read_csv(DATA_DIR / 'satellite.csv', parse_dates=['date'])
-    w = pd.read_csv(DATA_DIR / 'weather.csv', parse_dates=['date'])
-    prices = pd.read_csv(DATA_DIR / 'prices.csv', parse_dates=['date'])
-    df = sat.merge(w, on='date', how='left')
-    features = ['ndvi','evi','soil_moisture','pest_index','temp_max','temp_min','precip_mm','humidity','wind_speed']
-    df2 = df.dropna(subset=features)
-    X = df2[features]; y = (df2['health_label']=='healthy').astype(int)
-    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
-    clf = RandomForestClassifier(n_estimators=50, random_state=42)
-    clf.fit(X,y)
-    joblib.dump(clf, MODELS_DIR / 'crop_health_rf.joblib')
-    # prices
-    def make_lags(dfprices, n=7):
-        dfp = dfprices.sort_values('date').copy()
-        for lag in range(1,n+1):
-            dfp[f'lag_{lag}'] = dfp.groupby('crop')['price'].shift(lag)
-        return dfp.dropna()
-    prices_w = prices.merge(w, on='date', how='left')
-    pdf = make_lags(prices_w, n=7)
-    for c in pdf['crop'].unique():
-        sub = pdf[pdf['crop']==c].dropna()
-        feats = [f'lag_{i}' for i in range(1,8)] + ['temp_max','temp_min','precip_mm','humidity','wind_speed']
-        Xp = sub[feats]; yp = sub['price']
-        reg = RandomForestRegressor(n_estimators=50, random_state=42)
-        reg.fit(Xp, yp)
-        joblib.dump(reg, MODELS_DIR / f'price_rf_{c}.joblib')
-    return jsonify({'status':'trained'})
-
-@app.route('/api/predict/health', methods=['POST'])
+    job, coalesced = trainer.submit()
+    return jsonify({'status':job['status'],'job_id':job['job_id'],'coalesced':coalesced}),202
+
+@api.route('/api/train/status')
+def train_status_latest():
+    job = trainer.latest()
+    if job is None: return jsonify({'error':'no training job'}),404
+    return jsonify(job)
+
+@api.route('/api/train/<job_id>')
+def train_status(job_id):
+    job = trainer.get(job_id)
+    if job is None: return jsonify({'error':'unknown job'}),404
+    return jsonify(job)
+
+@api.route('/api/retrain/status')
+def retrain_status():
+    try:
+        with open(DATA_DIR / 'retrain_status.json') as f:
+            return jsonify(json.load(f))
+    except (OSError, ValueError):
+        return jsonify({'status':'pending','last_run':None})
+
+HEALTH_FEATURES = ['ndvi','evi','soil_moisture','pest_index','temp_max','temp_min','precip_mm','humidity','wind_speed']
+PRICE_WEATHER = ['temp_max','temp_min','precip_mm','humidity','wind_speed']
+N_LAGS = 7
+PRICE_COLUMNS = features.feature_columns(N_LAGS)+PRICE_WEATHER
+MAX_BATCH_ROWS = int(os.environ.get('MAX_BATCH_ROWS', 50000))
+
+def price_row(recent, weather, cols=PRICE_COLUMNS):
+    """Feature dict for one price prediction: the lag/rolling columns of `cols` from recent prices (as in training) + weather."""
+    row = features.history_row(recent, cols)
+    for k in cols:
+        if k not in row: row[k] = weather.get(k)
+    return row
+
+def model_columns(m, default):
+    return m.flat.feature_names or list(default)
+
+@api.route('/api/predict/health', methods=['POST'])
 def predict_health():
+    """Features in the body, or {"field_id": ...} to use the field's latest satellite features (body values override)."""
     data = request.json or {}
-    mp = MODELS_DIR / 'crop_health_rf.joblib'
-    if not mp.exists(): return jsonify({'error':'model missing'}),400
-    clf = joblib.load(mp)
-    keys = ['ndvi','evi','soil_moisture','pest_index','temp_max','temp_min','precip_mm','humidity','wind_speed']
-    X = np.array([[data.get(k) for k in keys]])
-    prob = clf.predict_proba(X)[0,1]
+    m = registry.health()
+    if m is None: return jsonify({'error':'model missing'}),400
+    field = None
+    if data.get('field_id') is not None:
+        field = field_features.features(data['field_id'])
+        if field is None: return jsonify({'error':f"unknown field_id {data['field_id']}"}),404
+        data = {**weather_asof.lookup(field['as_of'], HEALTH_FEATURES), **field, **data}
+    try: X = batch_io.row_vector(data, model_columns(m, HEALTH_FEATURES))
+    except (TypeError, ValueError) as e: return jsonify({'error':str(e)}),400
+    with metrics.stage('predict'): prob = m.flat.predict_proba(X)[0,1]
     label = 'healthy' if prob>0.5 else 'stressed'
-    return jsonify({'label':label,'probability':float(prob)})
+    out = {'label':label,'probability':float(prob),'model_version':m.version}
+    if field is not None:
+        out.update(field_id=data['field_id'], as_of=field['as_of'], features=field)
+    return jsonify(out)
+
+@api.route('/api/fields/<field_id>/features')
+def field_feature_lookup(field_id):
+    feats = field_features.features(field_id)
+    if feats is None: return jsonify({'error':f'unknown field_id {field_id}'}),404
+    return jsonify({'field_id':field_id, **feats})
+
+@api.route('/api/fields/observations', methods=['POST'])
+def field_observations():
+    """Push satellite rows (date, field_id, ndvi, evi, soil_moisture, pest_index) into the feature store."""
+    try:
+        rows = read_batch()
+        obs = pd.DataFrame.from_records([r for r in rows if isinstance(r, dict)])
+        missing = [c for c in ('date','field_id') if c not in obs.columns] if len(obs) else []
+        if missing: raise ValueError(f"missing columns: {', '.join(missing)}")
+        for c in feature_store.SIGNALS:
+            if c not in obs.columns: obs[c] = np.nan
+        field_features.sync()
+        applied = field_features.store.ingest(obs)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error':str(e)}),400
+    return jsonify({'received':len(rows),'applied':applied,'fields':len(field_features.store)})
 
-@app.route('/api/predict/price', methods=['POST'])
+@api.route('/api/predict/price', methods=['POST'])
 def predict_price():
     data = request.json or {}
     crop = data.get('crop'); recent = data.get('recent_prices',[]); weather = data.get('weather',{})
-    mp = MODELS_DIR / f'price_rf_{crop}.joblib'
-    if not mp.exists(): return jsonify({'error':'model missing'}),400
-    reg = joblib.load(mp)
-    n=7
-    if len(recent)<n:
-        recent = ([recent[0]]*(n-len(recent)))+recent if recent else [1000]*n
-    lags = recent[-n:][::-1]
-    row = {f'lag_{i+1}':lags[i] for i in range(n)}
-    for k in ['temp_max','temp_min','precip_mm','humidity','wind_speed']:
-        row[k] = weather.get(k)
-    import pandas as pd
-    X = pd.DataFrame([row])
-    pred = reg.predict(X)[0]
-    return jsonify({'price':float(pred)})
-
-@app.route('/api/prices')
+    try: m = registry.price(crop)
+    except ValueError as e: return jsonify({'error':str(e)}),400
+    if m is None: return jsonify({'error':'model missing'}),400
+    cols = model_columns(m, PRICE_COLUMNS)
+    try:
+        if not isinstance(weather, dict): raise ValueError('weather must be an object')
+        try: recent = batch_io.parse_recent_prices(recent)
+        except (TypeError, ValueError) as e: raise ValueError(f'recent_prices: {e}')
+        X = batch_io.row_vector(price_row(recent, weather, cols), cols)
+    except (TypeError, ValueError) as e: return jsonify({'error':str(e)}),400
+    with metrics.stage('predict'): pred = m.flat.predict(X)[0]
+    return jsonify({'price':float(pred),'model_version':m.version})
+
+def read_batch():
+    with metrics.stage('parse_batch'): rows = batch_io.parse_rows(request)
+    if len(rows)>MAX_BATCH_ROWS:
+        raise ValueError(f'batch too large ({len(rows)} rows, max {MAX_BATCH_ROWS})')
+    return rows
+
+@api.route('/api/predict/health/batch', methods=['POST'])
+def predict_health_batch():
+    try: rows = read_batch()
+    except ValueError as e: return jsonify({'error':str(e)}),400
+    m = registry.health()
+    if m is None: return jsonify({'error':'model missing'}),400
+    with metrics.stage('rows_to_matrix'):
+        X, valid, errors = batch_io.rows_to_matrix(rows, model_columns(m, HEALTH_FEATURES))
+    results = [{'index':i,'error':errors[i]} if i in errors else None for i in range(len(rows))]
+    if valid:
+        with metrics.stage('predict'): probs = m.flat.predict_proba(X)[:,1]
+        for i,prob in zip(valid, probs):
+            results[i] = {'index':i,'label':'healthy' if prob>0.5 else 'stressed','probability':float(prob)}
+    return jsonify({'results':results,'errors':len(errors),'model_version':m.version})
+
+@api.route('/api/predict/price/batch', methods=['POST'])
+def predict_price_batch():
+    try: rows = read_batch()
+    except ValueError as e: return jsonify({'error':str(e)}),400
+    results = [None]*len(rows)
+    by_crop = {}
+    for i,row in enumerate(rows):
+        if not isinstance(row, dict):
+            results[i] = {'index':i,'error':'row must be an object'}; continue
+        crop = row.get('crop')
+        if not crop:
+            results[i] = {'index':i,'crop':crop,'error':'missing crop'}; continue
+        try:
+            recent = batch_io.parse_recent_prices(row.get('recent_prices'))
+        except (TypeError, ValueError) as e:
+            results[i] = {'index':i,'crop':crop,'error':f'recent_prices: {e}'}; continue
+        # weather may be nested (JSON) or flat columns (CSV)
+        weather = row.get('weather') if isinstance(row.get('weather'), dict) else row
+        by_crop.setdefault(crop, []).append((i, recent, weather))
+    versions = {}
+    for crop,items in by_crop.items():
+        try: m = registry.price(crop)
+        except ValueError as e: m, err = None, str(e)
+        else: err = 'model missing'
+        if m is None:
+            for i,_,_ in items: results[i] = {'index':i,'crop':crop,'error':err}
+            continue
+        versions[crop] = m.version
+        cols = model_columns(m, PRICE_COLUMNS)
+        with metrics.stage('rows_to_matrix'):
+            try: rows = [price_row(recent, weather, cols) for _,recent,weather in items]
+            except ValueError as e:
+                for i,_,_ in items: results[i] = {'index':i,'crop':crop,'error':str(e)}
+                continue
+            X, valid, errors = batch_io.rows_to_matrix(rows, cols)
+        for j,msg in errors.items():
+            i = items[j][0]; results[i] = {'index':i,'crop':crop,'error':msg}
+        if valid:
+            with metrics.stage('predict'): preds = m.flat.predict(X)
+            for j,pred in zip(valid, preds):
+                i = items[j][0]; results[i] = {'index':i,'crop':crop,'price':float(pred)}
+    n_err = sum(1 for r in results if 'error' in r)
+    return jsonify({'results':results,'errors':n_err,'model_versions':versions})
+
+def forecast_interval(value):
+    """true -> default (lo, hi) quantiles, [lo, hi] -> as given, falsy -> no interval."""
+    if not value: return None
+    if value is True: return forecast.DEFAULT_INTERVAL
+    lo, hi = (float(v) for v in value)
+    if not 0<=lo<hi<=1: raise ValueError('interval must be [lo, hi] quantiles with 0 <= lo < hi <= 1')
+    return (lo, hi)
+
+@api.route('/api/forecast/price', methods=['POST'])
+def forecast_price():
+    """
+    {"horizon": 7, "interval": [0.1, 0.9], "series": [{"crop", "recent_prices", "weather"}, ...]}
+    (or a single series at the top level). Returns one N-day recursive forecast per series.
+    """
+    data = request.json or {}
+    series = data.get('series') if 'series' in data else [data]
+    try:
+        horizon = int(data.get('horizon', 7))
+        interval = forecast_interval(data.get('interval'))
+        if not 1<=horizon<=forecast.MAX_HORIZON:
+            raise ValueError(f'horizon must be between 1 and {forecast.MAX_HORIZON}')
+        if not isinstance(series, list) or len(series)>MAX_BATCH_ROWS:
+            raise ValueError(f'series must be a list of at most {MAX_BATCH_ROWS} objects')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error':str(e)}),400
+    results = [None]*len(series)
+    by_crop = {}
+    for i,s in enumerate(series):
+        crop = s.get('crop') if isinstance(s, dict) else None
+        if not crop:
+            results[i] = {'index':i,'crop':crop,'error':'missing crop'}; continue
+        try:
+            recent = batch_io.parse_recent_prices(s.get('recent_prices'))
+        except (TypeError, ValueError) as e:
+            results[i] = {'index':i,'crop':crop,'error':f'recent_prices: {e}'}; continue
+        by_crop.setdefault(crop, []).append((i, recent, s.get('weather')))
+    versions = {}
+    for crop,items in by_crop.items():
+        try: m = registry.price(crop)
+        except ValueError as e: m, err = None, str(e)
+        else: err = 'model missing'
+        if m is None:
+            for i,_,_ in items: results[i] = {'index':i,'crop':crop,'error':err}
+            continue
+        cols = model_columns(m, PRICE_COLUMNS)
+        try:
+            _, weather_idx = forecast.lag_layout(cols)
+        except ValueError as e:
+            for i,_,_ in items: results[i] = {'index':i,'crop':crop,'error':str(e)}
+            continue
+        weather_names = [cols[j] for j in weather_idx]
+        history = features.history_length(cols)
+        ok, windows, days, dates = [], [], [], []
+        for i,recent,w in items:
+            try: W, d = forecast.weather_days(w, horizon, weather_names)
+            except (TypeError, ValueError) as e:
+                results[i] = {'index':i,'crop':crop,'error':f'weather: {e}'}; continue
+            ok.append(i); windows.append(features.pad_recent(recent, history)); days.append(W); dates.append(d)
+        if not ok: continue
+        versions[crop] = m.version
+        with metrics.stage('forecast'):
+            out = forecast.recursive_forecast(m.flat, windows, np.stack(days), horizon, cols, interval)
+        for j,i in enumerate(ok):
+            res = {'index':i,'crop':crop,'prices':out['prices'][j].tolist()}
+            if interval:
+                res['lower'] = out['lower'][j].tolist(); res['upper'] = out['upper'][j].tolist()
+            if dates[j]: res['dates'] = dates[j]
+            results[i] = res
+    n_err = sum(1 for r in results if 'error' in r)
+    return jsonify({'horizon':horizon,'results':results,'errors':n_err,'model_versions':versions})
+
+@api.route('/api/models')
+def models():
+    return jsonify(registry.versions())
+
+def price_query(default_limit=None):
+    """crop/start/end/limit query args -> (crop, dates, prices); ValueError on bad input, LookupError on unknown crop."""
+    crop = request.args.get('crop','wheat')
+    start = request.args.get('start') or None; end = request.args.get('end') or None
+    limit = request.args.get('limit')
+    limit = int(limit) if limit else (default_limit if start is None and end is None else None)
+    if limit is not None and limit<1: raise ValueError('limit must be positive')
+    hit = price_idx.query(crop, start, end, limit)
+    if hit is None: raise LookupError(f'no prices for crop {crop!r}')
+    return crop, hit[0], hit[1]
+
+def conditional_json(payload, tag):
+    """jsonify with an ETag; answers 304 when If-None-Match already has it."""
+    resp = jsonify(payload)
+    resp.set_etag(tag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
+
+@api.route('/api/prices')
 def prices():
-    df = pd.read_csv(DATA_DIR / 'prices.csv')
-    last = df[df['crop']=='wheat'].sort_values('date').tail(7)['price'].tolist()
-    return jsonify(last)
+    """Latest prices for ?crop= (default wheat) as a plain list; ?start=&end=&limit= (default last 7)."""
+    try: crop, dates, values = price_query(default_limit=7)
+    except ValueError as e: return jsonify({'error':str(e)}),400
+    except LookupError as e: return jsonify({'error':str(e)}),404
+    return conditional_json(values.tolist(), price_index.etag(dates, values, extra=crop))
+
+@api.route('/api/prices/series')
+def price_series():
+    """{date, price} points for charts, downsampled to ?points= (default 500) with ?method=lttb|minmax|mean."""
+    try:
+        crop, dates, values = price_query()
+        n_points = min(int(request.args.get('points', 500)), price_index.MAX_POINTS)
+        method = request.args.get('method','lttb')
+        x, y = price_index.downsample(dates, values, n_points, method) if n_points>0 else (dates, values)
+    except ValueError as e: return jsonify({'error':str(e)}),400
+    except LookupError as e: return jsonify({'error':str(e)}),404
+    days = np.datetime_as_string(x.astype('datetime64[ns]'), unit='D').tolist()
+    payload = {'crop':crop,'count':int(len(dates)),'method':method if len(x)<len(dates) else None,
+               'points':[{'date':d,'price':p} for d,p in zip(days, y.tolist())]}
+    return conditional_json(payload, price_index.etag(x, y, extra=f'{crop}|{method}'))
+
+@api.route('/api/prices/crops')
+def price_crops():
+    return jsonify(price_idx.crops())
+
+@api.route('/api/backtest/summary')
+def backtest_summary():
+    mode = request.args.get('mode','expanding')
+    if mode not in backtest.MODES: return jsonify({'error':f'unknown mode {mode}'}),400
+    path = backtest.metrics_path(mode, DATA_DIR)
+    if not path.exists(): return jsonify({'error':f'no {mode} backtest has been run'}),404
+    table = load_table(path, copy=False)
+    out = {'mode':mode,'crops':backtest.summarize(table)}
+    crop = request.args.get('crop')
+    if crop:
+        rows = table[table['crop']==crop]
+        out['windows'] = json.loads(rows.to_json(orient='records'))
+    return jsonify(out)
+
+def region_coords(regions):
+    """{'name': {'lat':..,'lon':..}} or {'name': [lat, lon]} -> {'name': (lat, lon)}"""
+    out = {}
+    for name,v in (regions or {}).items():
+        lat, lon = (v.get('lat'), v.get('lon')) if isinstance(v, dict) else v
+        out[name] = (float(lat), float(lon))
+    return out
 
-@app.route('/api/supply', methods=['POST'])
+@api.route('/api/supply', methods=['POST'])
 def supply_alloc():
     data = request.json or {}
     demand = data.get('demand',{})
-    df = pd.read_csv(DATA_DIR / 'supply.csv')
-    df['remaining'] = df['capacity']
-    alloc = []
-    for region,d in demand.items():
-        rem=d
-        for idx,row in df.sort_values('capacity',ascending=False).iterrows():
-            if rem<=0: break
-            take = min(row['remaining'], rem)
-            if take>0:
-                alloc.append({'region':region,'warehouse':row['warehouse_id'],'allocated':int(take)})
-                df.at[idx,'remaining'] -= take
-                rem -= take
-        if rem>0:
-            alloc.append({'region':region,'warehouse':None,'allocated':int(rem),'note':'unfulfilled'})
+    supply_idx.flush()  # capacity PUTs still in the journal
+    df = load_table(DATA_DIR / 'supply.csv', copy=False)
+    try:
+        coords = region_coords(data.get('regions'))
+        alloc = allocation.allocate(df, demand, mode=data.get('mode','greedy'), region_coords=coords,
+                                     k=int(data['k']) if data.get('k') else None)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error':str(e)}),400
     return jsonify({'allocations':alloc})
 
+@api.route('/api/supply/summary')
+def supply_summary():
+    """Capacity/demand totals, deficit/surplus region counts and the ?top= (default 10) worst deficits."""
+    try: top = int(request.args.get('top', 10))
+    except ValueError as e: return jsonify({'error':str(e)}),400
+    supply_idx.sync()
+    return jsonify(supply_idx.summary(top=max(top, 0)))
+
+@api.route('/api/supply/regions')
+def supply_regions():
+    """Per-region rows, ?status=deficit|surplus, ?sort=deficit|demand|capacity|region, ?limit= (default 50), ?offset=."""
+    try:
+        limit = int(request.args.get('limit', 50)); offset = int(request.args.get('offset', 0))
+        if limit<1 or offset<0: raise ValueError('limit must be positive and offset non-negative')
+        supply_idx.sync()
+        total, rows = supply_idx.regions(status=request.args.get('status') or None,
+                                         sort=request.args.get('sort','deficit'), limit=limit, offset=offset)
+    except ValueError as e: return jsonify({'error':str(e)}),400
+    return jsonify({'total':total,'offset':offset,'regions':rows})
+
+@api.route('/api/supply/regions/<region>')
+def supply_region(region):
+    supply_idx.sync()
+    row = supply_idx.region(region)
+    if row is None: return jsonify({'error':f'unknown region {region}'}),404
+    return jsonify(row)
+
+@api.route('/api/supply/demand', methods=['PUT'])
+def supply_set_demand():
+    """{region, demand}: updates that region's aggregates; persisted through the supply journal."""
+    data = request.json or {}
+    try:
+        if not data.get('region'): raise ValueError('missing region')
+        if data.get('demand') is None: raise ValueError('missing demand')
+        demand = float(data['demand'])
+        if not np.isfinite(demand) or demand<0: raise ValueError('demand must be a non-negative number')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error':str(e)}),400
+    row = supply_idx.update_demand(data['region'], demand)
+    return jsonify(row)
+
+@api.route('/api/supply/capacity', methods=['PUT'])
+def supply_set_capacity():
+    """{warehouse_id, capacity[, region]}: updates the warehouse's region aggregates; persisted through the supply journal."""
+    data = request.json or {}
+    try:
+        if not data.get('warehouse_id'): raise ValueError('missing warehouse_id')
+        if data.get('capacity') is None: raise ValueError('missing capacity')
+        capacity = float(data['capacity'])
+        if not np.isfinite(capacity) or capacity<0: raise ValueError('capacity must be a non-negative number')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error':str(e)}),400
+    try:
+        row = supply_idx.update_capacity(data['warehouse_id'], capacity, region=data.get('region'))
+    except KeyError as e:
+        return jsonify({'error':e.args[0]}),404
+    return jsonify(row)
+
+# --------------------------------------------------------------------------------
+# WARM-UP / HEALTH CHECKS
+# --------------------------------------------------------------------------------
+WARM_TABLES = ['prices.csv','satellite.csv','weather.csv','supply.csv']
+warmup_state = {'status':'cold','started':None,'finished':None,'seconds':None,'models':{},'tables':[],'errors':[]}
+
+def warm_up():
+    """
+    Load the models, data tables and derived indexes the endpoints use, so the first requests
+    after a start don't pay for them. Under gunicorn --preload this runs once in the master and
+    the forked workers inherit everything (models and columnar tables are memory-mapped files).
+    """
+    t0 = time.perf_counter()
+    warmup_state.update(status='warming', started=time.strftime('%Y-%m-%d %H:%M:%S'), tables=[], errors=[])
+    try:
+        warmup_state['models'] = registry.preload()
+    except Exception as e:
+        warmup_state['errors'].append(f'models: {e}')
+    for name in WARM_TABLES:
+        try:
+            load_table(DATA_DIR / name, copy=False)
+            warmup_state['tables'].append(name)
+        except Exception as e:
+            warmup_state['errors'].append(f'{name}: {e}')
+    for label, fn in (('price index', price_idx.crops), ('field features', field_features.sync),
+                      ('weather as-of', weather_asof.sync), ('supply index', supply_idx.sync)):
+        try: fn()
+        except Exception as e: warmup_state['errors'].append(f'{label}: {e}')
+    warmup_state.update(status='ready', finished=time.strftime('%Y-%m-%d %H:%M:%S'),
+                        seconds=round(time.perf_counter()-t0, 3))
+    for err in warmup_state['errors']:
+        print(f"⚠️ Warm-up: {err}")
+    print(f"✅ Warm-up done in {warmup_state['seconds']}s: {len(warmup_state['models'])} models, {len(warmup_state['tables'])} tables")
+    return warmup_state
+
+@api.route('/healthz')
+def liveness():
+    """Liveness: the process is up and answering."""
+    return jsonify({'status':'alive','pid':os.getpid()})
+
+@api.route('/readyz')
+def readiness():
+    """Readiness: 200 once warm-up has finished (errors are listed, not fatal), 503 before."""
+    body = {**warmup_state, 'pid':os.getpid(), 'loaded_models':registry.versions()}
+    return jsonify(body),(200 if warmup_state['status']=='ready' else 503)
+
+@api.route('/metrics')
+def prometheus():
+    """Prometheus text format: this process plus the other workers' / batch jobs' snapshots in METRICS_DIR."""
+    return Response(metrics.render(), mimetype='text/plain')
+
 # serve react build
-@app.route('/', defaults={'path':''})
-@app.route('/<path:path>')
+@api.route('/', defaults={'path':''})
+@api.route('/<path:path>')
 def serve(path):
     build = BASE.parent / 'frontend' / 'build'
     if path!="" and (build / path).exists():
         return send_from_directory(str(build), path)
     return send_from_directory(str(build), 'index.html')
 
+def create_app(warm=True):
+    """App factory. warm=False skips warm_up() (models and tables then load on first use)."""
+    app = Flask(__name__, static_folder='../frontend/build', static_url_path='/')
+    CORS(app, expose_headers=['ETag','X-Cache'])
+    app.register_blueprint(api)
+    metrics.init_app(app)
+    if warm:
+        warm_up()
+    return app
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # development server; production runs wsgi:app under gunicorn (see gunicorn.conf.py).
+    # With the reloader only the serving child warms up, not the watcher process.
+    create_app(warm=os.environ.get('WERKZEUG_RUN_MAIN') == 'true').run(debug=True, port=5000)
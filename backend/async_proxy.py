@@ -0,0 +1,222 @@
+# backend/async_proxy.py
+# Event-loop server for the third-party proxy routes, /api/geocode and /api/weather.
+# Under the Flask app every upstream call holds a worker thread for up to UPSTREAM_TIMEOUT, so a
+# slow Nominatim/Open-Meteo can starve the prediction endpoints. Here an upstream call is just an
+# awaited socket: one process holds thousands of them, and the CPU-bound routes keep their workers.
+# Responses, cache keys, TTLs and X-Cache statuses are the same as upstream.CachedUpstream's.
+#
+# Upstream connections are pooled in one aiohttp session, capped in total and per host; every call
+# has a total and a connect timeout. A request whose client disconnects is cancelled, and so is
+# its upstream call once no other (coalesced) request is waiting for it.
+#
+#   python async_proxy.py --port 5001     (route /api/geocode and /api/weather here)
+
+import asyncio
+import os
+import time
+
+import aiohttp
+from aiohttp import web
+
+try:
+    import metrics
+    import upstream
+except ImportError:  # imported as backend.async_proxy from the repo root
+    from backend import metrics, upstream
+
+PROXY_PORT = int(os.environ.get("PROXY_PORT", 5001))
+MAX_CONNECTIONS = int(os.environ.get("UPSTREAM_MAX_CONNECTIONS", 1000))
+MAX_PER_HOST = int(os.environ.get("UPSTREAM_MAX_PER_HOST", 64))
+CONNECT_TIMEOUT = float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT", 3))
+
+
+class AsyncUpstream:
+    """
+    asyncio counterpart of upstream.CachedUpstream. `fetch(key, ttl, url, params)` returns
+    (value, cache_status) with the same HIT / MISS / COALESCED / STALE statuses.
+    """
+
+    def __init__(self, cache=None, limit=MAX_CONNECTIONS, limit_per_host=MAX_PER_HOST,
+                 timeout=upstream.UPSTREAM_TIMEOUT, connect_timeout=CONNECT_TIMEOUT):
+        self.cache = cache or upstream.TTLCache()
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=connect_timeout)
+        self.session = None
+        self._inflight = {}
+
+    async def start(self):
+        # waiting for a free pooled connection counts against the total timeout
+        connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                             headers={"User-Agent": upstream.USER_AGENT})
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def get_json(self, url, params):
+        try:
+            async with self.session.get(url, params=params) as r:
+                if r.status >= 400:
+                    raise upstream.UpstreamError(f"{url} returned {r.status}", status=r.status)
+                try:
+                    return await r.json(content_type=None)
+                except ValueError:
+                    raise upstream.UpstreamError(f"{url} returned invalid JSON", status=r.status)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise upstream.UpstreamError(str(e) or type(e).__name__)
+
+    async def _call(self, service, url, params):
+        with metrics.upstream_call(service):
+            return await self.get_json(url, params)
+
+    def _landed(self, key, task, ttl):
+        if self._inflight.get(key, {}).get("task") is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is None:
+            self.cache.set(key, task.result(), ttl)
+
+    async def fetch(self, key, ttl, url, params):
+        service = upstream.service_of(key)
+        try:
+            value, status = await self._fetch(key, ttl, url, params)
+        except upstream.UpstreamError:
+            metrics.cache_result(service, "error")
+            raise
+        metrics.cache_result(service, status.lower())
+        return value, status
+
+    async def _fetch(self, key, ttl, url, params):
+        hit = self.cache.get(key)
+        if hit is not None and hit[1]:
+            return hit[0], "HIT"
+        flight = self._inflight.get(key)
+        leader = flight is None
+        if leader:
+            task = asyncio.ensure_future(self._call(upstream.service_of(key), url, params))
+            flight = self._inflight[key] = {"task": task, "waiters": 0}
+            task.add_done_callback(lambda t: self._landed(key, t, ttl))
+        flight["waiters"] += 1
+        try:
+            # shielded: one waiter being cancelled must not cancel the call for the others
+            value = await asyncio.shield(flight["task"])
+            return value, "MISS" if leader else "COALESCED"
+        except asyncio.CancelledError:
+            if flight["waiters"] == 1 and not flight["task"].done():
+                flight["task"].cancel()
+            raise
+        except upstream.UpstreamError as e:
+            if hit is not None:
+                if leader:
+                    print(f"⚠️ Upstream failed for {key} ({e}); serving stale response")
+                return hit[0], "STALE"
+            raise
+        finally:
+            flight["waiters"] -= 1
+
+
+# --------------------------------------------------------------------------------
+# ROUTES
+# --------------------------------------------------------------------------------
+UPSTREAM = web.AppKey("upstream", AsyncUpstream)
+
+
+def proxy_response(value, cache_status):
+    return web.json_response(value, headers={"X-Cache": cache_status})
+
+
+async def geocode(request):
+    q = request.query.get("q")
+    if not q or not q.strip():
+        return web.json_response({"error": "missing q"}, status=400)
+    key, url, params = upstream.geocode_request(q)
+    try:
+        return proxy_response(*await request.app[UPSTREAM].fetch(key, upstream.GEOCODE_TTL, url, params))
+    except upstream.UpstreamError as e:
+        return web.json_response({"error": f"geocoding failed: {e}"}, status=502)
+
+
+async def weather(request):
+    lat, lon = request.query.get("lat"), request.query.get("lon")
+    if not lat or not lon:
+        return web.json_response({"error": "missing coords"}, status=400)
+    try:
+        key, url, params = upstream.forecast_request(lat, lon)
+    except ValueError as e:
+        return web.json_response({"error": f"invalid coords: {e}"}, status=400)
+    try:
+        return proxy_response(*await request.app[UPSTREAM].fetch(key, upstream.WEATHER_TTL, url, params))
+    except upstream.UpstreamError as e:
+        return web.json_response({"error": f"weather fetch failed: {e}"}, status=502)
+
+
+async def liveness(request):
+    client = request.app[UPSTREAM]
+    return web.json_response({"status": "alive", "pid": os.getpid(), "inflight": len(client._inflight),
+                              "cached": len(client.cache)})
+
+
+async def prometheus(request):
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+
+@web.middleware
+async def instrument(request, handler):
+    # same series as metrics.init_app on the Flask app, labelled by route template
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        resp = await handler(request)
+        status = resp.status
+        return resp
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    except asyncio.CancelledError:
+        status = 499  # client went away
+        raise
+    finally:
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource is not None else "<unmatched>"
+        metrics.HTTP_SECONDS.labels(route, request.method).observe(time.perf_counter() - t0)
+        metrics.HTTP_REQUESTS.labels(route, request.method, str(status)).inc()
+        metrics.ensure_flusher()
+
+
+@web.middleware
+async def cors(request, handler):
+    # same headers flask-cors adds on the Flask app (GET only, so no preflight)
+    resp = await handler(request)
+    resp.headers["Access-Control-Allow-Origin"] = "*"
+    resp.headers["Access-Control-Expose-Headers"] = "X-Cache"
+    return resp
+
+
+def create_app(client=None):
+    app = web.Application(middlewares=[cors, instrument])
+    app[UPSTREAM] = client or AsyncUpstream()
+
+    async def start(app):
+        await app[UPSTREAM].start()
+
+    async def close(app):
+        await app[UPSTREAM].close()
+
+    app.on_startup.append(start)
+    app.on_cleanup.append(close)
+    app.router.add_get("/api/geocode", geocode)
+    app.router.add_get("/api/weather", weather)
+    app.router.add_get("/healthz", liveness)
+    app.router.add_get("/metrics", prometheus)
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Async server for the geocode/weather proxy routes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=PROXY_PORT)
+    args = parser.parse_args()
+    # handler_cancellation: a client disconnect cancels its handler (and, above, its upstream call)
+    web.run_app(create_app(), host=args.host, port=args.port, backlog=4096, handler_cancellation=True)
@@ -0,0 +1,236 @@
+# backend/backtest.py
+# Rolling / expanding-window backtests of the per-crop price models.
+# Each crop's rows of prices_model_ready.csv (the make_price_lags output) are cut into calendar
+# windows of `step_days` once `min_train_days` of history exist. A fold trains on everything before
+# its window ("expanding") or on the last `train_days` ("rolling") and scores the window.
+# All folds of a crop index into the same lag matrix. Fold results are cached under a hash of their
+# train/test rows and parameters, so a new day only re-scores the window it lands in.
+#
+#   python backtest.py --mode expanding --step-days 7   -> data/backtest_expanding.csv
+
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+try:
+    from data_store import load_table, write_csv_atomic
+    from pipeline import digest
+    import train_price_model as tpm
+except ImportError:  # imported as backend.backtest from the repo root
+    from backend.data_store import load_table, write_csv_atomic
+    from backend.pipeline import digest
+    import backend.train_price_model as tpm
+
+BASE = Path(__file__).resolve().parents[0]
+DATA_DIR = BASE / "data"
+CACHE_FILE = DATA_DIR / "backtest_cache.json"
+MODES = ("expanding", "rolling")
+MIN_TRAIN_ROWS = 30
+BACKTEST_TREES = int(os.environ.get("BACKTEST_TREES", tpm.RF_PARAMS["n_estimators"]))
+
+
+def metrics_path(mode, data_dir=DATA_DIR):
+    return Path(data_dir) / f"backtest_{mode}.csv"
+
+
+def plan_folds(dates, step_days=7, min_train_days=90, train_days=365, mode="expanding",
+               min_train_rows=MIN_TRAIN_ROWS):
+    """
+    Row ranges over date-sorted `dates`: [(train_lo, train_hi, test_lo, test_hi, window_start)].
+    Windows are anchored at first date + min_train_days, so they don't move as data is appended.
+    """
+    if mode not in MODES:
+        raise ValueError(f"unknown mode {mode!r} (expected one of {', '.join(MODES)})")
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    if not len(dates):
+        return []
+    step = np.timedelta64(step_days, "D")
+    origin = dates[0].astype("datetime64[D]") + np.timedelta64(min_train_days, "D")
+    starts = np.arange(origin, dates[-1].astype("datetime64[D]") + np.timedelta64(1, "D"), step).astype("datetime64[ns]")
+    test_lo = np.searchsorted(dates, starts, side="left")
+    test_hi = np.searchsorted(dates, starts + step, side="left")
+    if mode == "expanding":
+        train_lo = np.zeros_like(test_lo)
+    else:
+        train_lo = np.searchsorted(dates, starts - np.timedelta64(train_days, "D"), side="left")
+    folds = []
+    for lo, hi, a, b, ws in zip(train_lo, test_lo, test_lo, test_hi, starts):
+        if b > a and hi - lo >= min_train_rows:
+            folds.append((int(lo), int(hi), int(a), int(b), ws))
+    return folds
+
+
+def range_digests(row_hash, ranges):
+    """
+    {(lo, hi): sha1 of row_hash[lo:hi]'s bytes}. Ranges that share a start (every expanding train
+    window starts at row 0) are fed through one running sha1, read off at each end, so they cost
+    one pass over the rows together instead of one pass each.
+    """
+    row_hash = np.ascontiguousarray(row_hash)
+    ends = {}
+    for lo, hi in ranges:
+        ends.setdefault(lo, set()).add(hi)
+    out = {}
+    for lo, his in ends.items():
+        h, pos = hashlib.sha1(), lo
+        for hi in sorted(his):
+            h.update(row_hash[pos:hi])
+            pos = hi
+            out[lo, hi] = h.hexdigest()
+    return out
+
+
+def score_fold(data, train_lo, train_hi, test_lo, test_hi, rf_params, n_jobs=1):
+    """Fit on data[train_lo:train_hi], score data[test_lo:test_hi]. Last column is the price, first is lag_1."""
+    t0 = time.perf_counter()
+    X, y = data[:, :-1], data[:, -1]
+    model = RandomForestRegressor(**rf_params, n_jobs=n_jobs)
+    model.fit(X[train_lo:train_hi], y[train_lo:train_hi])
+    actual = y[test_lo:test_hi]
+    err = model.predict(X[test_lo:test_hi]) - actual
+    naive = X[test_lo:test_hi, 0] - actual
+    nonzero = actual != 0
+    return {
+        "mae": float(np.abs(err).mean()),
+        "rmse": float(np.sqrt((err ** 2).mean())),
+        "mape": float(np.abs(err[nonzero] / actual[nonzero]).mean() * 100) if nonzero.any() else None,
+        "bias": float(err.mean()),
+        "naive_mae": float(np.abs(naive).mean()),
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+
+
+def _score_mapped(matrix_path, offset, fold, rf_params):
+    data = np.load(matrix_path, mmap_mode="r")
+    lo, hi, a, b = (offset + i for i in fold[:4])
+    return score_fold(data, lo, hi, a, b, rf_params)
+
+
+def _load_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(path, cache):
+    tmp = Path(path).with_name(f".{Path(path).name}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp, path)
+
+
+def run_backtest(input_csv=None, mode="expanding", step_days=7, min_train_days=90, train_days=365,
+                 n_lags=7, n_estimators=None, workers=None, data_dir=DATA_DIR, cache_file=None):
+    """
+    Backtests every crop and writes the per-crop, per-window table to data/backtest_<mode>.csv.
+    Folds missing from the cache are scored in a spawn pool (BACKTEST_WORKERS / TRAIN_CROP_WORKERS).
+    Returns the table as a DataFrame.
+    """
+    data_dir = Path(data_dir)
+    input_csv = input_csv or data_dir / "prices_model_ready.csv"
+    cache_file = Path(cache_file or data_dir / CACHE_FILE.name)
+    rf_params = {**tpm.RF_PARAMS, "n_estimators": n_estimators or BACKTEST_TREES}
+    params = {"mode": mode, "step_days": step_days, "min_train_days": min_train_days,
+              "train_days": train_days if mode == "rolling" else None, "n_lags": n_lags, "rf": rf_params}
+    columns = tpm.feature_columns(n_lags) + ["price"]
+
+    df = load_table(input_csv, copy=False)
+    cache = _load_cache(cache_file)
+    records, blocks, pending, used = [], [], [], set()
+    for crop, sub in tpm.crop_frames(df, n_lags):
+        sub = sub.sort_values("date", kind="stable")
+        row_hash = pd.util.hash_pandas_object(sub[columns], index=False).to_numpy()
+        dates = sub["date"].to_numpy(dtype="datetime64[ns]")
+        folds = plan_folds(dates, step_days, min_train_days, train_days, mode)
+        hashes = range_digests(row_hash, [f[:2] for f in folds] + [f[2:4] for f in folds])
+        for fold in folds:
+            lo, hi, a, b, ws = fold
+            fp = digest({"params": params, "train": hashes[lo, hi], "test": hashes[a, b]})
+            used.add(fp)
+            rec = {"crop": str(crop), "mode": mode, "window_start": str(ws.astype("datetime64[D]")),
+                   "window_end": str(dates[b - 1].astype("datetime64[D]")), "n_train": hi - lo, "n_test": b - a}
+            if fp in cache:
+                rec.update(cache[fp]["metrics"], cached=True)
+            else:
+                pending.append((len(records), len(blocks), fold, fp))
+            records.append(rec)
+        blocks.append(sub[columns].to_numpy(dtype=np.float64))
+
+    print(f"🧪 Backtest ({mode}): {len(records)} windows, {len(pending)} to score, {len(records) - len(pending)} cached")
+    workers = workers or int(os.environ.get("BACKTEST_WORKERS", 0)) or None
+    workers, _ = tpm.parallel_plan(len(pending), workers, 1)
+
+    def done(item, metrics):
+        i, _, _, fp = item
+        records[i].update(metrics, cached=False)
+        cache[fp] = {"mode": mode, "metrics": metrics}
+
+    if pending and workers == 1:
+        for item in pending:
+            done(item, score_fold(blocks[item[1]], *item[2][:4], rf_params))
+    elif pending:
+        with tpm.mapped_matrix(blocks, len(columns), "backtest_") as (matrix_path, bounds):
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=min(workers, len(pending)), mp_context=ctx) as pool:
+                futures = {pool.submit(_score_mapped, matrix_path, int(bounds[item[1]]), item[2][:4], rf_params): item
+                           for item in pending}
+                for fut in as_completed(futures):
+                    done(futures[fut], fut.result())
+
+    # keep other modes' folds; drop this mode's folds that no longer exist
+    cache = {fp: v for fp, v in cache.items() if v.get("mode") != mode or fp in used}
+    _save_cache(cache_file, cache)
+    table = pd.DataFrame.from_records(records)
+    write_csv_atomic(table, metrics_path(mode, data_dir))
+    return table
+
+
+def summarize(table):
+    """Per-crop summary of a backtest table: test-row-weighted MAE/RMSE, naive baseline and skill."""
+    out = []
+    if table is None or not len(table):
+        return out
+    for crop, g in table.groupby("crop", observed=True, sort=True):
+        g = g.sort_values("window_start")
+        w = g["n_test"].to_numpy(dtype=np.float64)
+        mae = float(np.average(g["mae"], weights=w))
+        naive = float(np.average(g["naive_mae"], weights=w))
+        out.append({
+            "crop": str(crop),
+            "windows": int(len(g)),
+            "test_rows": int(w.sum()),
+            "mae": round(mae, 3),
+            "rmse": round(float(np.sqrt(np.average(np.square(g["rmse"]), weights=w))), 3),
+            "naive_mae": round(naive, 3),
+            # > 0 means the model beats "tomorrow = today"
+            "skill": round(1 - mae / naive, 4) if naive else None,
+            "last_window": str(g["window_start"].iloc[-1]),
+            "last_mae": round(float(g["mae"].iloc[-1]), 3),
+        })
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Rolling-window backtest of the price models")
+    parser.add_argument("--mode", choices=MODES, default="expanding")
+    parser.add_argument("--step-days", type=int, default=7)
+    parser.add_argument("--min-train-days", type=int, default=90)
+    parser.add_argument("--train-days", type=int, default=365, help="rolling mode training window")
+    parser.add_argument("--trees", type=int, default=None, help=f"trees per fold (default {BACKTEST_TREES})")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    table = run_backtest(mode=args.mode, step_days=args.step_days, min_train_days=args.min_train_days,
+                         train_days=args.train_days, n_estimators=args.trees, workers=args.workers)
+    for row in summarize(table):
+        print(row)
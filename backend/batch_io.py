@@ -0,0 +1,124 @@
+# backend/batch_io.py
+# Parsing and validation helpers for the batch prediction endpoints.
+# Rows can arrive as a JSON list, {"rows": [...]}, NDJSON, or CSV (raw body or a multipart `file` upload).
+
+import csv
+import io
+import json
+import math
+
+import numpy as np
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines")
+
+
+def _parse_ndjson(text):
+    rows = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            rows.append(json.loads(line))
+    return rows
+
+
+def _parse_csv(text):
+    return [dict(r) for r in csv.DictReader(io.StringIO(text))]
+
+
+def parse_rows(req):
+    """
+    Extract a list of row dicts from a Flask request.
+    Raises ValueError if the payload can't be read as rows.
+    """
+    upload = req.files.get("file")
+    if upload is not None:
+        text = upload.read().decode("utf-8-sig")
+        name = (upload.filename or "").lower()
+        if name.endswith((".ndjson", ".jsonl")) or (upload.mimetype or "") in NDJSON_TYPES:
+            return _parse_ndjson(text)
+        return _parse_csv(text)
+
+    ctype = (req.mimetype or "").lower()
+    try:
+        if ctype in NDJSON_TYPES:
+            return _parse_ndjson(req.get_data(as_text=True))
+        if ctype == "text/csv":
+            return _parse_csv(req.get_data(as_text=True))
+        data = req.get_json(force=True, silent=True)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"could not parse rows: {e}")
+    if data is None:
+        raise ValueError("could not parse rows: body is not valid JSON")
+    if isinstance(data, dict):
+        data = data.get("rows")
+    if not isinstance(data, list):
+        raise ValueError("expected a list of rows or {'rows': [...]}")
+    return data
+
+
+def to_float(value):
+    """Convert a JSON/CSV cell to a finite float; raises ValueError otherwise."""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        raise ValueError("missing value")
+    if isinstance(value, bool):
+        raise ValueError("boolean is not a number")
+    f = float(value)
+    if not math.isfinite(f):
+        raise ValueError("value is not finite")
+    return f
+
+
+def rows_to_matrix(rows, keys):
+    """
+    Build one float matrix from `rows` using columns `keys`.
+    Returns (X, valid_idx, errors) where X holds only the rows that validated, valid_idx maps
+    X's rows back to positions in `rows`, and errors maps input position -> message.
+    """
+    X = np.empty((len(rows), len(keys)), dtype=np.float64)
+    valid_idx, errors = [], {}
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors[i] = "row must be an object"
+            continue
+        n = len(valid_idx)
+        try:
+            for j, k in enumerate(keys):
+                try:
+                    X[n, j] = to_float(row.get(k))
+                except (TypeError, ValueError) as e:
+                    raise ValueError(f"{k}: {e}")
+        except ValueError as e:
+            errors[i] = str(e)
+            continue
+        valid_idx.append(i)
+    return X[:len(valid_idx)], valid_idx, errors
+
+
+def row_vector(row, keys):
+    """
+    (1, len(keys)) float matrix for a single-row request, validated like rows_to_matrix; raises
+    ValueError naming every missing or invalid field instead of only the first.
+    """
+    X, valid, errors = rows_to_matrix([row], keys)
+    if valid:
+        return X
+    if not isinstance(row, dict):
+        raise ValueError(errors[0])
+    bad = []
+    for k in keys:
+        try:
+            to_float(row.get(k))
+        except (TypeError, ValueError) as e:
+            bad.append(f"{k}: {e}")
+    raise ValueError("; ".join(bad))
+
+
+def parse_recent_prices(value):
+    """recent_prices as a JSON list, or a ';' / space separated string from CSV uploads."""
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        value = value.replace(";", " ").replace(",", " ").split()
+    if not isinstance(value, (list, tuple)):
+        raise ValueError("recent_prices must be a list")
+    return [to_float(v) for v in value]
@@ -0,0 +1,85 @@
+# backend/benchmarks/bench_allocation.py
+# Compares the /api/supply allocation modes on synthetic warehouses/regions.
+# Run from backend/:  python -m benchmarks.bench_allocation --warehouses 20000 --regions 20000
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from allocation import allocate
+
+
+def legacy_alloc(df, demand):
+    """The original iterrows loop from app.supply_alloc, kept for comparison on small inputs."""
+    df = df.copy()
+    df["remaining"] = df["capacity"]
+    alloc = []
+    for region, d in demand.items():
+        rem = d
+        for idx, row in df.sort_values("capacity", ascending=False, kind="stable").iterrows():
+            if rem <= 0:
+                break
+            take = min(row["remaining"], rem)
+            if take > 0:
+                alloc.append({"region": region, "warehouse": row["warehouse_id"], "allocated": int(take)})
+                df.at[idx, "remaining"] -= take
+                rem -= take
+        if rem > 0:
+            alloc.append({"region": region, "warehouse": None, "allocated": int(rem), "note": "unfulfilled"})
+    return alloc
+
+
+def synthetic(n_warehouses, n_regions, seed=0):
+    rng = np.random.default_rng(seed)
+    supply = pd.DataFrame({
+        "warehouse_id": [f"W{i}" for i in range(n_warehouses)],
+        "location": "synthetic",
+        "capacity": rng.integers(500, 20000, n_warehouses),
+        "lat": rng.uniform(8, 35, n_warehouses),
+        "lon": rng.uniform(68, 97, n_warehouses),
+    })
+    regions = [f"R{i}" for i in range(n_regions)]
+    # total demand ~90% of capacity so every mode has real work to do
+    dem = rng.integers(100, 10000, n_regions).astype(float)
+    dem *= 0.9 * supply["capacity"].sum() / dem.sum()
+    demand = dict(zip(regions, np.floor(dem).astype(int).tolist()))
+    coords = dict(zip(regions, zip(rng.uniform(8, 35, n_regions), rng.uniform(68, 97, n_regions))))
+    return supply, demand, coords
+
+
+def total_km(alloc):
+    return sum(a["allocated"] * a.get("distance_km", 0) for a in alloc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark supply allocation modes")
+    parser.add_argument("--warehouses", type=int, default=20000)
+    parser.add_argument("--regions", type=int, default=20000)
+    parser.add_argument("--legacy-max", type=int, default=300, help="only run the iterrows loop up to this size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    supply, demand, coords = synthetic(args.warehouses, args.regions, args.seed)
+    print(f"{args.warehouses} warehouses, {args.regions} regions")
+    print(f"{'mode':<10}{'seconds':>10}{'rows':>10}{'unfulfilled':>14}{'unit-km':>16}")
+    results = {}
+    for mode in ("greedy", "nearest", "optimal"):
+        t0 = time.perf_counter()
+        alloc = allocate(supply, demand, mode=mode, region_coords=coords)
+        dt = time.perf_counter() - t0
+        short = sum(a["allocated"] for a in alloc if a["warehouse"] is None)
+        results[mode] = alloc
+        print(f"{mode:<10}{dt:>10.3f}{len(alloc):>10}{short:>14}{total_km(alloc):>16.0f}")
+
+    if max(args.warehouses, args.regions) <= args.legacy_max:
+        t0 = time.perf_counter()
+        legacy = legacy_alloc(supply, demand)
+        dt = time.perf_counter() - t0
+        print(f"{'legacy':<10}{dt:>10.3f}{len(legacy):>10}")
+        print("greedy matches legacy:", legacy == results["greedy"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# backend/benchmarks/bench_feature_store.py
+# Daily ingest and lookup cost of feature_store.FieldFeatureStore at 100k fields x 1 year.
+# Run from backend/:  python -m benchmarks.bench_feature_store --fields 100000 --days 365
+
+import argparse
+import resource
+import time
+
+import numpy as np
+import pandas as pd
+
+from feature_store import SIGNALS, FieldFeatureStore, rolling_features
+
+
+def daily_batch(rng, field_ids, day):
+    n = len(field_ids)
+    df = pd.DataFrame({"date": np.full(n, day), "field_id": field_ids})
+    for s in SIGNALS:
+        df[s] = rng.random(n, dtype=np.float32)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the per-field rolling feature store")
+    parser.add_argument("--fields", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--lookups", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    field_ids = np.array([f"F{i}" for i in range(args.fields)])
+    store = FieldFeatureStore(max_fields=args.fields)
+    start = np.datetime64("2025-01-01")
+    ingest = []
+    for d in range(args.days):
+        batch = daily_batch(rng, field_ids, start + d)
+        t0 = time.perf_counter()
+        store.ingest(batch)
+        ingest.append(time.perf_counter() - t0)
+    print(f"{args.fields} fields x {args.days} days")
+    print(f"ingest per daily batch: median {np.median(ingest) * 1000:.1f} ms, max {max(ingest) * 1000:.1f} ms, "
+          f"total {sum(ingest):.1f} s")
+    print(f"ring storage: {store.nbytes() / 2**20:.1f} MB, process peak RSS: "
+          f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+    picks = rng.choice(field_ids, args.lookups)
+    t0 = time.perf_counter()
+    for f in picks[:1000]:
+        store.features(f)
+    single = (time.perf_counter() - t0) / min(1000, len(picks))
+    t0 = time.perf_counter()
+    vals, _, _ = store.window_values(picks)
+    rolling_features(vals)
+    batch = time.perf_counter() - t0
+    print(f"single-field lookup: {single * 1e6:.0f} us, batch of {len(picks)}: {batch * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
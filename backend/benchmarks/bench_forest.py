@@ -0,0 +1,61 @@
+# backend/benchmarks/bench_forest.py
+# Latency of sklearn RandomForestRegressor.predict vs forest_engine.FlatForest for 1, 100 and 100k rows.
+# Run from backend/:  python -m benchmarks.bench_forest
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from forest_engine import FlatForest
+
+FEATURES = [f"lag_{i}" for i in range(1, 8)] + ["temp_max", "temp_min", "precip_mm", "humidity", "wind_speed"]
+
+
+def synthetic_model(n_rows=2000, n_estimators=200, seed=42):
+    """A price-shaped forest: same feature set and n_estimators as train_price_model."""
+    rng = np.random.default_rng(seed)
+    price = 2000 + np.cumsum(rng.normal(0, 10, n_rows + 7))
+    X = np.column_stack([price[7 - i:n_rows + 7 - i] for i in range(1, 8)] + [rng.normal(25, 5, (n_rows, 5))])
+    y = price[7:] + rng.normal(0, 5, n_rows)
+    model = RandomForestRegressor(n_estimators=n_estimators, random_state=42, n_jobs=-1)
+    model.fit(pd.DataFrame(X, columns=FEATURES), y)
+    return model, X
+
+
+def timeit(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times), max(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark flattened forest inference")
+    parser.add_argument("--trees", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    model, X = synthetic_model(n_estimators=args.trees)
+    flat = FlatForest.from_sklearn(model)
+    print(f"{flat.n_trees} trees, {flat.n_nodes} nodes, max depth {flat.max_depth}")
+    print(f"{'rows':>8}{'sklearn ms':>14}{'flat ms':>12}{'speedup':>10}{'identical':>11}")
+    rng = np.random.default_rng(0)
+    for n in (1, 100, 100_000):
+        rows = X[rng.integers(0, len(X), n)] + rng.normal(0, 1, (n, X.shape[1]))
+        df = pd.DataFrame(rows, columns=FEATURES)
+        repeats = args.repeats if n < 100_000 else 3
+        # what predict_price used to do per request: build a DataFrame, then predict
+        sk, _ = timeit(lambda: model.predict(pd.DataFrame(rows, columns=FEATURES)), repeats)
+        fl, _ = timeit(lambda: flat.predict(rows), repeats)
+        same = np.array_equal(model.predict(df), flat.predict(rows))
+        print(f"{n:>8}{sk * 1e3:>14.2f}{fl * 1e3:>12.2f}{sk / fl:>9.1f}x{str(same):>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# backend/benchmarks/bench_geo_grid.py
+# Upstream weather calls and stored weather rows for N fields: one per field vs one per grid cell.
+# Fields are clustered around villages (a few km across) spread over a few Indian states, which is
+# how farms are laid out; every cell is fetched once a day and stores one row per day.
+# Run from backend/:  python -m benchmarks.bench_geo_grid --fields 20000
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from geo_grid import GridIndex
+
+
+def synthetic_fields(n, villages=300, spread_km=2.0, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = np.column_stack([rng.uniform(18, 27, villages), rng.uniform(72, 82, villages)])
+    which = rng.integers(0, villages, n)
+    offsets = rng.normal(0, spread_km / 111.0, (n, 2))
+    lat, lon = (centres[which] + offsets).T
+    return pd.DataFrame({"member": [f"field{i}" for i in range(n)], "kind": "field", "lat": lat, "lon": lon})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark weather grid snapping")
+    parser.add_argument("--fields", type=int, default=20000)
+    parser.add_argument("--villages", type=int, default=300)
+    parser.add_argument("--days", type=int, default=365, help="days of stored history")
+    args = parser.parse_args()
+
+    fields = synthetic_fields(args.fields, args.villages)
+    print(f"{args.fields} fields around {args.villages} villages, {args.days} days of history")
+    print(f"{'grid deg':>9}{'cells':>8}{'calls/day':>11}{'reduction':>11}{'stored rows':>13}{'index ms':>10}")
+    print(f"{'exact':>9}{args.fields:>8}{args.fields:>11}{'1x':>11}{args.fields * args.days:>13}{'-':>10}")
+    for res in (0.01, 0.05, 0.1, 0.25):
+        t0 = time.perf_counter()
+        index = GridIndex(fields, res=res)
+        n_cells = len(index.cells())
+        ms = (time.perf_counter() - t0) * 1e3
+        print(f"{res:>9g}{n_cells:>8}{n_cells:>11}{args.fields / n_cells:>10.0f}x{n_cells * args.days:>13}{ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# backend/benchmarks/bench_model_store.py
+# Disk size, startup time and memory of many price models saved as legacy .joblib files vs through
+# model_store (pruned, compressed .npz + manifest). Startup is ModelRegistry.preload() of every model
+# in a fresh interpreter: "cold" expands each model into its .flat/ copy first (first start after
+# training), "warm" maps existing .flat/ copies (every later start). Checks that both layouts predict
+# the same as sklearn. A few distinct forests are fitted and reused under many crop names, so a
+# 500-model store doesn't take 500 fits to build.
+# Run from backend/:  python -m benchmarks.bench_model_store --models 500 --trees 200
+
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+import model_store
+from benchmarks.bench_forest import synthetic_model
+from model_registry import ModelRegistry, price_model_name
+
+
+def dir_mb(path, pattern):
+    return sum(p.stat().st_size for p in Path(path).glob(pattern) if p.is_file()) / 2**20
+
+
+def peak_rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def startup(models_dir):
+    """Child mode: preload every model, print seconds and peak RSS."""
+    t0 = time.perf_counter()
+    registry = ModelRegistry(models_dir, max_price_models=100_000)
+    n = len(registry.preload())
+    print(n, time.perf_counter() - t0, peak_rss_mb())
+
+
+def measure(models_dir):
+    cmd = [sys.executable, "-m", "benchmarks.bench_model_store", "--startup", str(models_dir)]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=Path(__file__).resolve().parents[1])
+    n, seconds, rss = out.stdout.strip().splitlines()[-1].split()
+    return int(n), float(seconds), float(rss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the versioned model store against .joblib files")
+    parser.add_argument("--models", type=int, default=500)
+    parser.add_argument("--distinct", type=int, default=4, help="forests actually fitted")
+    parser.add_argument("--trees", type=int, default=200)
+    parser.add_argument("--startup", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.startup:
+        startup(args.startup)
+        return
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_store_"))
+    legacy, store = tmp / "legacy", tmp / "store"
+    legacy.mkdir()
+    try:
+        fitted = [synthetic_model(n_estimators=args.trees, seed=i) for i in range(args.distinct)]
+        t0 = time.perf_counter()
+        for i in range(args.models):
+            joblib.dump(fitted[i % args.distinct][0], legacy / f"{price_model_name(f'crop{i}')}.joblib")
+        t_legacy = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for i in range(args.models):
+            model_store.save(fitted[i % args.distinct][0], store, price_model_name(f"crop{i}"))
+        t_store = time.perf_counter() - t0
+
+        # identical predictions on the stored (float32-threshold) forests
+        for i, (model, X) in enumerate(fitted):
+            flat = model_store.load(store, price_model_name(f"crop{i}"))
+            assert np.array_equal(flat.predict(X), model.predict(X)), "stored forest predicts differently"
+
+        print(f"{args.models} models x {args.trees} trees ({args.distinct} distinct fits)")
+        print(f"{'layout':>8}{'save s':>9}{'disk MB':>10}{'cold s':>9}{'cold MB':>9}{'warm s':>9}{'warm MB':>9}{'+flat MB':>10}")
+        for label, path, save_s, pattern in (("joblib", legacy, t_legacy, "*.joblib"), ("store", store, t_store, "*/*.npz")):
+            disk = dir_mb(path, pattern)
+            _, cold_s, cold_mb = measure(path)
+            n, warm_s, warm_mb = measure(path)
+            flat_mb = dir_mb(path, "**/*.flat/*")
+            print(f"{label:>8}{save_s:>9.1f}{disk:>10.1f}{cold_s:>9.1f}{cold_mb:>9.0f}{warm_s:>9.1f}{warm_mb:>9.0f}{flat_mb:>10.1f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
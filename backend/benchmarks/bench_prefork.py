@@ -0,0 +1,115 @@
+# backend/benchmarks/bench_prefork.py
+# Memory of N forked workers serving the same models, as under gunicorn --preload.
+# Workers score every model, either on what the master preloaded before forking or after loading
+# the models themselves (what happens when a model is retrained while the server runs), with
+# memory-mapped flat models or models held in private memory. Reports the workers' total PSS
+# (proportional set size: shared pages are split between the processes mapping them) from
+# /proc/<pid>/smaps_rollup, above a baseline of workers forked from a master with no models.
+# Every scenario runs in a fresh interpreter, so one scenario's heap doesn't leak into the next.
+# Linux only.
+# Run from backend/:  python -m benchmarks.bench_prefork --models 12 --workers 4
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.bench_forest import synthetic_model
+import model_store
+from model_registry import ModelRegistry, price_model_name
+
+
+def memory_kb(pid):
+    """{"Rss": kB, "Pss": kB, ...} for a process."""
+    out = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                out[parts[0].rstrip(":")] = int(parts[1])
+    return out
+
+
+def run(models_dir, n_workers, mmap, rows, preload=True):
+    registry = ModelRegistry(models_dir, max_price_models=10_000, mmap=mmap)
+    names = registry.model_names()
+    if preload:
+        registry.preload()
+    pids, pipes = [], []
+    for _ in range(n_workers):
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(r)
+            if rows is not None:
+                for name in names:
+                    registry.get(name).flat.predict(rows)
+            os.write(w, b"1")
+            time.sleep(3600)
+            os._exit(0)
+        os.close(w)
+        pids.append(pid)
+        pipes.append(r)
+    for r in pipes:
+        os.read(r, 1)
+        os.close(r)
+    mem = [memory_kb(pid) for pid in pids]
+    for pid in pids:
+        os.kill(pid, 9)
+        os.waitpid(pid, 0)
+    return sum(m["Pss"] for m in mem) / 1024
+
+
+def measure(models_dir, workers, mmap, score, preload):
+    """Run one scenario in a fresh interpreter; returns the workers' total PSS in MB."""
+    cmd = [sys.executable, "-m", "benchmarks.bench_prefork", "--measure", str(models_dir),
+           "--workers", str(workers), "--mmap", str(int(mmap)), "--score", str(int(score)),
+           "--preload", str(int(preload))]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=Path(__file__).resolve().parents[1])
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark model memory across forked workers")
+    parser.add_argument("--models", type=int, default=12, help="synthetic price models")
+    parser.add_argument("--trees", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--measure", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--mmap", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--score", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--preload", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        # child mode: one scenario; scoring rows are the same for every model
+        rows = np.random.default_rng(0).normal(2000, 50, (100, 12)) if args.score else None
+        print(run(args.measure, args.workers, bool(args.mmap), rows, bool(args.preload)))
+        return
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_prefork_"))
+    try:
+        for i in range(args.models):
+            model, _ = synthetic_model(n_estimators=args.trees, seed=i)
+            model_store.save(model, tmp, price_model_name(f"crop{i}"))
+        # writes the .flat copies, so the mmap scenarios start from a warm restart
+        registry = ModelRegistry(tmp)
+        set_mb = sum(registry.get(n).flat.nbytes() for n in registry.model_names()) / 2**20
+        print(f"{args.models} models x {args.trees} trees ({set_mb:.1f} MB of flat arrays), {args.workers} workers")
+        base = measure(tmp, args.workers, False, False, False)
+        print(f"{'scenario':>24}{'PSS MB':>10}{'model sets':>12}")
+        for label, mmap, preload in (("preload, private", False, True), ("preload, mmap", True, True),
+                                     ("worker load, private", False, False), ("worker load, mmap", True, False)):
+            pss = measure(tmp, args.workers, mmap, True, preload) - base
+            print(f"{label:>24}{pss:>10.1f}{pss / set_mb:>12.2f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
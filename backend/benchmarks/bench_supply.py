@@ -0,0 +1,107 @@
+# backend/benchmarks/bench_supply.py
+# Supply analytics on synthetic data: the old full merge + row-wise apply per query vs SupplyIndex
+# (one vectorised build, then O(1) updates and summary/page queries off the per-region arrays).
+# Persisted updates (what the PUT endpoints do) append to the journal; compare a full table rewrite.
+# Run from backend/:  python -m benchmarks.bench_supply --regions 100000 --warehouses 300000
+
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from supply_analytics import SupplyIndex
+
+
+def synthetic(n_regions, n_warehouses, seed=0):
+    rng = np.random.default_rng(seed)
+    regions = np.array([f"R{i}" for i in range(n_regions)], dtype=object)
+    supply = pd.DataFrame({"warehouse_id": [f"W{i}" for i in range(n_warehouses)],
+                           "region": regions[rng.integers(0, n_regions, n_warehouses)],
+                           "capacity": rng.integers(100, 10000, n_warehouses).astype(float)})
+    demand = pd.DataFrame({"region": regions, "demand": rng.integers(0, 30000, n_regions).astype(float)})
+    return supply, demand
+
+
+def full_merge(supply, demand):
+    """What analyze_supply_chain used to do on every run."""
+    merged = pd.merge(supply, demand, on="region", how="outer").fillna(0)
+    merged["deficit"] = merged["demand"] - merged["capacity"]
+    merged["status"] = merged["deficit"].apply(lambda x: "surplus" if x < 0 else "deficit")
+    return merged.groupby("status")["region"].count().to_dict()
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return np.median(times) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark supply analytics")
+    parser.add_argument("--regions", type=int, default=100000)
+    parser.add_argument("--warehouses", type=int, default=300000)
+    parser.add_argument("--updates", type=int, default=10000)
+    parser.add_argument("--persisted", type=int, default=200, help="journalled updates to time")
+    args = parser.parse_args()
+
+    supply, demand = synthetic(args.regions, args.warehouses)
+    rng = np.random.default_rng(1)
+    print(f"{args.regions} regions, {args.warehouses} warehouses")
+    print(f"{'full merge + apply':<28}{timed(lambda: full_merge(supply, demand), 3):>10.1f} ms")
+
+    index = SupplyIndex()
+    print(f"{'index build':<28}{timed(lambda: index.load(supply, demand), 3):>10.1f} ms")
+    print(f"{'summary (top 10)':<28}{timed(lambda: index.summary(), 20):>10.2f} ms")
+    print(f"{'regions page (deficit)':<28}{timed(lambda: index.regions(status='deficit'), 20):>10.2f} ms")
+    name = demand["region"].iloc[0]
+    print(f"{'one region':<28}{timed(lambda: index.region(name), 20):>10.2f} ms")
+
+    regions = demand["region"].to_numpy()
+    warehouses = supply["warehouse_id"].to_numpy()
+    t0 = time.perf_counter()
+    for _ in range(args.updates // 2):
+        index.set_demand(regions[rng.integers(len(regions))], float(rng.integers(0, 30000)))
+        index.set_capacity(warehouses[rng.integers(len(warehouses))], float(rng.integers(100, 10000)))
+    per_update = (time.perf_counter() - t0) / args.updates * 1e6
+    print(f"{'update (demand/capacity)':<28}{per_update:>10.1f} µs")
+
+    rebuilt = SupplyIndex()
+    rebuilt.load(*index_tables(index))
+    drift = max(abs(index.totals[k] - rebuilt.totals[k]) for k in index.totals)
+    print(f"running totals vs rebuild after {args.updates} updates: max drift {drift:.3g}")
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_supply_"))
+    try:
+        supply.to_csv(tmp / "supply.csv", index=False)
+        demand.to_csv(tmp / "demand.csv", index=False)
+        stored = SupplyIndex(tmp / "supply.csv", tmp / "demand.csv")
+        stored.sync()
+        t0 = time.perf_counter()
+        for _ in range(args.persisted // 2):
+            stored.update_demand(regions[rng.integers(len(regions))], float(rng.integers(0, 30000)))
+            stored.update_capacity(warehouses[rng.integers(len(warehouses))], float(rng.integers(100, 10000)))
+        per_update = (time.perf_counter() - t0) / args.persisted * 1e3
+        print(f"{'persisted update (journal)':<28}{per_update:>10.2f} ms")
+        print(f"{'full table rewrite':<28}{timed(stored.save, 3):>10.1f} ms")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def index_tables(index):
+    frame = index.frame()
+    n = len(index._wh_ids)
+    supply = pd.DataFrame({"warehouse_id": index._wh_ids,
+                           "region": [index._region_names[r] for r in index._wh_region[:n]],
+                           "capacity": index._wh_capacity[:n]})
+    return supply, frame[["region", "demand"]]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# backend/benchmarks/load_proxy.py
+# Load test for the geocode/weather proxy against a local stub upstream that injects latency.
+# Starts the stub (one process serving both the Nominatim and Open-Meteo paths) and async_proxy.py
+# pointed at it, then fires --requests weather/geocode requests with up to --concurrency in flight.
+# Mostly distinct coordinates, so most requests are real upstream calls; --repeat of them reuse
+# earlier keys (cache hits / coalesced calls). While the load runs, /healthz is probed every 50 ms
+# to show the event loop stays responsive.
+# Reports client latency percentiles, X-Cache/status counts and the stub's peak in-flight calls.
+# Run from backend/:  python -m benchmarks.load_proxy --requests 5000 --concurrency 2000 --latency 0.5
+#
+# --target URL load-tests an already running server instead (e.g. the Flask app under gunicorn,
+# pointed at the same stub with GEOCODE_URL / WEATHER_URL).
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+
+# --------------------------------------------------------------------------------
+# STUB UPSTREAM
+# --------------------------------------------------------------------------------
+def stub_app(latency, jitter, error_rate):
+    stats = {"inflight": 0, "peak": 0, "served": 0}
+
+    async def slow(request, body):
+        stats["inflight"] += 1
+        stats["peak"] = max(stats["peak"], stats["inflight"])
+        try:
+            await asyncio.sleep(max(0.0, random.gauss(latency, jitter)))
+            stats["served"] += 1
+            if random.random() < error_rate:
+                return web.json_response({"error": "stub failure"}, status=503)
+            return web.json_response(body)
+        finally:
+            stats["inflight"] -= 1
+
+    async def search(request):
+        return await slow(request, [{"lat": "19.07", "lon": "72.87", "display_name": request.query.get("q")}])
+
+    async def forecast(request):
+        days = [f"2025-01-0{i}" for i in range(1, 8)]
+        return await slow(request, {"latitude": float(request.query["latitude"]), "daily": {
+            "time": days, "temperature_2m_max": [30.0] * 7, "windspeed_10m_max": [10.0] * 7}})
+
+    async def get_stats(request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_get("/search", search)
+    app.router.add_get("/v1/forecast", forecast)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+# --------------------------------------------------------------------------------
+# LOAD
+# --------------------------------------------------------------------------------
+def make_paths(n, repeat, seed=0):
+    rng = random.Random(seed)
+    paths = []
+    for i in range(n):
+        if paths and rng.random() < repeat:
+            paths.append(rng.choice(paths))
+        elif rng.random() < 0.8:
+            # 0.01-degree grid cells, so distinct coordinates are distinct cache keys
+            paths.append(f"/api/weather?lat={rng.uniform(-60, 60):.2f}&lon={rng.uniform(-170, 170):.2f}")
+        else:
+            paths.append(f"/api/geocode?q=town{i}")
+    return paths
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float("nan")
+
+
+async def wait_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as s:
+        while time.monotonic() < deadline:
+            try:
+                async with s.get(url) as r:
+                    if r.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+async def run_load(target, paths, concurrency, request_timeout):
+    sem = asyncio.Semaphore(concurrency)
+    latencies, statuses, cache = [], Counter(), Counter()
+    probes = []
+    done = asyncio.Event()
+    connector = aiohttp.TCPConnector(limit=concurrency + 1)
+    timeout = aiohttp.ClientTimeout(total=request_timeout)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as s:
+        async def one(path):
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    async with s.get(target + path) as r:
+                        await r.read()
+                        statuses[r.status] += 1
+                        cache[r.headers.get("X-Cache", "-")] += 1
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - t0)
+
+        async def probe():
+            async with aiohttp.ClientSession() as ps:
+                while not done.is_set():
+                    t0 = time.perf_counter()
+                    try:
+                        async with ps.get(target + "/healthz") as r:
+                            await r.read()
+                        probes.append(time.perf_counter() - t0)
+                    except aiohttp.ClientError:
+                        pass
+                    await asyncio.sleep(0.05)
+
+        prober = asyncio.ensure_future(probe())
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(p) for p in paths))
+        wall = time.perf_counter() - t0
+        done.set()
+        await prober
+    return {"wall": wall, "latencies": latencies, "statuses": statuses, "cache": cache, "probes": probes}
+
+
+async def stub_stats(stub_url):
+    async with aiohttp.ClientSession() as s:
+        async with s.get(stub_url + "/stats") as r:
+            return await r.json()
+
+
+def spawn(args, env=None):
+    return subprocess.Popen([sys.executable, *args], cwd=BACKEND, env={**os.environ, **(env or {})},
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the geocode/weather proxy against a slow stub upstream")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.5, help="stub latency in seconds (mean)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="stub latency std dev")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--repeat", type=float, default=0.1, help="share of requests reusing an earlier key")
+    parser.add_argument("--timeout", type=float, default=30, help="client-side request timeout")
+    parser.add_argument("--per-host", type=int, default=2000, help="proxy's upstream connection cap (UPSTREAM_MAX_PER_HOST)")
+    parser.add_argument("--stub-port", type=int, default=18081)
+    parser.add_argument("--proxy-port", type=int, default=18082)
+    parser.add_argument("--target", default=None, help="load an already running server instead of async_proxy.py")
+    parser.add_argument("--stub", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stub:
+        web.run_app(stub_app(args.latency, args.jitter, args.error_rate), host="127.0.0.1",
+                    port=args.stub_port, backlog=4096, print=None)
+        return
+
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    procs = [spawn(["-m", "benchmarks.load_proxy", "--stub", "--stub-port", str(args.stub_port),
+                    "--latency", str(args.latency), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate)])]
+    target = args.target
+    if target is None:
+        target = f"http://127.0.0.1:{args.proxy_port}"
+        procs.append(spawn(["async_proxy.py", "--host", "127.0.0.1", "--port", str(args.proxy_port)], env={
+            "GEOCODE_URL": f"{stub_url}/search", "WEATHER_URL": f"{stub_url}/v1/forecast",
+            "UPSTREAM_MAX_PER_HOST": str(args.per_host), "UPSTREAM_MAX_CONNECTIONS": str(max(args.per_host, 1000))}))
+    try:
+        asyncio.run(wait_ready(stub_url + "/stats"))
+        asyncio.run(wait_ready(target + "/healthz"))
+        paths = make_paths(args.requests, args.repeat)
+        res = asyncio.run(run_load(target, paths, args.concurrency, args.timeout))
+        stats = asyncio.run(stub_stats(stub_url))
+    finally:
+        for p in procs:
+            p.terminate()
+            p.wait()
+
+    lat = res["latencies"]
+    print(f"{args.requests} requests, concurrency {args.concurrency}, stub latency {args.latency}s ± {args.jitter}s"
+          + ("" if args.target else f", upstream cap {args.per_host} per host"))
+    print(f"wall {res['wall']:.2f}s, {args.requests / res['wall']:.0f} req/s")
+    print(f"latency ms: p50 {percentile(lat, 0.5) * 1e3:.0f}  p95 {percentile(lat, 0.95) * 1e3:.0f}  "
+          f"p99 {percentile(lat, 0.99) * 1e3:.0f}  max {max(lat) * 1e3:.0f}")
+    probes = res["probes"]
+    if probes:
+        print(f"/healthz during load ms: median {statistics.median(probes) * 1e3:.1f}  max {max(probes) * 1e3:.1f}  ({len(probes)} probes)")
+    print(f"status: {json.dumps(dict(res['statuses']))}  X-Cache: {json.dumps(dict(res['cache']))}")
+    print(f"stub: peak {stats['peak']} concurrent upstream calls, {stats['served']} served")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+# backend/benchmarks/suite.py
+# Offline benchmark suite for the data prep, training, allocation and predict paths, on seeded
+# synthetic data (benchmarks/synthetic.py) at a named scale. Every component runs in its own
+# interpreter: inputs are generated first (not timed), then the component is timed over several
+# runs and its peak memory is taken from the kernel's high-water mark (VmHWM, reset just before
+# the first run), so one component's heap never shows up in the next one's numbers.
+# Results go to a JSON file tagged with the commit, so two runs can be compared to flag regressions.
+#
+#   python -m benchmarks.suite --scale small                       -> benchmarks/results/small-<commit>.json
+#   python -m benchmarks.suite --scale small --compare OLD.json    -> also compares against OLD.json
+#   python -m benchmarks.suite --diff OLD.json NEW.json            -> compares two saved runs
+#   python -m benchmarks.suite --only merge_prices_weather,make_price_lags --rows 5000000 --crops 500
+#
+# Exits 1 when a comparison finds a regression beyond --tolerance (time) / --mem-tolerance (memory).
+
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks import synthetic
+
+BACKEND = Path(__file__).resolve().parents[1]
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# rows: price and satellite rows; train_rows: model-ready rows for train_all_crops;
+# batch_rows: rows per batch predict request
+SCALES = {
+    "tiny":   dict(rows=1_000, crops=3, regions=3, fields=100, warehouses=100, train_rows=1_000, batch_rows=100),
+    "small":  dict(rows=100_000, crops=20, regions=5, fields=1_000, warehouses=1_000, train_rows=20_000, batch_rows=1_000),
+    "medium": dict(rows=1_000_000, crops=100, regions=10, fields=10_000, warehouses=10_000, train_rows=100_000, batch_rows=10_000),
+    "large":  dict(rows=10_000_000, crops=500, regions=20, fields=100_000, warehouses=100_000, train_rows=500_000, batch_rows=50_000),
+}
+SINGLE_REQUESTS = 200
+
+
+# --------------------------------------------------------------------------------
+# MEMORY
+# --------------------------------------------------------------------------------
+def _proc_status_mb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak():
+    """Resets VmHWM to the current RSS (Linux). Returns False where that isn't possible."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_mb():
+    peak = _proc_status_mb("VmHWM")
+    if peak is None:
+        # ru_maxrss: process-lifetime peak, KiB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == "darwin" else 1024)
+    return peak
+
+
+# --------------------------------------------------------------------------------
+# COMPONENTS
+# Each setup(cfg, work) builds its inputs and returns (fn, info); fn() is what gets timed.
+# info["items"] (rows, requests) turns the per-run time into a per-item time.
+# --------------------------------------------------------------------------------
+def _market(cfg):
+    prices = synthetic.market_prices(cfg["rows"], cfg["crops"], cfg["regions"])
+    days = int((prices["date"].max() - prices["date"].min()).days) + 1
+    return prices, synthetic.weather(days, cfg["regions"])
+
+
+def setup_merge_prices_weather(cfg, work):
+    from data_prep import merge_prices_weather
+    prices, weather = _market(cfg)
+    return lambda: merge_prices_weather(prices, weather), {"items": len(prices), "weather_rows": len(weather)}
+
+
+def setup_make_price_lags(cfg, work):
+    from data_prep import make_price_lags, merge_prices_weather
+    merged = merge_prices_weather(*_market(cfg))
+    return lambda: make_price_lags(merged, n_lags=7), {"items": len(merged)}
+
+
+def setup_train_all_crops(cfg, work):
+    from data_prep import make_price_lags, merge_prices_weather
+    from train_price_model import train_all_crops
+    rows = min(cfg["train_rows"], cfg["rows"])
+    prices = synthetic.market_prices(rows, cfg["crops"], regions=1)
+    days = int((prices["date"].max() - prices["date"].min()).days) + 1
+    weather = synthetic.weather(days, regions=1).drop(columns="region")
+    ready = make_price_lags(merge_prices_weather(prices.drop(columns="region"), weather), n_lags=7)
+    csv = Path(work) / "train" / "prices_model_ready.csv"
+    csv.parent.mkdir(parents=True, exist_ok=True)
+    ready.to_csv(csv, index=False)
+    models_dir = csv.parent / "models"
+    models_dir.mkdir(exist_ok=True)
+    workers = cfg.get("train_workers") or 1
+    return (lambda: train_all_crops(csv, n_lags=7, workers=workers, models_dir=models_dir),
+            {"items": len(ready), "crops": cfg["crops"], "workers": workers, "repeat": 1})
+
+
+def _app_client(cfg, work, need_models=False):
+    """Flask test client on the real app, with its data dir (and model registry) pointed at `work`."""
+    import app as A
+    import model_store
+    from model_registry import ModelRegistry
+    data_dir = Path(work) / "app_data"
+    models_dir = Path(work) / "app_models"
+    if not (data_dir / "supply.csv").exists():
+        data_dir.mkdir(parents=True, exist_ok=True)
+        synthetic.supply(cfg["warehouses"]).to_csv(data_dir / "supply.csv", index=False)
+    if need_models and not model_store.names(models_dir):
+        # train_jobs' own fitting path, on a modest synthetic set (model size, not data size, drives predict cost)
+        import train_jobs
+        models_dir.mkdir(parents=True, exist_ok=True)
+        n = min(cfg["rows"], 20_000)
+        synthetic.prices(n, min(cfg["crops"], 3)).to_csv(data_dir / "prices.csv", index=False)
+        synthetic.satellite(n, min(cfg["fields"], 200)).to_csv(data_dir / "satellite.csv", index=False)
+        synthetic.weather(n).to_csv(data_dir / "weather.csv", index=False)  # covers every price/satellite date
+        for _, fn, args in train_jobs.prepare_tasks(data_dir, models_dir):
+            fn(*args)
+    A.DATA_DIR = data_dir
+    A.registry = ModelRegistry(models_dir)
+    if need_models:
+        A.registry.preload()
+    return A.create_app(warm=False).test_client()
+
+
+def _supply_body(cfg, mode):
+    n_regions = max(1, cfg["warehouses"] // 10)
+    total = 0.9 * synthetic.supply(cfg["warehouses"])["capacity"].sum()
+    dem = synthetic.demand(n_regions, total)
+    body = {"demand": dict(zip(dem["region"], dem["demand"].astype(int).tolist())), "mode": mode}
+    if mode != "greedy":
+        body["regions"] = {r: list(c) for r, c in synthetic.region_coords(n_regions).items()}
+    return body, n_regions
+
+
+def _requests(client, path, bodies):
+    def fn():
+        for body in bodies:
+            r = client.post(path, json=body)
+            if r.status_code != 200:
+                raise RuntimeError(f"{path} -> {r.status_code}: {r.get_data(as_text=True)[:200]}")
+    return fn
+
+
+def _post(client, path, body):
+    return _requests(client, path, [body])
+
+
+def setup_supply_alloc(cfg, work):
+    client = _app_client(cfg, work)
+    body, n_regions = _supply_body(cfg, "greedy")
+    return _post(client, "/api/supply", body), {"items": n_regions, "warehouses": cfg["warehouses"]}
+
+
+def setup_supply_alloc_nearest(cfg, work):
+    client = _app_client(cfg, work)
+    body, n_regions = _supply_body(cfg, "nearest")
+    return _post(client, "/api/supply", body), {"items": n_regions, "warehouses": cfg["warehouses"]}
+
+
+def _health_rows(n, seed=0):
+    sat = synthetic.satellite(n, fields=max(1, n), seed=seed)
+    w = synthetic.weather(1, seed=seed)
+    cols = ["ndvi", "evi", "soil_moisture", "pest_index"]
+    rows = sat[cols].to_dict("records")
+    extra = w.drop(columns="date").iloc[0].to_dict()
+    return [{**r, **extra} for r in rows]
+
+
+def _price_rows(n, crops, seed=0):
+    rng = np.random.default_rng(seed)
+    names = synthetic.crop_names(min(crops, 3))
+    extra = synthetic.weather(1, seed=seed).drop(columns="date").iloc[0].to_dict()
+    return [{"crop": names[i % len(names)], "recent_prices": rng.uniform(1500, 2500, 7).round(2).tolist(), "weather": extra}
+            for i in range(n)]
+
+
+def setup_predict_health(cfg, work):
+    client = _app_client(cfg, work, need_models=True)
+    bodies = _health_rows(SINGLE_REQUESTS)
+    return _requests(client, "/api/predict/health", bodies), {"items": len(bodies)}
+
+
+def setup_predict_price(cfg, work):
+    client = _app_client(cfg, work, need_models=True)
+    bodies = _price_rows(SINGLE_REQUESTS, cfg["crops"])
+    return _requests(client, "/api/predict/price", bodies), {"items": len(bodies)}
+
+
+def setup_predict_health_batch(cfg, work):
+    client = _app_client(cfg, work, need_models=True)
+    rows = _health_rows(cfg["batch_rows"])
+    return _post(client, "/api/predict/health/batch", {"rows": rows}), {"items": len(rows)}
+
+
+def setup_predict_price_batch(cfg, work):
+    client = _app_client(cfg, work, need_models=True)
+    rows = _price_rows(cfg["batch_rows"], cfg["crops"])
+    return _post(client, "/api/predict/price/batch", {"rows": rows}), {"items": len(rows)}
+
+
+COMPONENTS = {
+    "merge_prices_weather": setup_merge_prices_weather,
+    "make_price_lags": setup_make_price_lags,
+    "train_all_crops": setup_train_all_crops,
+    "supply_alloc": setup_supply_alloc,
+    "supply_alloc_nearest": setup_supply_alloc_nearest,
+    "predict_health": setup_predict_health,
+    "predict_price": setup_predict_price,
+    "predict_health_batch": setup_predict_health_batch,
+    "predict_price_batch": setup_predict_price_batch,
+}
+
+
+# --------------------------------------------------------------------------------
+# RUNNER
+# --------------------------------------------------------------------------------
+def measure(name, cfg, work, repeat=5, budget=20.0):
+    """Child side: set up, then time up to `repeat` runs (at least one, stopping after `budget` seconds)."""
+    fn, info = COMPONENTS[name](cfg, work)
+    repeat = info.pop("repeat", repeat)
+    gc.collect()
+    rss_before = _proc_status_mb("VmRSS")
+    exact = _reset_peak()
+    times = []
+    while len(times) < repeat and (not times or sum(times) < budget):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+        if len(times) == 1:
+            peak = _peak_mb()
+    items = info.get("items") or 1
+    median = statistics.median(times)
+    return {
+        "seconds_median": round(median, 6),
+        "seconds_min": round(min(times), 6),
+        "seconds_first": round(times[0], 6),
+        "runs": len(times),
+        "per_item_us": round(median / items * 1e6, 3),
+        "peak_rss_mb": round(peak, 1),
+        "peak_delta_mb": round(max(peak - rss_before, 0.0), 1) if exact and rss_before is not None else None,
+        **info,
+    }
+
+
+def git_commit():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND,
+                               capture_output=True, text=True).stdout.strip()
+        return sha + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def environment():
+    import pandas, sklearn
+    return {"python": platform.python_version(), "numpy": np.__version__, "pandas": pandas.__version__,
+            "sklearn": sklearn.__version__, "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def run_suite(names, cfg, repeat, budget):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_suite_") as work:
+        for name in names:
+            cmd = [sys.executable, "-m", "benchmarks.suite", "--child", name, "--work", work,
+                   "--config", json.dumps(cfg), "--repeat", str(repeat), "--budget", str(budget)]
+            t0 = time.perf_counter()
+            # MODEL_MMAP etc. pass through; the child must not touch the network
+            proc = subprocess.run(cmd, cwd=BACKEND, capture_output=True, text=True,
+                                  env={**os.environ, "OMP_NUM_THREADS": os.environ.get("OMP_NUM_THREADS", "1")})
+            if proc.returncode != 0:
+                tail = (proc.stderr or proc.stdout).strip().splitlines()[-1:] or ["no output"]
+                results[name] = {"error": tail[0]}
+                print(f"❌ {name}: {tail[0]}")
+                continue
+            results[name] = json.loads(proc.stdout.strip().splitlines()[-1])
+            r = results[name]
+            mem = f"{r['peak_delta_mb']:.1f} MB" if r["peak_delta_mb"] is not None else f"{r['peak_rss_mb']:.0f} MB peak RSS"
+            print(f"✅ {name:<24}{r['seconds_median'] * 1e3:>11.1f} ms{r['per_item_us']:>12.2f} µs/item{mem:>14}"
+                  f"   ({r['runs']} runs, {time.perf_counter() - t0:.0f}s with setup)")
+    return results
+
+
+# --------------------------------------------------------------------------------
+# COMPARE
+# --------------------------------------------------------------------------------
+def compare(base, new, tolerance=0.10, mem_tolerance=0.20, time_floor_ms=1.0, mem_floor_mb=5.0):
+    """
+    Prints per-component time and memory ratios new/base; returns the names of regressed components.
+    Time uses the median, memory the peak delta (or peak RSS); increases under time_floor_ms /
+    mem_floor_mb are treated as noise.
+    """
+    if base.get("config") != new.get("config"):
+        print(f"⚠️ Different configs: {base.get('config')} vs {new.get('config')}")
+    print(f"{'component':<24}{'base ms':>11}{'new ms':>11}{'time':>8}{'base MB':>10}{'new MB':>10}{'mem':>8}")
+    regressions = []
+    for name in new["results"]:
+        a, b = base["results"].get(name), new["results"][name]
+        if a is None or "error" in a or "error" in b:
+            print(f"{name:<24}{'(not comparable)':>30}")
+            continue
+        t_ratio = b["seconds_median"] / a["seconds_median"] if a["seconds_median"] else float("inf")
+        mem_key = "peak_delta_mb" if a.get("peak_delta_mb") is not None and b.get("peak_delta_mb") is not None else "peak_rss_mb"
+        ma, mb = max(a[mem_key], 0.0), max(b[mem_key], 0.0)
+        m_ratio = mb / ma if ma else (1.0 if mb <= mem_floor_mb else float("inf"))
+        slow = t_ratio > 1 + tolerance and (b["seconds_median"] - a["seconds_median"]) * 1e3 > time_floor_ms
+        fat = m_ratio > 1 + mem_tolerance and mb - ma > mem_floor_mb
+        flag = "  ❌ slower" * slow + "  ❌ more memory" * fat
+        if slow or fat:
+            regressions.append(name)
+        print(f"{name:<24}{a['seconds_median'] * 1e3:>11.1f}{b['seconds_median'] * 1e3:>11.1f}{t_ratio:>7.2f}x"
+              f"{ma:>10.1f}{mb:>10.1f}{m_ratio:>7.2f}x{flag}")
+    print(f"{'❌' if regressions else '✅'} {len(regressions)} regression(s) "
+          f"(time > +{tolerance:.0%} and > {time_floor_ms:g} ms, memory > +{mem_tolerance:.0%} and > {mem_floor_mb:g} MB)")
+    return regressions
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite on synthetic data")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--rows", type=int, help="override the scale's price/satellite rows")
+    parser.add_argument("--crops", type=int, help="override the scale's number of crops")
+    parser.add_argument("--train-workers", type=int, default=1, help="workers for train_all_crops")
+    parser.add_argument("--only", help="comma-separated components (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per component (at most)")
+    parser.add_argument("--budget", type=float, default=20.0, help="stop repeating a component after this many seconds")
+    parser.add_argument("--out", help="results JSON (default benchmarks/results/<scale>-<commit>.json)")
+    parser.add_argument("--compare", metavar="BASE_JSON", help="compare this run against a saved run")
+    parser.add_argument("--diff", nargs=2, metavar=("BASE_JSON", "NEW_JSON"), help="only compare two saved runs")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed median time increase (0.10 = 10%%)")
+    parser.add_argument("--mem-tolerance", type=float, default=0.20, help="allowed peak memory increase")
+    parser.add_argument("--list", action="store_true", help="list components and scales")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--work", help=argparse.SUPPRESS)
+    parser.add_argument("--config", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, json.loads(args.config), args.work, args.repeat, args.budget)))
+        return
+    if args.list:
+        print("components:", ", ".join(COMPONENTS))
+        for name, cfg in SCALES.items():
+            print(f"{name:>7}: {cfg}")
+        return
+    if args.diff:
+        regressions = compare(load_results(args.diff[0]), load_results(args.diff[1]), args.tolerance, args.mem_tolerance)
+        sys.exit(1 if regressions else 0)
+
+    names = args.only.split(",") if args.only else list(COMPONENTS)
+    unknown = [n for n in names if n not in COMPONENTS]
+    if unknown:
+        parser.error(f"unknown components: {', '.join(unknown)} (see --list)")
+    cfg = dict(SCALES[args.scale], train_workers=args.train_workers)
+    if args.rows:
+        cfg["rows"] = args.rows
+    if args.crops:
+        cfg["crops"] = args.crops
+
+    commit = git_commit()
+    print(f"🧪 scale {args.scale} {cfg} at {commit}")
+    results = run_suite(names, cfg, args.repeat, args.budget)
+    payload = {"commit": commit, "created": time.strftime("%Y-%m-%d %H:%M:%S"), "scale": args.scale,
+               "config": cfg, "environment": environment(), "results": results}
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{args.scale}-{commit}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(f"📦 Results -> {out}")
+    if args.compare:
+        regressions = compare(load_results(args.compare), payload, args.tolerance, args.mem_tolerance)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
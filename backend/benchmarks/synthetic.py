@@ -0,0 +1,174 @@
+# backend/benchmarks/synthetic.py
+# Seeded synthetic tables shaped like the files under backend/data, for benchmarks that must run
+# offline at sizes the real data doesn't reach. Same seed and sizes -> identical tables.
+#
+#   market_prices   market_prices_real.csv after ingest: date, region, commodity, price
+#   prices          prices.csv: date, crop, price
+#   weather         weather.csv (no region) or weather_<region>.csv (with region)
+#   satellite       satellite.csv: date, field_id, ndvi, evi, soil_moisture, pest_index, crop_stage, health_label
+#   supply          supply.csv: warehouse_id, location, capacity, lat, lon
+#   demand          demand.csv: region, demand
+#
+# Run from backend/:  python -m benchmarks.synthetic --out /tmp/synth --rows 1000000 --crops 50
+# writes all of them (plus weather_<region>.csv per region) to --out.
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+START = np.datetime64("2020-01-01")
+NAMED_CROPS = ["wheat", "rice", "maize"]
+WEATHER_COLUMNS = ["temp_max", "temp_min", "precip_mm", "humidity", "wind_speed"]
+SIGNALS = ["ndvi", "evi", "soil_moisture", "pest_index"]
+STAGES = np.array(["early", "mid", "late"])
+
+
+def crop_names(n):
+    return (NAMED_CROPS + [f"crop{i:03d}" for i in range(len(NAMED_CROPS), n)])[:n]
+
+
+def region_names(n):
+    return [f"region{i:03d}" for i in range(n)]
+
+
+def _series_layout(rows, n_series):
+    """(days, series index, day index) for `rows` rows of n_series daily series, ordered by date."""
+    days = max(1, -(-rows // n_series))
+    flat = np.arange(rows)
+    return days, flat % n_series, flat // n_series
+
+
+def _random_walks(rng, n_series, days, base, vol=0.01):
+    steps = rng.normal(0, vol, (n_series, days)).astype(np.float32)
+    return (base[:, None] * np.exp(np.cumsum(steps, axis=1))).astype(np.float64)
+
+
+def market_prices(rows, crops=3, regions=3, seed=0):
+    """Daily prices per (region, commodity), one random walk each, rows ordered by date."""
+    rng = np.random.default_rng(seed)
+    crop_list, region_list = crop_names(crops), region_names(regions)
+    n_series = crops * regions
+    days, s, d = _series_layout(rows, n_series)
+    walks = _random_walks(rng, n_series, days, rng.uniform(800, 5000, n_series))
+    return pd.DataFrame({
+        "date": START + d,
+        "region": pd.Categorical.from_codes(s // crops, region_list),
+        "commodity": pd.Categorical.from_codes(s % crops, crop_list),
+        "price": walks[s, d],
+    })
+
+
+def prices(rows, crops=3, seed=0):
+    """prices.csv: one daily series per crop."""
+    df = market_prices(rows, crops, regions=1, seed=seed)
+    return df.drop(columns="region").rename(columns={"commodity": "crop"})[["date", "crop", "price"]]
+
+
+def weather(days, regions=None, seed=0):
+    """Daily weather from START; per region (with a region column, no humidity) when regions is given."""
+    rng = np.random.default_rng(seed + 1)
+    names = region_names(regions) if regions else [None]
+    n = days * len(names)
+    day = np.tile(np.arange(days), len(names))
+    season = np.sin(2 * np.pi * day / 365.25)
+    temp_max = 30 + 6 * season + rng.normal(0, 2, n)
+    df = pd.DataFrame({
+        "date": START + day,
+        "temp_max": temp_max,
+        "temp_min": temp_max - rng.uniform(5, 12, n),
+        "precip_mm": rng.gamma(0.6, 4.0, n) * (rng.random(n) < 0.4),
+        "humidity": np.clip(60 + 15 * season + rng.normal(0, 8, n), 10, 100),
+        "wind_speed": rng.gamma(2.0, 4.0, n),
+    })
+    if regions:
+        df.insert(0, "region", pd.Categorical.from_codes(np.repeat(np.arange(len(names)), days), names))
+        df = df.drop(columns="humidity")
+    return df
+
+
+def satellite(rows, fields=1000, seed=0):
+    """Daily field observations, rows ordered by field then date; labels follow ndvi and pest_index."""
+    rng = np.random.default_rng(seed + 2)
+    days = max(1, -(-rows // fields))
+    flat = np.arange(rows)
+    field, day = flat // days, flat % days
+    ndvi = np.clip(0.55 + 0.15 * np.sin(2 * np.pi * day / 120) + rng.normal(0, 0.08, rows), 0, 1)
+    pest = rng.beta(2, 5, rows)
+    return pd.DataFrame({
+        "date": START + day,
+        "field_id": field + 1,
+        "ndvi": ndvi,
+        "evi": np.clip(ndvi * 0.7 + rng.normal(0, 0.05, rows), 0, 1),
+        "soil_moisture": rng.uniform(0.1, 0.45, rows),
+        "pest_index": pest,
+        "crop_stage": pd.Categorical(STAGES[np.minimum(day % 120 // 40, 2)], categories=STAGES),
+        "health_label": np.where((ndvi > 0.5) & (pest < 0.4), "healthy", "stressed"),
+    })
+
+
+def supply(warehouses, regions=None, seed=0):
+    """Warehouses scattered over India; `regions` locations (default one per 10 warehouses)."""
+    rng = np.random.default_rng(seed + 3)
+    names = region_names(regions or max(1, warehouses // 10))
+    return pd.DataFrame({
+        "warehouse_id": [f"W{i}" for i in range(warehouses)],
+        "location": np.asarray(names, dtype=object)[rng.integers(0, len(names), warehouses)],
+        "capacity": rng.integers(500, 20000, warehouses),
+        "lat": rng.uniform(8, 35, warehouses),
+        "lon": rng.uniform(68, 97, warehouses),
+    })
+
+
+def demand(regions, total=None, seed=0):
+    """Per-region demand; scaled to `total` (e.g. 90% of supply capacity) when given."""
+    rng = np.random.default_rng(seed + 4)
+    dem = rng.integers(100, 10000, regions).astype(float)
+    if total is not None:
+        dem *= total / dem.sum()
+    return pd.DataFrame({"region": region_names(regions), "demand": np.floor(dem)})
+
+
+def region_coords(regions, seed=0):
+    """{region: (lat, lon)} for the allocation distance modes."""
+    rng = np.random.default_rng(seed + 5)
+    return dict(zip(region_names(regions), zip(rng.uniform(8, 35, regions).tolist(), rng.uniform(68, 97, regions).tolist())))
+
+
+def write_dataset(out_dir, rows=100_000, crops=3, regions=3, fields=1000, warehouses=1000, seed=0):
+    """Writes every table to out_dir as CSV; returns {file name: rows}."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    market = market_prices(rows, crops, regions, seed)
+    days = int((market["date"].max() - market["date"].min()).days) + 1
+    tables = {
+        "market_prices_real.csv": market,
+        "prices.csv": prices(rows, crops, seed),
+        "weather.csv": weather(days, seed=seed),
+        "weather_recent.csv": weather(days, regions, seed),
+        "satellite.csv": satellite(rows, fields, seed),
+        "supply.csv": supply(warehouses, seed=seed),
+    }
+    tables["demand.csv"] = demand(max(1, warehouses // 10), 0.9 * tables["supply.csv"]["capacity"].sum(), seed)
+    regional = tables["weather_recent.csv"]
+    for name, sub in regional.groupby("region", observed=True):
+        tables[f"weather_{name}.csv"] = sub
+    for name, df in tables.items():
+        df.to_csv(out_dir / name, index=False)
+    return {name: len(df) for name, df in tables.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write seeded synthetic data files")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--rows", type=int, default=100_000, help="price and satellite rows")
+    parser.add_argument("--crops", type=int, default=3)
+    parser.add_argument("--regions", type=int, default=3)
+    parser.add_argument("--fields", type=int, default=1000)
+    parser.add_argument("--warehouses", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    counts = write_dataset(args.out, args.rows, args.crops, args.regions, args.fields, args.warehouses, args.seed)
+    for name, n in counts.items():
+        print(f"📦 {name}: {n} rows")
@@ -3,89 +3,265 @@
 # Handles Agmarknet-style CSV or public dataset URLs.
 
 import os
+import json
+import shutil
+import tempfile
 from pathlib import Path
 import datetime
+import time
 import requests
 import pandas as pd
 
-BASE = Path(__file__).resolve().parents[1]
+try:
+    from data_store import load_table, write_csv_atomic
+    import geo_grid
+    import metrics
+except ImportError:  # imported as backend.data_ingest from the repo root
+    from backend.data_store import load_table, write_csv_atomic
+    from backend import geo_grid, metrics
+
+BASE = Path(__file__).resolve().parents[0]
 DATA_DIR = BASE / "data"
 DATA_DIR.mkdir(exist_ok=True)
+WATERMARK_FILE = DATA_DIR / "weather_watermarks.json"
 
 OPEN_METEO_DAILY_PARAMS = "temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max"
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+WEATHER_COLUMNS = ["temp_max", "temp_min", "precip_mm", "wind_speed"]
 
 # --------------------------------------------------------------------------------
 # WEATHER FETCH
 # --------------------------------------------------------------------------------
-def fetch_weather_for_coords(lat, lon, days=30):
-    """
-    Fetch daily weather via Open-Meteo for the last `days`.
-    Uses the archive API for past data and forecast API for recent days.
-    """
-    import datetime, requests, pandas as pd
+def _daily_frame(j):
+    daily = j.get("daily", {})
+    df = pd.DataFrame({
+        "date": pd.to_datetime(daily.get("time", [])),
+        "temp_max": daily.get("temperature_2m_max", []),
+        "temp_min": daily.get("temperature_2m_min", []),
+        "precip_mm": daily.get("precipitation_sum", []),
+        "wind_speed": daily.get("windspeed_10m_max", []),
+    })
+    df["date"] = df["date"].dt.date
+    return df
 
-    end = datetime.date.today() - datetime.timedelta(days=1)  # ✅ avoid invalid end_date
-    start = end - datetime.timedelta(days=days)
-    url = "https://archive-api.open-meteo.com/v1/archive"
+
+def fetch_weather_range(lat, lon, start, end):
+    """Daily archive weather for [start, end] (inclusive dates)."""
     params = {
         "latitude": lat,
         "longitude": lon,
-        "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max",
+        "daily": OPEN_METEO_DAILY_PARAMS,
         "start_date": start.isoformat(),
         "end_date": end.isoformat(),
         "timezone": "UTC",
     }
+    with metrics.upstream_call("weather_archive"):
+        r = requests.get(ARCHIVE_URL, params=params, timeout=20)
+        r.raise_for_status()
+    return _daily_frame(r.json())
 
-    print(f"🌦 Fetching weather from {start} to {end}...")
-    r = requests.get(url, params=params, timeout=20)
 
-    if r.status_code != 200:
-        print(f"⚠️ Archive API failed ({r.status_code}) — using forecast fallback")
-        url = "https://api.open-meteo.com/v1/forecast"
+@metrics.stage("fetch_weather_for_coords")
+def fetch_weather_for_coords(lat, lon, days=30):
+    """
+    Fetch daily weather via Open-Meteo for the last `days`, at the centre of the grid cell
+    containing lat/lon (see geo_grid), so nearby locations make identical requests.
+    Uses the archive API for past data and forecast API for recent days.
+    """
+    _, lat, lon = geo_grid.snap(lat, lon)
+    end = datetime.date.today() - datetime.timedelta(days=1)  # ✅ avoid invalid end_date
+    start = end - datetime.timedelta(days=days)
+
+    print(f"🌦 Fetching weather from {start} to {end}...")
+    try:
+        df = fetch_weather_range(lat, lon, start, end)
+    except requests.HTTPError as e:
+        print(f"⚠️ Archive API failed ({e.response.status_code}) — using forecast fallback")
         params = {
             "latitude": lat,
             "longitude": lon,
-            "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max",
+            "daily": OPEN_METEO_DAILY_PARAMS,
             "forecast_days": 7,
             "timezone": "auto",
         }
-        r = requests.get(url, params=params, timeout=20)
-        r.raise_for_status()
+        with metrics.upstream_call("weather"):
+            r = requests.get(FORECAST_URL, params=params, timeout=20)
+            r.raise_for_status()
+        df = _daily_frame(r.json())
 
-    j = r.json()
-    daily = j.get("daily", {})
-    df = pd.DataFrame({
-        "date": pd.to_datetime(daily.get("time", [])),
-        "temp_max": daily.get("temperature_2m_max", []),
-        "temp_min": daily.get("temperature_2m_min", []),
-        "precip_mm": daily.get("precipitation_sum", []),
-        "wind_speed": daily.get("windspeed_10m_max", []),
-    })
-    df["date"] = df["date"].dt.date
     print(f"✅ Got {len(df)} weather records.")
     return df
 
 
+# --------------------------------------------------------------------------------
+# INCREMENTAL WEATHER INGESTION
+# --------------------------------------------------------------------------------
+def location_key(lat, lon, region=None):
+    return region if region else f"{float(lat):.4f},{float(lon):.4f}"
+
+
+def load_watermarks(path=WATERMARK_FILE):
+    if not Path(path).exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_watermarks(marks, path=WATERMARK_FILE):
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(marks, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def missing_ranges(have_dates, start, end, chunk_days=90):
+    """
+    Contiguous [from, to] date ranges within [start, end] that are not in `have_dates`,
+    split so no range is longer than `chunk_days`.
+    """
+    have = set(have_dates)
+    ranges, cur = [], None
+    day = start
+    while day <= end:
+        if day not in have:
+            if cur is not None and (day - cur[0]).days < chunk_days and cur[1] == day - datetime.timedelta(days=1):
+                cur[1] = day
+            else:
+                cur = [day, day]
+                ranges.append(cur)
+        day += datetime.timedelta(days=1)
+    return [tuple(r) for r in ranges]
+
+
+def ingest_weather_incremental(lat, lon, region=None, filename=None, days=365, chunk_days=90, max_chunks=None):
+    """
+    Bring the local weather store for one location up to yesterday.
+    Only dates missing from the store within the last `days` are fetched (normally just the
+    days since the last run), in chunks of at most `chunk_days`; rows are upserted on date and
+    the per-location watermark is advanced. Returns the full stored DataFrame.
+    """
+    if filename is None:
+        filename = f"weather_{region}.csv" if region else "weather_recent.csv"
+    path = DATA_DIR / filename
+    key = location_key(lat, lon, region)
+    end = datetime.date.today() - datetime.timedelta(days=1)
+    start = end - datetime.timedelta(days=days)
+
+    marks = load_watermarks()
+    mark = marks.get(key, {})
+    if path.exists():
+        stored = load_table(path)
+        stored["date"] = pd.to_datetime(stored["date"]).dt.date
+    else:
+        stored = pd.DataFrame(columns=["date"] + WEATHER_COLUMNS)
+    if path.exists() and mark.get("path") == filename and mark.get("last_date", "") >= end.isoformat() \
+            and mark.get("first_date", "9999") <= start.isoformat():
+        print(f"✅ Weather for {key} already current (through {mark['last_date']}).")
+        return stored
+
+    ranges = missing_ranges(stored["date"], start, end, chunk_days)
+    if max_chunks is not None:
+        ranges = ranges[-max_chunks:]  # newest first matters most for daily runs
+    frames = []
+    for lo, hi in ranges:
+        print(f"🌦 Fetching weather for {key}: {lo} → {hi}")
+        chunk = fetch_weather_range(lat, lon, lo, hi)
+        # the archive lags a few days; all-null rows are left out so the next run retries them
+        frames.append(chunk.dropna(subset=WEATHER_COLUMNS, how="all"))
+    new = pd.concat(frames, ignore_index=True) if frames else stored.iloc[:0]
+    if region and "region" not in new.columns:
+        new.insert(0, "region", region)
+
+    if len(new):
+        merged = pd.concat([stored, new], ignore_index=True)
+        merged = merged.drop_duplicates(subset=["date"], keep="last").sort_values("date").reset_index(drop=True)
+        if "region" in merged.columns:
+            merged = merged[["region"] + [c for c in merged.columns if c != "region"]]
+        write_csv_atomic(merged, path)
+    else:
+        merged = stored
+    if len(merged):
+        marks = load_watermarks()
+        marks[key] = {
+            "lat": float(lat), "lon": float(lon), "path": filename,
+            "first_date": min(merged["date"]).isoformat(), "last_date": max(merged["date"]).isoformat(),
+            "updated": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        save_watermarks(marks)
+    print(f"✅ {key}: {len(new)} new weather rows from {len(ranges)} request(s); store has {len(merged)} rows.")
+    return merged
+
+
+def ingest_weather_cells(index, days=30, chunk_days=90, path=geo_grid.CELLS_FILE, fetch=fetch_weather_range):
+    """
+    Bring per-cell weather (data/cell_weather.csv: cell, date, ...) up to yesterday for every cell
+    of a geo_grid.GridIndex. Each cell is fetched once, at its centre, and only for the dates it is
+    missing, however many fields/warehouses it holds. Returns a summary of what was fetched.
+    """
+    end = datetime.date.today() - datetime.timedelta(days=1)
+    start = end - datetime.timedelta(days=days)
+    stored = geo_grid.load_cell_weather(path)
+    have = {}
+    if len(stored):
+        dates = pd.to_datetime(stored["date"]).dt.date
+        have = dates.groupby(stored["cell"].astype(str).to_numpy()).agg(set).to_dict()
+    cells = index.cells()
+    frames, requests_made, failed = [], 0, []
+    for cell in cells.itertuples(index=False):
+        for lo, hi in missing_ranges(have.get(cell.cell, ()), start, end, chunk_days):
+            requests_made += 1
+            try:
+                chunk = fetch(cell.lat, cell.lon, lo, hi)
+            except requests.RequestException as e:
+                print(f"⚠️ Weather for cell {cell.cell} ({lo} → {hi}) failed: {e}")
+                failed.append(cell.cell)
+                continue
+            chunk = chunk.dropna(subset=WEATHER_COLUMNS, how="all")
+            chunk.insert(0, "cell", cell.cell)
+            frames.append(chunk)
+    new = pd.concat(frames, ignore_index=True) if frames else None
+    if new is not None and len(new):
+        old = stored.assign(cell=stored["cell"].astype(str), date=pd.to_datetime(stored["date"]).dt.date)
+        merged = pd.concat([old, new], ignore_index=True) if len(old) else new
+        merged = merged.drop_duplicates(subset=["cell", "date"], keep="last").sort_values(["cell", "date"])
+        write_csv_atomic(merged, path)
+    n_new = 0 if new is None else len(new)
+    print(f"✅ {len(index)} locations in {len(cells)} cells: {requests_made} request(s), {n_new} new weather rows")
+    return {"members": len(index), "cells": len(cells), "requests": requests_made, "rows": n_new,
+            "failed_cells": sorted(set(failed))}
+
+
 # --------------------------------------------------------------------------------
 # PRICE FETCH
 # --------------------------------------------------------------------------------
+# candidate source column names, in order of preference
+DATE_COLUMNS = ['date', 'Date', 'Price Date', 'PRICE DATE']
+PRICE_COLUMNS = ['Modal_Price', 'Price', 'Max_Price', 'Min_Price']
+COMMODITY_COLUMNS = ['Commodity', 'Crop', 'Product']
+
+
+def detect_price_columns(columns):
+    """Return (date_col, price_col, commodity_col) from a header; date/commodity may be None."""
+    date_col = next((c for c in DATE_COLUMNS if c in columns), None)
+    price_col = next((c for c in PRICE_COLUMNS if c in columns), None)
+    commodity_col = next((c for c in COMMODITY_COLUMNS if c in columns), None)
+    if price_col is None:
+        raise ValueError("❌ No price-related column found in dataset!")
+    return date_col, price_col, commodity_col
+
+
 def fetch_prices_csv(csv_url):
     """
     Fetch and clean agricultural market price CSV (supports Agmarknet format).
     """
     print(f"📥 Loading price data from: {csv_url}")
     df = pd.read_csv(csv_url)
+    date_col, price_col, commodity_col = detect_price_columns(df.columns)
 
     # --- Handle date column ---
-    if 'date' in df.columns:
-        date_col = 'date'
-    elif 'Date' in df.columns:
-        date_col = 'Date'
-    elif 'Price Date' in df.columns:
-        date_col = 'Price Date'
-    elif 'PRICE DATE' in df.columns:
-        date_col = 'PRICE DATE'
-    else:
+    if date_col is None:
         print("⚠️ No 'date' column found — generating sequential dates.")
         df['date'] = pd.date_range(end=pd.Timestamp.today(), periods=len(df))
         date_col = 'date'
@@ -94,24 +270,11 @@ def fetch_prices_csv(csv_url):
     df['date'] = pd.to_datetime(df['date'], errors='coerce')
 
     # --- Handle price column ---
-    if 'Modal_Price' in df.columns:
-        df.rename(columns={'Modal_Price': 'price'}, inplace=True)
-    elif 'Price' in df.columns:
-        df.rename(columns={'Price': 'price'}, inplace=True)
-    elif 'Max_Price' in df.columns:
-        df.rename(columns={'Max_Price': 'price'}, inplace=True)
-    elif 'Min_Price' in df.columns:
-        df.rename(columns={'Min_Price': 'price'}, inplace=True)
-    else:
-        raise ValueError("❌ No price-related column found in dataset!")
+    df.rename(columns={price_col: 'price'}, inplace=True)
 
     # --- Handle commodity column ---
-    if 'Commodity' in df.columns:
-        df.rename(columns={'Commodity': 'commodity'}, inplace=True)
-    elif 'Crop' in df.columns:
-        df.rename(columns={'Crop': 'commodity'}, inplace=True)
-    elif 'Product' in df.columns:
-        df.rename(columns={'Product': 'commodity'}, inplace=True)
+    if commodity_col is not None:
+        df.rename(columns={commodity_col: 'commodity'}, inplace=True)
     else:
         df['commodity'] = "Unknown"
 
@@ -130,6 +293,102 @@ def fetch_prices_csv(csv_url):
     print(df.head())
     return df
 
+
+def _partition_name(commodity):
+    safe = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in str(commodity).strip())
+    return f"{safe or 'Unknown'}.csv"
+
+
+def _replace_dir(src, dst):
+    """Swap directory src in as dst; a previous dst is moved aside first and removed once replaced."""
+    old = dst.with_name(f".{dst.name}.{os.getpid()}.old")
+    if dst.exists():
+        os.replace(dst, old)
+    try:
+        os.replace(src, dst)
+    except OSError:
+        if old.exists():
+            os.replace(old, dst)
+        raise
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def stream_prices_csv(csv_url, output_path=None, chunksize=250_000, partition_by_commodity=False):
+    """
+    Streaming variant of fetch_prices_csv for multi-GB dumps: the header is probed once, only the
+    date/price/commodity columns are read, and each chunk is cleaned and appended to the output,
+    so memory stays bounded by `chunksize` regardless of input size.
+    Output rows keep input order (no global sort). With partition_by_commodity, rows go to
+    <output_dir>/<commodity>.csv instead of a single file. Either way the output is built under a
+    temporary sibling name and swapped in when complete, so readers never see a partial dump.
+    Returns a stats dict.
+    """
+    print(f"📥 Streaming price data from: {csv_url}")
+    header = pd.read_csv(csv_url, nrows=0).columns
+    date_col, price_col, commodity_col = detect_price_columns(header)
+    if date_col is None:
+        raise ValueError("❌ Streaming mode needs a date column (sequential dates require the full file).")
+    usecols = [date_col, price_col] + ([commodity_col] if commodity_col else [])
+    names = {date_col: 'date', price_col: 'price', commodity_col: 'commodity'}
+
+    if output_path is None:
+        output_path = DATA_DIR / ("processed_prices" if partition_by_commodity else "processed_prices.csv")
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if partition_by_commodity:
+        tmp_path = Path(tempfile.mkdtemp(prefix=f".{output_path.name}.", suffix=".tmp", dir=output_path.parent))
+        written = set()
+    else:
+        tmp_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.tmp")
+        out = open(tmp_path, "w", newline="")
+
+    rows_read = rows_kept = 0
+    t0 = time.perf_counter()
+    try:
+        reader = pd.read_csv(csv_url, usecols=usecols, dtype={c: str for c in usecols}, chunksize=chunksize)
+        for i, chunk in enumerate(reader):
+            rows_read += len(chunk)
+            chunk = chunk.rename(columns=names)
+            if 'commodity' not in chunk.columns:
+                chunk['commodity'] = "Unknown"
+            chunk['date'] = pd.to_datetime(chunk['date'], errors='coerce')
+            chunk['price'] = pd.to_numeric(chunk['price'], errors='coerce').astype('float32')
+            chunk = chunk[['date', 'commodity', 'price']].dropna()
+            rows_kept += len(chunk)
+            if partition_by_commodity:
+                for commodity, part in chunk.groupby('commodity', sort=False):
+                    path = tmp_path / _partition_name(commodity)
+                    part.to_csv(path, mode='a', header=path not in written, index=False)
+                    written.add(path)
+            else:
+                chunk.to_csv(out, header=(i == 0), index=False)
+        if partition_by_commodity:
+            _replace_dir(tmp_path, output_path)
+        else:
+            out.close()
+            os.replace(tmp_path, output_path)
+    finally:
+        if partition_by_commodity:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        elif not out.closed:
+            out.close()
+            tmp_path.unlink()
+
+    seconds = time.perf_counter() - t0
+    stats = {
+        "rows_read": rows_read,
+        "rows_dropped": rows_read - rows_kept,
+        "rows_written": rows_kept,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(rows_read / seconds) if seconds > 0 else None,
+        "output": str(output_path),
+    }
+    if partition_by_commodity:
+        stats["partitions"] = len(written)
+    print(f"✅ Streamed {rows_read} rows ({stats['rows_dropped']} dropped) in {stats['seconds']}s "
+          f"— {stats['rows_per_sec']} rows/s → {output_path}")
+    return stats
+
 # --------------------------------------------------------------------------------
 # SAVE HELPERS
 # --------------------------------------------------------------------------------
@@ -141,7 +400,7 @@ def save_prices(df, filename="market_prices_real.csv"):
 
 def save_weather(df, filename="weather_recent.csv"):
     path = DATA_DIR / filename
-    df.to_csv(path, index=False)
+    write_csv_atomic(df, path)
     print(f"💾 Saved weather to {path}")
     return path
 
@@ -152,15 +411,26 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Fetch and clean agriculture data")
     parser.add_argument("--fetch-weather", nargs=2, metavar=("LAT", "LON"), help="Fetch weather for lat lon")
+    parser.add_argument("--region", help="Region name for --fetch-weather (stored as weather_<region>.csv)")
+    parser.add_argument("--full", action="store_true", help="Re-download the whole year instead of only missing days")
     parser.add_argument("--fetch-prices-csv", nargs=1, metavar=("CSV_PATH"), help="Fetch prices from CSV or URL")
+    parser.add_argument("--stream", action="store_true", help="Process --fetch-prices-csv in chunks (for multi-GB dumps)")
+    parser.add_argument("--chunksize", type=int, default=250_000, help="Rows per chunk with --stream")
+    parser.add_argument("--partition", action="store_true", help="With --stream, write one CSV per commodity")
     args = parser.parse_args()
 
     if args.fetch_weather:
         lat, lon = args.fetch_weather
-        dfw = fetch_weather_for_coords(float(lat), float(lon), days=365)
-        save_weather(dfw)
+        if args.full:
+            dfw = fetch_weather_for_coords(float(lat), float(lon), days=365)
+            save_weather(dfw, f"weather_{args.region}.csv" if args.region else "weather_recent.csv")
+        else:
+            ingest_weather_incremental(float(lat), float(lon), region=args.region, days=365)
 
     if args.fetch_prices_csv:
         csv = args.fetch_prices_csv[0]
-        dfp = fetch_prices_csv(csv)
-        save_prices(dfp)
+        if args.stream:
+            stream_prices_csv(csv, chunksize=args.chunksize, partition_by_commodity=args.partition)
+        else:
+            dfp = fetch_prices_csv(csv)
+            save_prices(dfp)
@@ -4,45 +4,82 @@
 import pandas as pd
 from pathlib import Path
 
-BASE = Path(__file__).resolve().parents[1]
+try:
+    from data_store import load_table
+    from features import add_lag_features
+except ImportError:  # imported as backend.data_prep from the repo root
+    from backend.data_store import load_table
+    from backend.features import add_lag_features
+
+BASE = Path(__file__).resolve().parents[0]
 DATA_DIR = BASE / "data"
 
 def load_prices(path=None):
     if path is None:
         path = DATA_DIR / "market_prices_real.csv"
-    return pd.read_csv(path, parse_dates=["date"])
+    return load_table(path)
 
 def load_weather(path=None):
     if path is None:
         path = DATA_DIR / "weather_recent.csv"
-    df = pd.read_csv(path, parse_dates=["date"])
+    df = load_table(path)
     return df
 
-def merge_prices_weather(prices_df, weather_df):
+def _join_keys(df):
+    keys = pd.DataFrame({"date": pd.to_datetime(df["date"]).astype("datetime64[ns]").to_numpy()})
+    if "region" in df.columns:
+        keys["region"] = df["region"].astype(str).to_numpy()
+    return keys
+
+def merge_prices_weather(prices_df, weather_df, tolerance_days=0, direction="backward"):
     """
-    Merge by date; prices may be daily or monthly. We'll merge on exact date.
-    If weather has daily rows and prices are monthly, consider resampling weather to price dates.
+    Attach weather to every price row, matching on (region, date) when both frames have a region
+    column and on date alone otherwise (weather from several regions is then averaged per date,
+    so a price row is never repeated once per region).
+    tolerance_days > 0 makes it an as-of join for monthly or sparse prices: the closest weather
+    row within the tolerance in `direction` ("backward", "forward" or "nearest") is used.
+    Both sides are sorted once and matched with merge_asof, so cost is linear after the sort.
+    Returns exactly one row per input price row, in input order.
     """
-    # Ensure date columns are datetime.date
-    prices_df = prices_df.copy()
-    weather_df = weather_df.copy()
-    prices_df["date"] = pd.to_datetime(prices_df["date"]).dt.date
-    weather_df["date"] = pd.to_datetime(weather_df["date"]).dt.date
+    by = "region" if "region" in prices_df.columns and "region" in weather_df.columns else None
+    wcols = [c for c in weather_df.columns if c not in ("date", "region")]
+
+    right = _join_keys(weather_df)
+    for c in wcols:
+        right[c] = weather_df[c].to_numpy()
+    if by is None:
+        right = right.drop(columns="region", errors="ignore")
+        right = right.groupby("date", sort=False)[wcols].mean(numeric_only=True).reset_index()
+    else:
+        right = right.drop_duplicates(subset=["region", "date"], keep="last")
+    right = right.sort_values("date", kind="stable")
+
+    left = _join_keys(prices_df)
+    if by is None:
+        left = left.drop(columns="region", errors="ignore")
+    left["_row"] = range(len(left))
+    left = left.sort_values("date", kind="stable")
+
+    matched = pd.merge_asof(
+        left, right, on="date", by=by, direction=direction,
+        tolerance=pd.Timedelta(days=tolerance_days), allow_exact_matches=True,
+    ).sort_values("_row", kind="stable")
+    if len(matched) != len(prices_df):
+        raise ValueError(f"weather join changed the row count ({len(prices_df)} -> {len(matched)})")
 
-    merged = prices_df.merge(weather_df, on="date", how="left")
+    merged = prices_df.reset_index(drop=True).copy()
+    merged["date"] = pd.to_datetime(merged["date"])
+    for c in right.columns:
+        if c not in ("date", "region"):
+            merged[c] = matched[c].to_numpy()
     return merged
 
-def make_price_lags(df, n_lags=7):
+def make_price_lags(df, n_lags=7, rolling=()):
     """
-    For each commodity, create lag_1..lag_n features of price.
+    For each commodity, create lag_1..lag_n (and roll_mean_<w>) features of price, as float32.
+    Rows without a full price history are dropped; the rest come back in date order.
     """
-    df = df.sort_values("date").copy()
-    lag_cols = []
-    for lag in range(1, n_lags+1):
-        col = f"lag_{lag}"
-        df[col] = df.groupby("commodity")["price"].shift(lag)
-        lag_cols.append(col)
-    return df.dropna(subset=lag_cols + ["price"]).reset_index(drop=True)
+    return add_lag_features(df, n_lags, key="commodity", rolling=rolling)
 
 if __name__ == "__main__":
     prices = load_prices()
@@ -0,0 +1,205 @@
+# backend/data_store.py
+# Shared, cached access to the CSV tables under backend/data/.
+# Tables are parsed once with compact dtypes (categorical labels, float32 measurements), kept in
+# memory until the CSV changes on disk, and persisted as a columnar copy (one .npy per column in
+# <name>.cols/ next to the CSV) so cold starts and batch jobs skip text parsing.
+
+import json
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import metrics
+except ImportError:  # imported as backend.data_store from the repo root
+    from backend import metrics
+
+BASE = Path(__file__).resolve().parents[0]
+DATA_DIR = BASE / "data"
+
+CATEGORY_COLUMNS = {"crop", "commodity", "region", "health_label", "crop_stage", "warehouse_id", "location"}
+DATE_COLUMNS = {"date"}
+COLUMNAR_FORMAT = 1
+
+CachedTable = namedtuple("CachedTable", ["df", "stat"])
+
+
+def _source_stat(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def compact_dtypes(df):
+    """Categorical labels/strings and float32 measurements; dates and integers are left as-is."""
+    for col in df.columns:
+        s = df[col]
+        if col in CATEGORY_COLUMNS or s.dtype == object or pd.api.types.is_string_dtype(s.dtype):
+            if not isinstance(s.dtype, pd.CategoricalDtype) and col not in DATE_COLUMNS:
+                df[col] = s.astype("category")
+        elif pd.api.types.is_float_dtype(s.dtype) and s.dtype != np.float32:
+            df[col] = s.astype(np.float32)
+    return df
+
+
+def write_csv_atomic(df, path, **kwargs):
+    """to_csv into a hidden temp file next to `path`, then rename over it."""
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        df.to_csv(tmp, index=False, **kwargs)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return path
+
+
+class DataStore:
+    """
+    In-memory cache of CSV tables keyed by path, invalidated when the file's mtime/size change.
+    Reads go: memory -> columnar copy (if it matches the CSV's stat) -> CSV parse.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, persist=None):
+        self.data_dir = Path(data_dir)
+        if persist is None:
+            persist = os.environ.get("DATA_STORE_PERSIST", "1") != "0"
+        self.persist = persist
+        self._tables = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def resolve(self, name):
+        path = Path(name)
+        if not path.suffix:
+            path = path.with_suffix(".csv")
+        if not path.is_absolute() and path.parent == Path("."):
+            path = self.data_dir / path
+        return path
+
+    def table(self, name, copy=True):
+        """
+        DataFrame for `name` (a file name under data_dir, or any CSV path).
+        Pass copy=False only when the caller won't mutate the frame.
+        """
+        path = self.resolve(name)
+        stat = _source_stat(path)
+        key = str(path)
+        cached = self._tables.get(key)
+        if cached is None or cached.stat != stat:
+            with self._key_lock(key):
+                cached = self._tables.get(key)
+                if cached is None or cached.stat != stat:
+                    t0 = time.perf_counter()
+                    df = self._load_columnar(path, stat)
+                    if df is None:
+                        metrics.cache_result("table", "csv")
+                        with metrics.stage("csv_parse"):
+                            df = self._parse_csv(path)
+                        if self.persist:
+                            self._save_columnar(path, stat, df)
+                    else:
+                        # timed only when a columnar copy was actually loaded, not for the stat miss
+                        metrics.STAGE_SECONDS.observe(time.perf_counter() - t0, "table_columnar_load")
+                        metrics.cache_result("table", "columnar")
+                    cached = CachedTable(df, stat)
+                    with self._lock:
+                        self._tables[key] = cached
+                else:
+                    metrics.cache_result("table", "hit")
+        else:
+            metrics.cache_result("table", "hit")
+        return cached.df.copy() if copy else cached.df
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(str(self.resolve(name)), None)
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    # ------------------------------------------------------------------
+    # CSV
+    # ------------------------------------------------------------------
+    def _parse_csv(self, path):
+        header = pd.read_csv(path, nrows=0).columns
+        dtypes = {c: "category" for c in header if c in CATEGORY_COLUMNS}
+        dates = [c for c in header if c in DATE_COLUMNS]
+        df = pd.read_csv(path, dtype=dtypes, parse_dates=dates)
+        return compact_dtypes(df)
+
+    # ------------------------------------------------------------------
+    # Columnar copy: <stem>.cols/{meta.json, <i>.npy, <i>.codes.npy}
+    # ------------------------------------------------------------------
+    @staticmethod
+    def columnar_dir(path):
+        return path.with_name(f"{path.stem}.cols")
+
+    def _load_columnar(self, path, stat):
+        cdir = self.columnar_dir(path)
+        try:
+            with open(cdir / "meta.json") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("format") != COLUMNAR_FORMAT or meta.get("source_stat") != stat:
+            return None
+        try:
+            cols = {}
+            for i, col in enumerate(meta["columns"]):
+                name = col["name"]
+                if col["kind"] == "category":
+                    codes = np.load(cdir / f"{i}.codes.npy", mmap_mode="r")
+                    cols[name] = pd.Categorical.from_codes(codes, categories=col["categories"])
+                else:
+                    cols[name] = np.load(cdir / f"{i}.npy", mmap_mode="r")
+            return pd.DataFrame(cols, columns=[c["name"] for c in meta["columns"]])
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Ignoring columnar copy of {path.name}: {e}")
+            return None
+
+    def _save_columnar(self, path, stat, df):
+        cdir = self.columnar_dir(path)
+        tmp = cdir.with_name(f".{cdir.name}.{os.getpid()}.tmp")
+        try:
+            shutil.rmtree(tmp, ignore_errors=True)
+            tmp.mkdir()
+            columns = []
+            for i, name in enumerate(df.columns):
+                s = df[name]
+                if isinstance(s.dtype, pd.CategoricalDtype):
+                    np.save(tmp / f"{i}.codes.npy", np.asarray(s.cat.codes))
+                    columns.append({"name": name, "kind": "category", "categories": s.cat.categories.tolist()})
+                else:
+                    np.save(tmp / f"{i}.npy", s.to_numpy())
+                    columns.append({"name": name, "kind": "array"})
+            with open(tmp / "meta.json", "w") as f:
+                json.dump({"format": COLUMNAR_FORMAT, "source": path.name, "source_stat": stat, "columns": columns}, f)
+            shutil.rmtree(cdir, ignore_errors=True)
+            os.replace(tmp, cdir)
+        except Exception as e:
+            # the columnar copy is only an accelerator; a read-only data dir is fine
+            print(f"⚠️ Could not persist columnar copy of {path.name}: {e}")
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+_default_store = DataStore()
+
+
+def default_store():
+    return _default_store
+
+
+def load_table(name, copy=True):
+    """Cached DataFrame for a CSV under backend/data (or any CSV path)."""
+    return _default_store.table(name, copy=copy)
@@ -0,0 +1,231 @@
+# backend/feature_store.py
+# Per-field rolling features over the satellite series (satellite.csv), for health predictions
+# by field_id. Each field owns one slot in a preallocated ring buffer holding the last `window`
+# days of every signal (float32, slot = day % window), so memory is fixed per field no matter
+# how much history arrives: 100k fields x 30 days x 4 signals is ~48 MB.
+# New rows are scattered into the rings in one vectorized pass per batch; the rolling features
+# (7/30-day means, 30-day slope, anomaly vs the 30-day mean) are computed from a field's ring on
+# lookup, which is constant work per field.
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    from data_store import load_table
+except ImportError:  # imported as backend.feature_store from the repo root
+    from backend.data_store import load_table
+
+SIGNALS = ("ndvi", "evi", "soil_moisture", "pest_index")
+WINDOW = 30
+SHORT_WINDOW = 7
+MAX_FIELDS = int(os.environ.get("FEATURE_STORE_MAX_FIELDS", 200_000))
+
+
+def _day_numbers(dates):
+    return pd.to_datetime(dates).to_numpy(dtype="datetime64[D]").astype(np.int64)
+
+
+def _day_string(day):
+    return str(np.datetime64(int(day), "D"))
+
+
+def rolling_features(vals, window=WINDOW, short=SHORT_WINDOW, signals=SIGNALS):
+    """
+    vals: (n_fields, window, n_signals), oldest day first, NaN where a day is missing.
+    Returns {feature: (n_fields,) array}: the latest value plus <signal>_mean7, _mean30,
+    _slope30 (per day, least squares) and _anomaly (latest minus 30-day mean, in 30-day stds).
+    """
+    out = {}
+    t = np.arange(window, dtype=np.float64)
+    present = ~np.isnan(vals)
+    n = present.sum(axis=1)
+    filled = np.where(present, vals, 0.0).astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = filled.sum(axis=1) / n
+        mean_short = filled[:, -short:].sum(axis=1) / present[:, -short:].sum(axis=1)
+        var = (np.where(present, (vals - mean[:, None, :]) ** 2, 0.0)).sum(axis=1) / n
+        t_mean = (present * t[None, :, None]).sum(axis=1) / n
+        dt = np.where(present, t[None, :, None] - t_mean[:, None, :], 0.0)
+        slope = (dt * (filled - mean[:, None, :])).sum(axis=1) / (dt ** 2).sum(axis=1)
+        latest = vals[:, -1, :]
+        anomaly = (latest - mean) / np.sqrt(var)
+    anomaly[~np.isfinite(anomaly)] = np.nan
+    slope[~np.isfinite(slope)] = np.nan
+    for j, s in enumerate(signals):
+        out[s] = latest[:, j]
+        out[f"{s}_mean{short}"] = mean_short[:, j]
+        out[f"{s}_mean{window}"] = mean[:, j]
+        out[f"{s}_slope{window}"] = slope[:, j]
+        out[f"{s}_anomaly"] = anomaly[:, j]
+    return out
+
+
+class FieldFeatureStore:
+    """Ring-buffered per-field signals, keyed by field_id (compared as strings)."""
+
+    def __init__(self, window=WINDOW, signals=SIGNALS, max_fields=MAX_FIELDS, capacity=1024):
+        self.window = window
+        self.signals = tuple(signals)
+        self.max_fields = max_fields
+        self._slots = {}
+        self._ring = np.full((capacity, window, len(self.signals)), np.nan, dtype=np.float32)
+        self._last_day = np.full(capacity, np.iinfo(np.int64).min // 2, dtype=np.int64)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def nbytes(self):
+        return self._ring.nbytes + self._last_day.nbytes
+
+    def _grow(self, need):
+        cap = len(self._ring)
+        if need <= cap:
+            return
+        new_cap = min(max(need, cap * 2), self.max_fields)
+        ring = np.full((new_cap, self.window, len(self.signals)), np.nan, dtype=np.float32)
+        ring[:cap] = self._ring
+        last = np.full(new_cap, np.iinfo(np.int64).min // 2, dtype=np.int64)
+        last[:cap] = self._last_day
+        self._ring, self._last_day = ring, last
+
+    def _slot_ids(self, field_ids):
+        """Slots for field_ids, allocating new ones; -1 where the store is full."""
+        codes, uniq = pd.factorize(field_ids)
+        slots = np.empty(len(uniq), dtype=np.int64)
+        index = self._slots
+        for i, f in enumerate(uniq.tolist()):
+            s = index.get(f)
+            if s is None:
+                s = index[f] = len(index) if len(index) < self.max_fields else -1
+                if s < 0:
+                    del index[f]
+            slots[i] = s
+        self._grow(len(index))
+        return slots[codes]
+
+    def ingest(self, df):
+        """
+        Add observations (date, field_id, *signals). Rows older than a field's window are ignored,
+        late rows inside the window overwrite their day. Returns the number of rows applied.
+        """
+        if not len(df):
+            return 0
+        fields = df["field_id"].astype(str).to_numpy()
+        days = _day_numbers(df["date"])
+        vals = np.column_stack([pd.to_numeric(df[s], errors="coerce").to_numpy(dtype=np.float64) for s in self.signals])
+        with self._lock:
+            slot = self._slot_ids(fields)
+            ok = slot >= 0
+            if not ok.all():
+                print(f"⚠️ Feature store full ({self.max_fields} fields); dropped {int((~ok).sum())} rows")
+            slot, days, vals = slot[ok], days[ok], vals[ok]
+            if not len(slot):
+                return 0
+            # per touched field: the new latest day, then forget ring days that fall out of the window
+            touched, inv = np.unique(slot, return_inverse=True)
+            batch_max = np.full(len(touched), np.iinfo(np.int64).min, dtype=np.int64)
+            np.maximum.at(batch_max, inv, days)
+            old_last = self._last_day[touched]
+            new_last = np.maximum(old_last, batch_max)
+            pos = np.arange(self.window)
+            held_day = old_last[:, None] - ((old_last[:, None] - pos[None, :]) % self.window)
+            fi, pi = np.nonzero(held_day <= (new_last[:, None] - self.window))
+            self._ring[touched[fi], pi] = np.nan
+            self._last_day[touched] = new_last
+            # keep rows inside their field's window; the last row for a (field, day) wins
+            keep = days > new_last[inv] - self.window
+            order = np.lexsort((np.arange(len(slot)), days, slot))
+            order = order[keep[order]]
+            s, d = slot[order], days[order]
+            last_of_pair = np.append((s[1:] != s[:-1]) | (d[1:] != d[:-1]), True)
+            order = order[last_of_pair]
+            self._ring[slot[order], days[order] % self.window] = vals[order]
+            return int(len(order))
+
+    def window_values(self, field_ids):
+        """((n, window, n_signals) values oldest-first, latest day numbers, found mask)."""
+        with self._lock:
+            slot = np.array([self._slots.get(str(f), -1) for f in field_ids], dtype=np.int64)
+            found = slot >= 0
+            s = slot[found]
+            last = self._last_day[s]
+            days = last[:, None] - np.arange(self.window)[::-1][None, :]
+            vals = np.full((len(slot), self.window, len(self.signals)), np.nan, dtype=np.float64)
+            vals[found] = self._ring[s[:, None], days % self.window]
+            last_all = np.full(len(slot), -1, dtype=np.int64)
+            last_all[found] = last
+        return vals, last_all, found
+
+    def features(self, field_id):
+        """Rolling features for one field as a dict (with "as_of" date), or None if unknown."""
+        vals, last, found = self.window_values([field_id])
+        if not found[0]:
+            return None
+        feats = {k: (None if np.isnan(v[0]) else float(v[0])) for k, v in rolling_features(vals, self.window, signals=self.signals).items()}
+        feats["as_of"] = _day_string(last[0])
+        return feats
+
+
+class SatelliteFeatures:
+    """
+    A FieldFeatureStore fed from a satellite CSV. sync() ingests only rows dated on or after the
+    newest day seen so far whenever the DataStore frame changes (i.e. the file was appended to).
+    """
+
+    def __init__(self, path, store=None):
+        self.path = path
+        self.store = store or FieldFeatureStore()
+        self._df = None
+        self._watermark = None
+        self._lock = threading.Lock()
+
+    def sync(self):
+        df = load_table(self.path, copy=False)
+        if df is self._df:
+            return 0
+        with self._lock:
+            if df is self._df:
+                return 0
+            days = _day_numbers(df["date"])
+            new = df if self._watermark is None else df[days >= self._watermark]
+            n = self.store.ingest(new)
+            if len(days):
+                self._watermark = int(days.max())
+            self._df = df
+        return n
+
+    def features(self, field_id):
+        self.sync()
+        return self.store.features(field_id)
+
+
+class WeatherAsOf:
+    """Latest weather row on or before a day, from a date-indexed weather CSV."""
+
+    def __init__(self, path):
+        self.path = path
+        # (source frame, rows sorted by date, their day numbers), replaced as one tuple so a
+        # lookup never pairs the days of one version with the rows of another
+        self._state = (None, None, None)
+
+    def sync(self):
+        """Re-sort the table by date if the DataStore frame changed. Returns the current state."""
+        df = load_table(self.path, copy=False)
+        state = self._state
+        if df is not state[0]:
+            order = np.argsort(_day_numbers(df["date"]), kind="stable")
+            ordered = df.iloc[order].reset_index(drop=True)
+            state = self._state = (df, ordered, _day_numbers(ordered["date"]))
+        return state
+
+    def lookup(self, as_of, columns):
+        _, ordered, days = self.sync()
+        i = np.searchsorted(days, _day_numbers([as_of])[0], side="right") - 1
+        if i < 0:
+            return {}
+        row = ordered.iloc[i]
+        return {c: float(row[c]) for c in columns if c in row.index and pd.notna(row[c])}
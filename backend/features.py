@@ -0,0 +1,171 @@
+# backend/features.py
+# Price history features shared by training (data_prep, train_jobs) and serving (the predict and
+# forecast endpoints), so both sides compute them the same way:
+#
+#   lag_k          price k observations earlier in the same commodity series (lag_1 = the latest)
+#   roll_mean_w    mean of the w prices before the row (lag_1..lag_w), summed oldest first in float64
+#
+# Features are float32, the precision the forests compare in. Training builds them for every
+# series in one pass: rows are sorted once by (commodity, date), lags are gathered through a
+# strided window view of the sorted prices straight into one preallocated matrix, and rows without
+# a full, finite history are dropped (like shift + dropna). Serving fills the same columns from
+# windows of recent prices; short histories are padded with their oldest price (pad_recent).
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+LAG_PREFIX = "lag_"
+ROLL_PREFIX = "roll_mean_"
+EMPTY_HISTORY_PRICE = 1000.0
+
+
+def lag_columns(n_lags=7):
+    return [f"{LAG_PREFIX}{i}" for i in range(1, n_lags + 1)]
+
+
+def feature_columns(n_lags=7, rolling=()):
+    """lag_1..lag_n, then roll_mean_<w> for each rolling window."""
+    return lag_columns(n_lags) + [f"{ROLL_PREFIX}{w}" for w in rolling]
+
+
+def parse_columns(names):
+    """
+    (lag_idx, roll) for a model's feature names: lag_idx lists the positions of lag_1..lag_n in order,
+    roll is [(position, window)]. ValueError if the lags aren't exactly lag_1..lag_n.
+    """
+    lags = sorted((int(c[len(LAG_PREFIX):]), i) for i, c in enumerate(names)
+                  if c.startswith(LAG_PREFIX) and c[len(LAG_PREFIX):].isdigit())
+    if not lags or [n for n, _ in lags] != list(range(1, len(lags) + 1)):
+        raise ValueError("model has no lag_1..lag_n features")
+    roll = [(i, int(c[len(ROLL_PREFIX):])) for i, c in enumerate(names)
+            if c.startswith(ROLL_PREFIX) and c[len(ROLL_PREFIX):].isdigit()]
+    if any(w < 1 for _, w in roll):
+        raise ValueError("rolling windows must be positive")
+    return [i for _, i in lags], roll
+
+
+def history_length(names):
+    """Prices of history the columns need: the longest lag or rolling window."""
+    lag_idx, roll = parse_columns(names)
+    return max([len(lag_idx)] + [w for _, w in roll])
+
+
+def _rolling_sum(column, w):
+    """Sum of column(k) for k = w..1 (oldest first), accumulated in float64 in that fixed order."""
+    acc = np.array(column(w), dtype=np.float64)
+    for k in range(w - 1, 0, -1):
+        acc += column(k)
+    return acc
+
+
+# --------------------------------------------------------------------------------
+# TRAINING
+# --------------------------------------------------------------------------------
+def lag_matrix(keys, dates, values, n_lags=7, rolling=()):
+    """
+    Lag (and rolling mean) features for many series at once.
+    keys: series id per row (e.g. commodity), dates: sortable per row, values: prices.
+    Returns (X, y, rows): X float32 (n_out, n_lags + len(rolling)) in feature_columns order, y the
+    float64 prices of those rows, rows their positions in the input, ordered by date then input order.
+    Rows are kept only when the previous history_length prices of their series and their own price
+    are all finite.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    hist = max([n_lags] + list(rolling))
+    n_feat = n_lags + len(rolling)
+    codes = pd.factorize(keys, use_na_sentinel=False)[0] if n else np.zeros(0, dtype=np.intp)
+    dates = np.asarray(dates)
+    if dates.dtype.kind == "M":
+        dates = dates.astype("datetime64[ns]").view(np.int64)
+    # rows in date order (ties keep input order), then stably by series: (series, date, input) order.
+    # Prices usually arrive date-sorted, and series codes sort as small ints, so both sorts are cheap.
+    date_sorted = n < 2 or bool((dates[1:] >= dates[:-1]).all())
+    by_date = None if date_sorted else np.argsort(dates, kind="stable")
+    if n and codes.max() < 2 ** 16:
+        codes = codes.astype(np.uint16)
+    order = np.argsort(codes if date_sorted else codes[by_date], kind="stable")
+    if not date_sorted:
+        order = by_date[order]
+    v = values[order]
+
+    # each series is one contiguous block of the sorted prices; a row needs `hist` earlier prices
+    # in its block, and no non-finite price among them or itself
+    counts = np.bincount(codes, minlength=1 if n else 0)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    bad = np.concatenate([[0], np.cumsum(~np.isfinite(v))])
+    keep = np.arange(n) - first >= hist
+    ok = np.flatnonzero(keep)
+    keep[ok] = bad[ok + 1] == bad[ok - hist]
+
+    # output in date order (input order within a date), like sort_values("date") + shift
+    pos = np.empty(n, dtype=np.intp)
+    pos[order] = np.arange(n)
+    if date_sorted:
+        rows = np.flatnonzero(keep[pos])
+    else:
+        rows = by_date[keep[pos[by_date]]]
+    pos = pos[rows]
+
+    X = np.empty((len(pos), n_feat), dtype=np.float32)
+    v32 = v.astype(np.float32)
+    # row q of the window view over the reversed prices is [v[p], v[p-1], ..., v[p-n_lags]] for p = n-1-q
+    windows = sliding_window_view(v32[::-1], n_lags + 1)[:, 1:] if n > n_lags else np.empty((0, n_lags), np.float32)
+    np.take(windows, n - 1 - pos, axis=0, out=X[:, :n_lags], mode="clip")
+    for j, w in enumerate(rolling):
+        X[:, n_lags + j] = _rolling_sum(lambda k: v[pos - k], w) / w
+    return X, v[pos], rows
+
+
+def add_lag_features(df, n_lags=7, key="commodity", rolling=(), value="price", date="date"):
+    """
+    `df`'s rows that have a full history, in date order, with lag/rolling feature columns appended
+    (float32). Drop-in for the per-lag groupby().shift() + dropna() it replaces.
+    """
+    names = feature_columns(n_lags, rolling)
+    keys = df[key] if key in df.columns else np.zeros(len(df), dtype=np.int8)
+    X, _, rows = lag_matrix(keys, pd.to_datetime(df[date]).to_numpy(), df[value].to_numpy(), n_lags, rolling)
+    base = df.drop(columns=[c for c in names if c in df.columns]).take(rows).reset_index(drop=True)
+    return pd.concat([base, pd.DataFrame(X, columns=names, copy=False)], axis=1)
+
+
+# --------------------------------------------------------------------------------
+# SERVING
+# --------------------------------------------------------------------------------
+def pad_recent(recent, n):
+    """Last n prices, oldest first; short histories are padded with their first value (1000s if empty)."""
+    recent = list(recent)
+    if len(recent) < n:
+        recent = [recent[0]] * (n - len(recent)) + recent if recent else [EMPTY_HISTORY_PRICE] * n
+    return recent[-n:]
+
+
+def fill_history(X, windows, names):
+    """
+    Write the lag and rolling columns of `names` into X (n_rows, len(names)) from windows
+    (n_rows, history) of prices, oldest first. Other columns are left as they are.
+    """
+    lag_idx, roll = parse_columns(names)
+    windows = np.asarray(windows, dtype=np.float64)
+    h = windows.shape[1]
+    for k, j in enumerate(lag_idx, start=1):
+        X[:, j] = windows[:, h - k].astype(np.float32)
+    for j, w in roll:
+        X[:, j] = (_rolling_sum(lambda k: windows[:, h - k], w) / w).astype(np.float32)
+    return X
+
+
+def history_matrix(recents, names):
+    """float32 (len(recents), len(names)) with the lag/rolling columns filled from each price list; NaN elsewhere."""
+    h = history_length(names)
+    windows = np.array([pad_recent(r, h) for r in recents], dtype=np.float64).reshape(len(recents), h)
+    X = np.full((len(recents), len(names)), np.nan, dtype=np.float32)
+    return fill_history(X, windows, names)
+
+
+def history_row(recent, names):
+    """{column: value} for the lag/rolling columns of one prediction."""
+    X = history_matrix([recent], names)
+    lag_idx, roll = parse_columns(names)
+    return {names[j]: float(X[0, j]) for j in lag_idx + [j for j, _ in roll]}
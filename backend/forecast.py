@@ -0,0 +1,95 @@
+# backend/forecast.py
+# Recursive multi-day price forecasts behind /api/forecast/price.
+# Each step scores every series of a crop at once on the flattened forest, then shifts the
+# prediction into the price window in memory; intervals come from the per-tree spread at each step.
+
+import numpy as np
+
+try:
+    import features
+except ImportError:  # imported as backend.forecast from the repo root
+    from backend import features
+
+MAX_HORIZON = 30
+DEFAULT_INTERVAL = (0.1, 0.9)
+# /api/weather (Open-Meteo) daily keys -> model feature names
+OPEN_METEO_DAILY = {
+    "temperature_2m_max": "temp_max",
+    "temperature_2m_min": "temp_min",
+    "precipitation_sum": "precip_mm",
+    "windspeed_10m_max": "wind_speed",
+    "wind_speed_10m_max": "wind_speed",
+    "relative_humidity_2m_mean": "humidity",
+}
+
+
+def lag_layout(feature_names):
+    """Split model columns into (lag/rolling column indices, weather column indices)."""
+    lag_idx, roll = features.parse_columns(feature_names)
+    history = lag_idx + [j for j, _ in roll]
+    other = [i for i in range(len(feature_names)) if i not in set(history)]
+    return history, other
+
+
+def weather_days(weather, horizon, names):
+    """
+    Per-day weather as a (horizon, len(names)) float array, plus the day labels if given.
+    Accepts the /api/weather response (or its "daily" block), {feature: [per day]} lists,
+    a list of per-day dicts, or a flat {feature: value} dict that is held for every day.
+    Days past the end of the forecast repeat its last day; unknown features are NaN.
+    """
+    weather = weather or {}
+    dates = None
+    if isinstance(weather, dict) and isinstance(weather.get("daily"), dict):
+        weather = weather["daily"]
+    if isinstance(weather, list):
+        cols = {k: [d.get(k) if isinstance(d, dict) else None for d in weather] for k in names}
+    elif isinstance(weather, dict):
+        cols = {}
+        for key, value in weather.items():
+            name = OPEN_METEO_DAILY.get(key, key)
+            if key == "time" and isinstance(value, list):
+                dates = [str(d) for d in value[:horizon]]
+            elif name in names and (key == name or name not in cols):
+                cols[name] = value if isinstance(value, list) else [value]
+    else:
+        raise ValueError("weather must be an object or a list of days")
+    out = np.full((horizon, len(names)), np.nan)
+    for j, name in enumerate(names):
+        vals = [np.nan if v is None else float(v) for v in cols.get(name) or []][:horizon]
+        if vals:
+            out[:len(vals), j] = vals
+            out[len(vals):, j] = vals[-1]
+    return out, dates
+
+
+def recursive_forecast(flat, recent, weather, horizon, feature_names, interval=None):
+    """
+    `recent`: (n_series, features.history_length) price windows, oldest first. `weather`:
+    (n_series, horizon, n_weather) in the order of the model's non-lag features. Returns {"prices": (n_series, horizon)} plus
+    "lower"/"upper" when `interval` is a (lo, hi) quantile pair.
+
+    The point forecast equals calling flat.predict step by step. The interval is the spread of the
+    individual trees at each step along that path; it does not compound error from earlier steps.
+    """
+    _, weather_idx = lag_layout(feature_names)
+    n_series = len(recent)
+    window = np.array(recent, dtype=np.float64)
+    X = np.empty((n_series, len(feature_names)), dtype=np.float64)
+    prices = np.empty((n_series, horizon))
+    lower = np.empty((n_series, horizon)) if interval else None
+    upper = np.empty((n_series, horizon)) if interval else None
+    for step in range(horizon):
+        features.fill_history(X, window, feature_names)
+        X[:, weather_idx] = weather[:, step, :]
+        per_tree = flat.tree_values(X)
+        pred = flat.combine(per_tree)
+        prices[:, step] = pred
+        if interval:
+            lower[:, step], upper[:, step] = np.quantile(per_tree, interval, axis=1)
+        window[:, :-1] = window[:, 1:]
+        window[:, -1] = pred
+    out = {"prices": prices}
+    if interval:
+        out["lower"], out["upper"] = lower, upper
+    return out
@@ -0,0 +1,329 @@
+# backend/forest_engine.py
+# Flattened random-forest inference without sklearn/pandas on the hot path.
+# All trees of a fitted RandomForestRegressor/Classifier are packed into contiguous node arrays
+# and evaluated level by level for every (row, tree) pair at once. Results match sklearn's
+# predict/predict_proba exactly (same float32 input cast, same per-tree accumulation order).
+#
+# Saved forests are a directory of raw .npy arrays (<name>.flat/), so they can be memory-mapped:
+# processes that load the same file share its pages through the OS page cache. save_compressed()
+# writes the same node arrays (without the derived ones) as one compressed .npz for model_store.
+#
+#   python forest_engine.py models/price_rf_wheat.joblib ...   -> writes <name>.flat/ next to each
+
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+FLAT_SUFFIX = ".flat"
+FLAT_FORMAT = 2
+ROW_CHUNK = 4096
+
+
+class FlatForest:
+    """
+    Node arrays for a whole forest. Leaves point to themselves, so a (row, tree) pair that reached
+    a leaf early stays put until it is dropped from the active set.
+    """
+
+    def __init__(self, kind, left, right, feature, threshold, value, roots, max_depth,
+                 n_features, feature_names=None, classes=None, missing_left=None, meta=None, derived=None):
+        self.kind = kind
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.classes = classes
+        self.missing_left = missing_left
+        self.meta = meta or {}
+        # derived evaluation arrays: children[2*i] / children[2*i + 1] are node i's left / right.
+        # save() stores them too, so a memory-mapped load doesn't rebuild them in private memory.
+        if derived is None:
+            derived = {
+                "children": np.column_stack([left, right]).astype(np.int64).ravel(),
+                "is_leaf": left == np.arange(len(left), dtype=left.dtype),
+                "feature64": feature.astype(np.int64),
+            }
+        self._children = derived["children"]
+        self._is_leaf = derived["is_leaf"]
+        self._feature64 = derived["feature64"]
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.left)
+
+    # ------------------------------------------------------------------
+    # EXPORT
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_sklearn(cls, model):
+        estimators = model.estimators_
+        is_classifier = hasattr(model, "classes_")
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("only single-output forests are supported")
+        lefts, rights, feats, thrs, vals, mgl, roots = [], [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for est in estimators:
+            nodes = est.tree_.__getstate__()["nodes"]
+            n = len(nodes)
+            idx = np.arange(offset, offset + n)
+            leaf = nodes["left_child"] < 0
+            lefts.append(np.where(leaf, idx, nodes["left_child"] + offset))
+            rights.append(np.where(leaf, idx, nodes["right_child"] + offset))
+            feats.append(np.where(leaf, 0, nodes["feature"]))
+            thrs.append(nodes["threshold"])
+            if "missing_go_to_left" in nodes.dtype.names:
+                mgl.append(nodes["missing_go_to_left"].astype(bool))
+            v = est.tree_.value[:, 0, :]
+            if is_classifier:
+                # same normalisation as DecisionTreeClassifier.predict_proba
+                norm = v.sum(axis=1, keepdims=True)
+                norm[norm == 0.0] = 1.0
+                v = v / norm
+            else:
+                v = v[:, :1]
+            vals.append(v)
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, est.tree_.max_depth)
+        index_dtype = np.int32 if offset < np.iinfo(np.int32).max else np.int64
+        names = getattr(model, "feature_names_in_", None)
+        return cls(
+            kind="classifier" if is_classifier else "regressor",
+            left=np.concatenate(lefts).astype(index_dtype),
+            right=np.concatenate(rights).astype(index_dtype),
+            feature=np.concatenate(feats).astype(np.int32),
+            threshold=np.concatenate(thrs).astype(np.float64),
+            value=np.ascontiguousarray(np.concatenate(vals), dtype=np.float64),
+            roots=np.asarray(roots, dtype=index_dtype),
+            max_depth=max_depth,
+            n_features=model.n_features_in_,
+            feature_names=[str(n) for n in names] if names is not None else None,
+            classes=np.asarray(model.classes_) if is_classifier else None,
+            missing_left=np.concatenate(mgl) if len(mgl) == len(estimators) else None,
+        )
+
+    def arrays(self):
+        """Every array save() writes, by name (derived arrays included)."""
+        out = {
+            "left": self.left, "right": self.right, "feature": self.feature, "threshold": self.threshold,
+            "value": self.value, "roots": self.roots,
+            "children": self._children, "is_leaf": self._is_leaf, "feature64": self._feature64,
+        }
+        if self.missing_left is not None:
+            out["missing_left"] = self.missing_left
+        if self.classes is not None:
+            out["classes"] = self.classes
+        return out
+
+    def nbytes(self):
+        return sum(a.nbytes for a in self.arrays().values())
+
+    def compact(self):
+        """
+        Copy with float32 thresholds. Each threshold is rounded down to the largest float32 <= it, so
+        x <= threshold has the same answer for every float32 x, which is what inputs are cast to.
+        Split nodes' values (training means, never read by scoring) are zeroed, which compresses well.
+        """
+        t = np.asarray(self.threshold, dtype=np.float64)
+        t32 = t.astype(np.float32)
+        up = t32.astype(np.float64) > t
+        t32[up] = np.nextafter(t32[up], np.float32(-np.inf))
+        value = np.where(self._is_leaf[:, None], self.value, 0.0)
+        return FlatForest(
+            self.kind, self.left, self.right, self.feature, t32, value, self.roots, self.max_depth,
+            self.n_features, self.feature_names, self.classes, self.missing_left, dict(self.meta),
+            derived={"children": self._children, "is_leaf": self._is_leaf, "feature64": self._feature64},
+        )
+
+    def _header(self, arrays):
+        return {"format": FLAT_FORMAT, "kind": self.kind, "max_depth": self.max_depth,
+                "n_features": self.n_features, "feature_names": self.feature_names,
+                "arrays": sorted(arrays), "meta": self.meta}
+
+    def save(self, path):
+        """
+        Write <path>/header.json plus one .npy per array. The directory is built under a temp name
+        and renamed into place, so readers see either the old forest or the new one.
+        """
+        path = Path(path)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        try:
+            shutil.rmtree(tmp, ignore_errors=True)
+            tmp.mkdir()
+            arrays = self.arrays()
+            for name, a in arrays.items():
+                np.save(tmp / f"{name}.npy", np.ascontiguousarray(a))
+            with open(tmp / "header.json", "w") as f:
+                json.dump(self._header(arrays), f)
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp, path)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        return path
+
+    def save_compressed(self, file):
+        """
+        One compressed .npz (path or open binary file) with the node arrays and the header; the derived
+        arrays are rebuilt on load. Child pointers are stored relative to their node (0 for leaves),
+        which compresses far better than absolute indices.
+        """
+        arrays = {k: v for k, v in self.arrays().items() if k not in ("children", "is_leaf", "feature64")}
+        idx = np.arange(self.n_nodes, dtype=self.left.dtype)
+        arrays["left"], arrays["right"] = self.left - idx, self.right - idx
+        header = np.frombuffer(json.dumps(self._header(arrays)).encode(), dtype=np.uint8)
+        np.savez_compressed(file, header=header, **{k: np.ascontiguousarray(a) for k, a in arrays.items()})
+
+    @classmethod
+    def load_compressed(cls, file):
+        with np.load(file, allow_pickle=False) as npz:
+            header = json.loads(npz["header"].tobytes())
+            if header.get("format") != FLAT_FORMAT:
+                raise ValueError(f"{file} is not a compressed FlatForest (format {FLAT_FORMAT})")
+            arrays = {k: npz[k] for k in header["arrays"]}
+        idx = np.arange(len(arrays["left"]), dtype=arrays["left"].dtype)
+        arrays["left"] += idx
+        arrays["right"] += idx
+        return cls(
+            kind=header["kind"], max_depth=header["max_depth"], n_features=header["n_features"],
+            feature_names=header.get("feature_names"), meta=header.get("meta"),
+            classes=arrays.get("classes"), missing_left=arrays.get("missing_left"),
+            left=arrays["left"], right=arrays["right"], feature=arrays["feature"],
+            threshold=arrays["threshold"], value=arrays["value"], roots=arrays["roots"],
+        )
+
+    @staticmethod
+    def read_header(path):
+        """header.json of a saved forest, or None if it is missing or from another format version."""
+        try:
+            with open(Path(path) / "header.json") as f:
+                header = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return header if header.get("format") == FLAT_FORMAT else None
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """Load a saved forest; mmap_mode="r" maps the arrays read-only instead of reading them."""
+        path = Path(path)
+        header = cls.read_header(path)
+        if header is None:
+            raise ValueError(f"{path} is not a saved FlatForest (format {FLAT_FORMAT})")
+        # plain ndarray views of the maps: np.memmap's subclass hooks cost ~15% on single-row predicts
+        arrays = {k: np.asarray(np.load(path / f"{k}.npy", mmap_mode=mmap_mode, allow_pickle=False))
+                  for k in header["arrays"]}
+        return cls(
+            kind=header["kind"], max_depth=header["max_depth"], n_features=header["n_features"],
+            feature_names=header.get("feature_names"), meta=header.get("meta"),
+            classes=arrays.get("classes"), missing_left=arrays.get("missing_left"),
+            left=arrays["left"], right=arrays["right"], feature=arrays["feature"],
+            threshold=arrays["threshold"], value=arrays["value"], roots=arrays["roots"],
+            derived={k: arrays[k] for k in ("children", "is_leaf", "feature64")},
+        )
+
+    # ------------------------------------------------------------------
+    # INFERENCE
+    # ------------------------------------------------------------------
+    def _as_matrix(self, X):
+        # sklearn casts inputs to float32 before comparing against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"expected {self.n_features} features, got {X.shape[1]}")
+        return X.astype(np.float64)
+
+    def apply(self, X):
+        """Leaf node index for every (row, tree): shape (n_rows, n_trees)."""
+        X = self._as_matrix(X)
+        out = np.empty((len(X), self.n_trees), dtype=self.roots.dtype)
+        for lo in range(0, len(X), ROW_CHUNK):
+            out[lo:lo + ROW_CHUNK] = self._apply_chunk(X[lo:lo + ROW_CHUNK])
+        return out
+
+    def _apply_chunk(self, X):
+        n, T = len(X), self.n_trees
+        # (tree, row) pairs in tree-major order, so consecutive pairs walk the same tree's nodes
+        cur = np.repeat(self.roots.astype(np.int64), n)
+        row_off = np.tile(np.arange(n, dtype=np.int64) * self.n_features, T)
+        pos = np.arange(n * T)
+        out = np.empty(n * T, dtype=np.int64)
+        flat_X = X.ravel()
+        for depth in range(self.max_depth):
+            x = flat_X[row_off + self._feature64[cur]]
+            go_right = ~(x <= self.threshold[cur])
+            if self.missing_left is not None:
+                nan = np.isnan(x)
+                if nan.any():
+                    go_right[nan] = ~self.missing_left[cur[nan]]
+            cur = self._children[2 * cur + go_right]
+            # drop pairs that reached a leaf (every other level; the check costs about one step)
+            if depth % 2:
+                leaf = self._is_leaf[cur]
+                if leaf.any():
+                    out[pos[leaf]] = cur[leaf]
+                    keep = ~leaf
+                    pos, cur, row_off = pos[keep], cur[keep], row_off[keep]
+                    if not len(pos):
+                        break
+        out[pos] = cur
+        return out.reshape(T, n).T
+
+    def tree_values(self, X):
+        """Per-tree outputs, shape (n_rows, n_trees) for regressors, (n_rows, n_trees, n_classes) for classifiers."""
+        leaves = self.apply(X)
+        v = self.value[leaves]
+        return v[..., 0] if self.kind == "regressor" else v
+
+    def combine(self, per_tree):
+        """Average `tree_values` output over trees (what predict/predict_proba return)."""
+        # add trees in order, as sklearn's _accumulate_prediction does, so the sums are bit-identical
+        total = np.zeros(per_tree[:, 0].shape, dtype=np.float64)
+        for t in range(per_tree.shape[1]):
+            total += per_tree[:, t]
+        total /= per_tree.shape[1]
+        return total
+
+    def predict(self, X):
+        if self.kind == "classifier":
+            return self.classes.take(np.argmax(self.predict_proba(X), axis=1))
+        return self.combine(self.tree_values(X))
+
+    def predict_proba(self, X):
+        if self.kind != "classifier":
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self.combine(self.tree_values(X))
+
+
+def flat_path(model_path):
+    model_path = Path(model_path)
+    return model_path.with_name(model_path.name.replace(".joblib", "") + FLAT_SUFFIX)
+
+
+def export_forest(model_path, out_path=None):
+    """Flatten a saved sklearn forest (.joblib) into a .flat directory next to it."""
+    import joblib
+    flat = FlatForest.from_sklearn(joblib.load(model_path))
+    out_path = out_path or flat_path(model_path)
+    flat.save(out_path)
+    return out_path
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Export sklearn forests to flat node arrays")
+    parser.add_argument("models", nargs="+", help=".joblib files to export")
+    args = parser.parse_args()
+    for m in args.models:
+        print(f"💾 {m} -> {export_forest(m)}")
@@ -0,0 +1,156 @@
+# backend/geo_grid.py
+# Snaps coordinates to the weather provider's grid so nearby locations share one weather fetch.
+# Open-Meteo answers with its nearest model grid point, so fields a few hundred metres apart get
+# the same data. The world is cut into square cells of WEATHER_GRID_DEG degrees (default 0.1,
+# about 11 km north-south); weather is fetched and stored once per cell, at the cell centre, and
+# fanned out to every field/warehouse/region in that cell.
+#
+#   python geo_grid.py            -> data/grid_index.csv (member -> cell) and a members/cells summary
+#   python geo_grid.py --fetch    -> also brings data/cell_weather.csv up to date, one call per cell
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    from data_store import load_table, write_csv_atomic
+except ImportError:  # imported as backend.geo_grid from the repo root
+    from backend.data_store import load_table, write_csv_atomic
+
+BASE = Path(__file__).resolve().parents[0]
+DATA_DIR = BASE / "data"
+REGIONS_FILE = BASE / "regions.json"
+FIELDS_FILE = DATA_DIR / "fields.csv"
+INDEX_FILE = DATA_DIR / "grid_index.csv"
+# not weather_*.csv: retrain_scheduler merges every file matching that into the price features
+CELLS_FILE = DATA_DIR / "cell_weather.csv"
+LEGACY_CELLS_FILE = DATA_DIR / "weather_cells.csv"
+GRID_DEG = float(os.environ.get("WEATHER_GRID_DEG", 0.1))
+
+
+# --------------------------------------------------------------------------------
+# CELLS
+# --------------------------------------------------------------------------------
+def cell_index(lat, lon, res=GRID_DEG):
+    """Integer (row, col) of the cells containing lat/lon (arrays or scalars). ValueError if out of range."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    if not (np.all((lat >= -90) & (lat <= 90)) and np.all((lon >= -180) & (lon <= 180))):
+        raise ValueError("coordinates out of range")
+    n_rows, n_cols = int(round(180 / res)), int(round(360 / res))
+    i = np.minimum(np.floor((lat + 90) / res).astype(np.int64), n_rows - 1)
+    j = np.floor((lon + 180) / res).astype(np.int64) % n_cols
+    return i, j
+
+
+def cell_center(i, j, res=GRID_DEG):
+    return np.round(-90 + (np.asarray(i) + 0.5) * res, 6), np.round(-180 + (np.asarray(j) + 0.5) * res, 6)
+
+
+def cell_ids(i, j, res=GRID_DEG):
+    """Cell ids like "0.1/1090/2528"; the resolution is part of the id so grids never mix."""
+    i, j = np.atleast_1d(i), np.atleast_1d(j)
+    return (f"{res:g}/" + pd.Series(i).astype(str) + "/" + pd.Series(j).astype(str)).to_numpy(dtype=object)
+
+
+def snap(lat, lon, res=GRID_DEG):
+    """(cell id, centre lat, centre lon) for one coordinate."""
+    i, j = cell_index(float(lat), float(lon), res)
+    clat, clon = cell_center(i, j, res)
+    return cell_ids(i, j, res)[0], float(clat), float(clon)
+
+
+# --------------------------------------------------------------------------------
+# INDEX
+# --------------------------------------------------------------------------------
+def load_members(data_dir=DATA_DIR, regions_file=REGIONS_FILE):
+    """
+    Every located thing that needs weather, as (member, kind, lat, lon): warehouses from supply.csv,
+    fields from fields.csv (field_id, lat, lon) when present, and the scheduler's regions.json.
+    """
+    data_dir = Path(data_dir)
+    frames = []
+    sources = [("warehouse", data_dir / "supply.csv", "warehouse_id"), ("field", data_dir / FIELDS_FILE.name, "field_id")]
+    for kind, path, id_col in sources:
+        if path.exists():
+            df = load_table(path, copy=False)
+            if {id_col, "lat", "lon"} <= set(df.columns):
+                frames.append(pd.DataFrame({"member": df[id_col].astype(str).to_numpy(), "kind": kind,
+                                            "lat": df["lat"].to_numpy(np.float64), "lon": df["lon"].to_numpy(np.float64)}))
+    if regions_file and Path(regions_file).exists():
+        with open(regions_file) as f:
+            regions = json.load(f)
+        frames.append(pd.DataFrame({"member": [r["name"] for r in regions], "kind": "region",
+                                    "lat": [float(r["lat"]) for r in regions], "lon": [float(r["lon"]) for r in regions]}))
+    if not frames:
+        return pd.DataFrame(columns=["member", "kind", "lat", "lon"])
+    return pd.concat(frames, ignore_index=True)
+
+
+class GridIndex:
+    """member -> grid cell for a set of located members (columns member, kind, lat, lon)."""
+
+    def __init__(self, members, res=GRID_DEG):
+        self.res = res
+        members = members.reset_index(drop=True)
+        i, j = cell_index(members["lat"].to_numpy(), members["lon"].to_numpy(), res)
+        clat, clon = cell_center(i, j, res)
+        self.table = members.assign(cell=cell_ids(i, j, res), cell_lat=clat, cell_lon=clon)
+        self._by_member = pd.Series(self.table["cell"].to_numpy(), index=self.table["kind"] + ":" + self.table["member"])
+
+    @classmethod
+    def from_sources(cls, data_dir=DATA_DIR, regions_file=REGIONS_FILE, res=GRID_DEG):
+        return cls(load_members(data_dir, regions_file), res)
+
+    def __len__(self):
+        return len(self.table)
+
+    def cells(self):
+        """One row per occupied cell: cell, lat, lon (centre), members."""
+        g = self.table.groupby("cell", sort=True)
+        return pd.DataFrame({"lat": g["cell_lat"].first(), "lon": g["cell_lon"].first(),
+                             "members": g.size()}).reset_index()
+
+    def cell_of(self, member, kind):
+        return self._by_member.get(f"{kind}:{member}")
+
+    def fan_out(self, cell_weather, kind=None):
+        """Per-member rows (member, kind, + cell_weather's columns) from per-cell rows with a "cell" column."""
+        members = self.table if kind is None else self.table[self.table["kind"] == kind]
+        return members[["member", "kind", "cell"]].merge(cell_weather, on="cell", how="inner")
+
+    def save(self, path=INDEX_FILE):
+        return write_csv_atomic(self.table, path)
+
+
+def load_cell_weather(path=CELLS_FILE):
+    """Stored per-cell weather (cell, date, ...), or an empty frame."""
+    path = Path(path)
+    if path == CELLS_FILE and not path.exists() and LEGACY_CELLS_FILE.exists():
+        os.replace(LEGACY_CELLS_FILE, path)
+        print(f"📦 Moved {LEGACY_CELLS_FILE.name} to {path.name}")
+    if not path.exists():
+        return pd.DataFrame(columns=["cell", "date"])
+    return load_table(path, copy=False)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Index fields/warehouses/regions by weather grid cell")
+    parser.add_argument("--res", type=float, default=GRID_DEG, help="cell size in degrees")
+    parser.add_argument("--fetch", action="store_true", help="fetch missing weather for every cell")
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+    index = GridIndex.from_sources(res=args.res)
+    index.save()
+    cells = index.cells()
+    print(f"🗺️ {len(index)} members in {len(cells)} cells of {args.res:g}° -> {INDEX_FILE}")
+    if args.fetch:
+        try:
+            from data_ingest import ingest_weather_cells
+        except ImportError:  # run as backend/geo_grid.py from the repo root
+            from backend.data_ingest import ingest_weather_cells
+        print(ingest_weather_cells(index, days=args.days))
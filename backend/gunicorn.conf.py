@@ -0,0 +1,26 @@
+# backend/gunicorn.conf.py
+# gunicorn -c gunicorn.conf.py wsgi:app
+# Settings can be overridden with the usual GUNICORN_CMD_ARGS / command-line flags, or the env
+# variables below.
+
+import os
+from pathlib import Path
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+# load the app (and run the warm-up) in the master, then fork: workers share the model pages
+preload_app = True
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+accesslog = "-"
+
+
+# workers (and batch jobs started with the same METRICS_DIR) publish metric snapshots here, so
+# /metrics on any worker reports the whole server; see metrics.py
+os.environ.setdefault("METRICS_DIR", str(Path(__file__).resolve().parent / "data" / "metrics"))
+
+
+def on_starting(server):
+    import metrics
+    metrics.reset_dir()
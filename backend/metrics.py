@@ -0,0 +1,448 @@
+# backend/metrics.py
+# In-process latency histograms and counters, rendered in the Prometheus text format on /metrics.
+# Recording is a dict lookup, a bisect and a few adds under a lock, so it can sit on hot paths:
+#
+#   with metrics.stage("csv_parse"): ...              agrovision_stage_seconds{stage="csv_parse"}
+#   with metrics.upstream_call("geocode"): ...        agrovision_upstream_seconds / _calls_total{outcome}
+#   metrics.cache_result("table", "hit")              agrovision_cache_requests_total{cache, result}
+#   metrics.init_app(app)                             agrovision_http_request_seconds{route, method} + ..._total{status}
+#
+# Every process has its own numbers. With METRICS_DIR set (gunicorn.conf.py sets it), each process
+# also writes a snapshot to METRICS_DIR/<pid>.json (every FLUSH_SECONDS from a background thread,
+# and at exit), and /metrics adds up the snapshots of all processes: every gunicorn worker, and the
+# batch jobs (retrain_scheduler, training, weather fetches) when they run with the same METRICS_DIR.
+#
+# PROFILE_SLOW_MS turns on a sampling profiler for requests: the stacks of in-flight request threads
+# are sampled every PROFILE_INTERVAL_MS, and requests slower than the threshold leave a collapsed-stack
+# file (flamegraph.pl / speedscope input) in PROFILE_DIR.
+
+import atexit
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[0]
+METRICS_DIR = os.environ.get("METRICS_DIR") or None
+FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", 5))
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", 0))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", BASE / "data" / "profiles"))
+PREFIX = "agrovision_"
+
+# seconds; covers a cached lookup (~100 µs) up to a retrain (minutes)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+# --------------------------------------------------------------------------------
+# METRIC TYPES
+# --------------------------------------------------------------------------------
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self, lock):
+        self.value = 0.0
+        self._lock = lock
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds, lock):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot: above every bound (+Inf)
+        self.sum = 0.0
+        self._lock = lock
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, doc, labels=()):
+        self.name = PREFIX + name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """The series for these label values (created on first use and kept)."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+
+class CounterMetric(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild(self._lock)
+
+    def inc(self, *values, amount=1.0):
+        self.labels(*values).inc(amount)
+
+    def snapshot(self):
+        return {json.dumps(k): c.value for k, c in list(self._children.items())}
+
+
+class HistogramMetric(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.bounds = tuple(float(b) for b in buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds, self._lock)
+
+    def observe(self, value, *values):
+        self.labels(*values).observe(value)
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(k): c.counts + [c.sum] for k, c in self._children.items()}
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self):
+        """{metric name: {json label values: counter value, or histogram bucket counts + [sum]}}"""
+        return {name: m.snapshot() for name, m in self.metrics.items()}
+
+    def render(self, snapshots):
+        """Prometheus text exposition of the per-series sum over `snapshots`."""
+        out = []
+        for name, m in self.metrics.items():
+            merged = {}
+            for snap in snapshots:
+                for key, value in snap.get(name, {}).items():
+                    if m.kind == "counter":
+                        merged[key] = merged.get(key, 0.0) + value
+                    elif len(value) == len(m.bounds) + 2:  # a snapshot from other buckets can't be added
+                        prev = merged.get(key)
+                        merged[key] = value if prev is None else [a + b for a, b in zip(prev, value)]
+            family = f"{name}_total" if m.kind == "counter" else name
+            out.append(f"# HELP {family} {m.doc}")
+            out.append(f"# TYPE {family} {m.kind}")
+            for key in sorted(merged):
+                labels = list(zip(m.label_names, json.loads(key)))
+                if m.kind == "counter":
+                    out.append(f"{family}{_labels(labels)} {_num(merged[key])}")
+                    continue
+                counts, total = merged[key][:-1], merged[key][-1]
+                running = 0
+                for bound, n in zip(m.bounds + (float("inf"),), counts):
+                    running += n
+                    out.append(f"{name}_bucket{_labels(labels + [('le', _num(bound))])} {_num(running)}")
+                out.append(f"{name}_sum{_labels(labels)} {_num(total)}")
+                out.append(f"{name}_count{_labels(labels)} {_num(running)}")
+        return "\n".join(out) + "\n"
+
+
+def _num(v):
+    if v == float("inf"):
+        return "+Inf"
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+REGISTRY = Registry()
+HTTP_SECONDS = REGISTRY.register(HistogramMetric(
+    "http_request_seconds", "Request latency by route template", ("route", "method")))
+HTTP_REQUESTS = REGISTRY.register(CounterMetric(
+    "http_requests", "Requests by route template and status", ("route", "method", "status")))
+STAGE_SECONDS = REGISTRY.register(HistogramMetric(
+    "stage_seconds", "Time spent in internal stages (CSV parse, model load, predict, training, ...)", ("stage",)))
+UPSTREAM_SECONDS = REGISTRY.register(HistogramMetric(
+    "upstream_seconds", "Third-party HTTP call latency", ("service",)))
+UPSTREAM_CALLS = REGISTRY.register(CounterMetric(
+    "upstream_calls", "Third-party HTTP calls by outcome (ok/error)", ("service", "outcome")))
+CACHE_REQUESTS = REGISTRY.register(CounterMetric(
+    "cache_requests", "Cache lookups by cache and result", ("cache", "result")))
+SLOW_REQUESTS = REGISTRY.register(CounterMetric(
+    "slow_requests", "Requests slower than PROFILE_SLOW_MS (profiled), by method and route", ("request",)))
+
+
+# --------------------------------------------------------------------------------
+# RECORDING
+# --------------------------------------------------------------------------------
+class stage:
+    """Times a block (or, as a decorator, a function) into agrovision_stage_seconds{stage=name}."""
+    __slots__ = ("_child", "_t0")
+
+    def __init__(self, name):
+        self._child = STAGE_SECONDS.labels(name)
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._t0)
+        return False
+
+    def __call__(self, fn):
+        child = self._child
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - t0)
+        return wrapper
+
+
+class upstream_call:
+    """Times one third-party call and counts it as ok, or error if the block raises."""
+    __slots__ = ("service", "_t0")
+
+    def __init__(self, service):
+        self.service = service
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        UPSTREAM_SECONDS.labels(self.service).observe(time.perf_counter() - self._t0)
+        UPSTREAM_CALLS.labels(self.service, "ok" if exc_type is None else "error").inc()
+        return False
+
+
+def cache_result(cache, result):
+    CACHE_REQUESTS.labels(cache, result).inc()
+
+
+# --------------------------------------------------------------------------------
+# SNAPSHOTS ACROSS PROCESSES
+# --------------------------------------------------------------------------------
+_flush_lock = threading.Lock()
+_flusher = None
+
+
+def flush(metrics_dir=None):
+    """Write this process's snapshot to <metrics_dir>/<pid>.json (no-op without METRICS_DIR)."""
+    metrics_dir = metrics_dir or METRICS_DIR
+    if not metrics_dir:
+        return None
+    path = Path(metrics_dir) / f"{os.getpid()}.json"
+    tmp = path.with_name(f".{path.name}.tmp")
+    try:
+        with _flush_lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump(REGISTRY.snapshot(), f)
+            os.replace(tmp, path)
+    except OSError as e:
+        print(f"⚠️ Could not write metrics snapshot: {e}")
+        return None
+    return path
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        flush()
+
+
+def ensure_flusher():
+    """
+    Start this process's snapshot thread (a flush every FLUSH_SECONDS) if it isn't running. Called
+    per request: after a fork (gunicorn workers) the parent's thread is gone and is restarted here,
+    and the snapshot is never written on the request thread.
+    """
+    global _flusher
+    if not METRICS_DIR or (_flusher is not None and _flusher.is_alive()):
+        return
+    with _flush_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+            _flusher.start()
+
+
+def _after_fork():
+    global _flush_lock, _flusher
+    _flush_lock, _flusher = threading.Lock(), None
+
+
+def render(metrics_dir=None):
+    """Prometheus text for this process, plus every other process's last snapshot in metrics_dir."""
+    metrics_dir = metrics_dir or METRICS_DIR
+    snapshots = [REGISTRY.snapshot()]
+    if metrics_dir:
+        own = f"{os.getpid()}.json"
+        for path in sorted(Path(metrics_dir).glob("*.json")):
+            if path.name == own:
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                pass  # being replaced right now; its numbers show up on the next scrape
+    return REGISTRY.render(snapshots)
+
+
+def reset_dir(metrics_dir=None):
+    """Remove old snapshots (e.g. when a server starts, so a reused pid doesn't inherit counts)."""
+    metrics_dir = metrics_dir or METRICS_DIR
+    if metrics_dir and Path(metrics_dir).is_dir():
+        for path in Path(metrics_dir).glob("*.json"):
+            path.unlink(missing_ok=True)
+
+
+if METRICS_DIR:
+    atexit.register(flush)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+# --------------------------------------------------------------------------------
+# SLOW-REQUEST PROFILER
+# --------------------------------------------------------------------------------
+class SlowRequestProfiler:
+    """
+    Samples the stacks of registered threads from one background thread. `begin()` on the request
+    thread, `end(label, seconds)` when it finishes: if it took at least threshold_ms, its samples are
+    written as collapsed stacks ("root;...;leaf count" lines) and the file path is returned.
+    """
+
+    def __init__(self, threshold_ms=PROFILE_SLOW_MS, interval_ms=PROFILE_INTERVAL_MS, out_dir=PROFILE_DIR):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.out_dir = Path(out_dir)
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_thread(self):
+        # also restarts the sampler in a forked worker, where the master's thread doesn't exist
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="slow-request-sampler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for tid, tally in self._active.items():
+                    frame = frames.get(tid)
+                    if frame is not None and tid != me:
+                        tally[_collapse(frame)] += 1
+
+    def begin(self):
+        with self._lock:
+            self._active[threading.get_ident()] = _Tally()
+        self._ensure_thread()
+
+    def end(self, label, seconds):
+        with self._lock:
+            tally = self._active.pop(threading.get_ident(), None)
+        if tally is None or seconds < self.threshold:
+            return None
+        SLOW_REQUESTS.labels(label).inc()
+        name = re.sub(r"[^A-Za-z0-9_.-]+", "_", label).strip("_") or "root"
+        path = self.out_dir / f"{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{name}_{seconds * 1000:.0f}ms.folded"
+        try:
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+            with open(path, "w") as f:
+                for stack, n in tally.most_common():
+                    f.write(f"{stack} {n}\n")
+        except OSError as e:
+            print(f"⚠️ Could not write profile for slow request {label}: {e}")
+            return None
+        print(f"🐢 {label} took {seconds * 1000:.0f} ms ({sum(tally.values())} samples) -> {path}")
+        return path
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{Path(code.co_filename).name}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+# --------------------------------------------------------------------------------
+# FLASK
+# --------------------------------------------------------------------------------
+def init_app(app, profiler=None):
+    """
+    Per-request latency and status counts for a Flask app, labelled by route template (bounded
+    cardinality: /api/fields/<field_id>/features, not every id). Profiles slow requests when
+    PROFILE_SLOW_MS is set (or a profiler is given).
+    """
+    from flask import g, request
+
+    if profiler is None and PROFILE_SLOW_MS > 0:
+        profiler = SlowRequestProfiler()
+
+    def route_label():
+        return request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+
+    def record(status):
+        seconds = time.perf_counter() - g._metrics_t0
+        route = route_label()
+        HTTP_SECONDS.labels(route, request.method).observe(seconds)
+        HTTP_REQUESTS.labels(route, request.method, str(status)).inc()
+        if profiler is not None:
+            profiler.end(f"{request.method} {route}", seconds)
+        g._metrics_done = True
+        ensure_flusher()
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_t0 = time.perf_counter()
+        if profiler is not None:
+            profiler.begin()
+
+    @app.after_request
+    def _record(response):
+        if "_metrics_t0" in g:
+            record(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _record_failure(exc):
+        # unhandled exceptions skip after_request
+        if "_metrics_t0" in g and not g.get("_metrics_done"):
+            record(500)
+
+    app.extensions["metrics"] = profiler
+    return app
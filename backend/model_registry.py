@@ -0,0 +1,241 @@
+# backend/model_registry.py
+# Keeps trained models in memory so the predict endpoints don't unpickle a forest per request.
+# Models come from model_store (models/<name>/manifest.json + versioned .npz artifacts); a legacy
+# models/<name>.joblib is used when a name has no manifest yet. A model is reloaded transparently when
+# its manifest (or .joblib) changes on disk, e.g. after /api/train or retrain_scheduler.retrain_models
+# saves a new version. The endpoints score on forest_engine.FlatForest arrays: each version is expanded
+# once into a .flat/ directory (tagged with the version) and memory-mapped from there, so nothing is
+# decompressed or unpickled while the flat copy is current, and every process serving the same model
+# shares one copy of its pages.
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+import joblib
+
+import metrics
+import model_store
+from forest_engine import FlatForest, flat_path
+from model_store import price_model_name
+
+BASE = Path(__file__).resolve().parents[0]
+MODELS_DIR = BASE / "models"
+
+HEALTH_MODEL = "crop_health_rf"
+
+# model is the sklearn estimator of a legacy .joblib when flat copies are disabled (mmap=False), else None
+LoadedModel = namedtuple("LoadedModel", ["model", "flat", "version", "stat"])
+
+
+def file_version(path):
+    """Short content hash of a model file, used as the version reported to clients."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:12]
+
+
+def save_model(model, path):
+    """
+    joblib.dump to a temp file and rename it into place, so a concurrent ModelRegistry.get
+    never unpickles a half-written model. Legacy layout; trainers save through model_store.
+    """
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        joblib.dump(model, tmp)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return path
+
+
+class ModelRegistry:
+    """
+    In-process cache of models keyed by name (model_store name or .joblib stem under `models_dir`).
+    The health model is pinned; price models are kept in an LRU bounded by `max_price_models`.
+    Every lookup does a cheap stat() of the manifest (or .joblib) and reloads when mtime/size
+    changed; the live version is only re-read on reload, and an unchanged version keeps the
+    already loaded object.
+    """
+
+    def __init__(self, models_dir=MODELS_DIR, max_price_models=32, mmap=None):
+        self.models_dir = Path(models_dir)
+        self.max_price_models = max_price_models
+        if mmap is None:
+            mmap = os.environ.get("MODEL_MMAP", "1") != "0"
+        self.mmap = mmap
+        self._pinned = {}
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _path(self, name):
+        if os.sep in name or (os.altsep and os.altsep in name) or name.startswith("."):
+            raise ValueError(f"invalid model name: {name!r}")
+        return self.models_dir / f"{name}.joblib"
+
+    def _source(self, name):
+        """(path, stat) of what defines the live model: its store manifest, else the legacy .joblib."""
+        legacy = self._path(name)
+        for path in (model_store.manifest_path(self.models_dir, name), legacy):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            return path, (st.st_mtime_ns, st.st_size)
+        return None, None
+
+    def _version(self, path):
+        if path.suffix == ".joblib":
+            return file_version(path)
+        with open(path) as f:
+            return json.load(f)["live"]
+
+    def _cached(self, name):
+        with self._lock:
+            if name in self._pinned:
+                return self._pinned[name]
+            entry = self._lru.get(name)
+            if entry is not None:
+                self._lru.move_to_end(name)
+            return entry
+
+    def _store(self, name, entry):
+        with self._lock:
+            if name == HEALTH_MODEL:
+                self._pinned[name] = entry
+                return
+            self._lru[name] = entry
+            self._lru.move_to_end(name)
+            while len(self._lru) > self.max_price_models:
+                self._lru.popitem(last=False)
+
+    def _key_lock(self, name):
+        with self._lock:
+            return self._key_locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        """Return a LoadedModel for `name`, or None if no model file exists."""
+        path, stat = self._source(name)
+        if path is None:
+            self.evict(name)
+            return None
+        entry = self._cached(name)
+        if entry is not None and entry.stat == stat:
+            metrics.cache_result("model", "hit")
+            return entry
+        # one loader per model; concurrent requests for the same name wait for it
+        with self._key_lock(name):
+            entry = self._cached(name)
+            if entry is not None and entry.stat == stat:
+                return entry
+            try:
+                version = self._version(path)
+            except (OSError, ValueError, KeyError):
+                version = None
+            if entry is not None and entry.version == version:
+                entry = entry._replace(stat=stat)
+            else:
+                try:
+                    model, flat = self._load(name, path, version)
+                except Exception as e:
+                    # a trainer may still be writing the file; keep serving the previous model
+                    if entry is not None:
+                        print(f"⚠️ Reload of {name} failed ({e}); serving version {entry.version}")
+                        return entry
+                    raise
+                entry = LoadedModel(model, flat, version, stat)
+                print(f"📦 Loaded model {name} (version {version})")
+            self._store(name, entry)
+            return entry
+
+    def _load(self, name, path, version):
+        """(sklearn model or None, FlatForest) for the live version behind `path` (manifest or .joblib)."""
+        if version is None:
+            raise ValueError(f"cannot read {path}")
+        stored = path.suffix != ".joblib"
+        fdir = model_store.flat_cache_path(self.models_dir, name, version) if stored else flat_path(path)
+        if self.mmap:
+            header = FlatForest.read_header(fdir)
+            if header is not None and header["meta"].get("source_version") == version:
+                try:
+                    with metrics.stage("model_flat_load"):
+                        flat = FlatForest.load(fdir, mmap_mode="r")
+                    metrics.cache_result("model", "flat")
+                    return None, flat
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"⚠️ Ignoring flat copy of {name}: {e}")
+        model = None
+        if stored:
+            metrics.cache_result("model", "store")
+            with metrics.stage("model_store_load"):
+                flat = model_store.load(self.models_dir, name, version)
+        else:
+            metrics.cache_result("model", "joblib")
+            with metrics.stage("joblib_load"):
+                model = joblib.load(path)
+            with metrics.stage("model_flatten"):
+                flat = FlatForest.from_sklearn(model)
+        if not self.mmap:
+            return model, flat
+        flat.meta["source_version"] = version
+        try:
+            flat.save(fdir)
+            # drop the in-memory arrays (and the unpickled estimator): the mapped copy serves the same
+            return None, FlatForest.load(fdir, mmap_mode="r")
+        except OSError as e:
+            # the flat copy is only an accelerator; a read-only models dir is fine
+            print(f"⚠️ Could not persist flat copy of {name}: {e}")
+            return None, flat
+
+    def model_names(self):
+        """Names of the models on disk (stored or legacy): the health model first, then price models by name."""
+        names = sorted(set(model_store.names(self.models_dir)) | {p.stem for p in self.models_dir.glob("*.joblib")})
+        return [n for n in names if n == HEALTH_MODEL] + [n for n in names if n != HEALTH_MODEL]
+
+    def preload(self):
+        """
+        Load the health model and up to max_price_models price models (e.g. in a pre-fork master,
+        before workers are forked). Returns {name: version} for what was loaded.
+        """
+        loaded = {}
+        price = 0
+        for name in self.model_names():
+            if name != HEALTH_MODEL:
+                if price >= self.max_price_models:
+                    break
+                price += 1
+            entry = self.get(name)
+            if entry is not None:
+                loaded[name] = entry.version
+        return loaded
+
+    def health(self):
+        return self.get(HEALTH_MODEL)
+
+    def price(self, crop):
+        return self.get(price_model_name(crop))
+
+    def evict(self, name=None):
+        """Drop one cached model, or all of them when `name` is None."""
+        with self._lock:
+            if name is None:
+                self._pinned.clear()
+                self._lru.clear()
+            else:
+                self._pinned.pop(name, None)
+                self._lru.pop(name, None)
+
+    def versions(self):
+        """Versions currently held in memory, by model name."""
+        with self._lock:
+            out = {n: e.version for n, e in self._pinned.items()}
+            out.update({n: e.version for n, e in self._lru.items()})
+        return out
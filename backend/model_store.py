@@ -0,0 +1,249 @@
+# backend/model_store.py
+# Versioned model artifacts. Every model name (crop_health_rf, price_rf_<crop>) gets a directory:
+#
+#   models/<name>/manifest.json    versions oldest first, and which one is live
+#   models/<name>/<version>.npz    compressed forest_engine.FlatForest arrays; the version is a content hash
+#
+# An artifact holds only what scoring needs: the node arrays, with float32 thresholds when pruned
+# (FlatForest.compact), and none of sklearn's training-only state (impurities, sample counts, OOB
+# arrays, estimator params). save() writes the artifact and then the manifest under temp names and
+# renames each into place, so a reader sees the previous live version or the new one, never a partial
+# file. The last KEEP_VERSIONS versions stay on disk for rollback().
+#
+#   python model_store.py list                       -> live version, rows and MAE per model
+#   python model_store.py rollback price_rf_wheat    -> make the previous version live again
+#   python model_store.py import models/*.joblib     -> move legacy .joblib models into the store
+
+import hashlib
+import io
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: manifest updates aren't serialised between processes
+    fcntl = None
+
+try:
+    from forest_engine import FLAT_SUFFIX, FlatForest
+except ImportError:  # imported as backend.model_store from the repo root
+    from backend.forest_engine import FLAT_SUFFIX, FlatForest
+
+BASE = Path(__file__).resolve().parents[0]
+MODELS_DIR = BASE / "models"
+MANIFEST = "manifest.json"
+KEEP_VERSIONS = int(os.environ.get("MODEL_KEEP_VERSIONS", 5))
+
+
+def price_model_name(crop):
+    """Model name for a crop, as saved by train_price_model and train_jobs and served by ModelRegistry."""
+    return f"price_rf_{str(crop).replace(' ', '_')}"
+
+
+def model_dir(models_dir, name):
+    return Path(models_dir) / name
+
+
+def manifest_path(models_dir, name):
+    return model_dir(models_dir, name) / MANIFEST
+
+
+def artifact_path(models_dir, name, version):
+    return model_dir(models_dir, name) / f"{version}.npz"
+
+
+def flat_cache_path(models_dir, name, version):
+    """Where ModelRegistry expands a version into memory-mappable .npy arrays."""
+    return model_dir(models_dir, name) / f"{version}{FLAT_SUFFIX}"
+
+
+def data_fingerprint(X, y=None):
+    """Content hash of the training matrix (and target): column names plus float64 values."""
+    h = hashlib.sha1(json.dumps([str(c) for c in getattr(X, "columns", [])]).encode())
+    h.update(np.ascontiguousarray(np.asarray(X, dtype=np.float64)).tobytes())
+    if y is not None:
+        h.update(np.ascontiguousarray(np.asarray(y, dtype=np.float64)).tobytes())
+    return h.hexdigest()[:16]
+
+
+def _write_atomic(path, data):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+@contextmanager
+def _locked(models_dir, name):
+    """Serialise manifest read-modify-write between processes saving the same model."""
+    if fcntl is None:
+        yield
+        return
+    with open(model_dir(models_dir, name) / ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def read_manifest(models_dir, name):
+    """The model's manifest, or None if it has never been saved to the store."""
+    try:
+        with open(manifest_path(models_dir, name)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def live_entry(manifest):
+    """Manifest entry of the live version."""
+    return next(v for v in manifest["versions"] if v["version"] == manifest["live"])
+
+
+def names(models_dir=MODELS_DIR):
+    """Model names that have a manifest, sorted."""
+    return sorted(p.parent.name for p in Path(models_dir).glob(f"*/{MANIFEST}"))
+
+
+def save(model, models_dir, name, rows=None, mae=None, fingerprint=None, extra=None, prune=True,
+         keep=KEEP_VERSIONS):
+    """
+    Store a fitted sklearn forest (or a FlatForest) as the live version of `name`.
+    prune=True stores float32 thresholds (same predictions, see FlatForest.compact).
+    Returns the manifest entry: version, created, features, rows, mae, data_fingerprint, bytes.
+    """
+    flat = model if isinstance(model, FlatForest) else FlatForest.from_sklearn(model)
+    if prune:
+        flat = flat.compact()
+    buf = io.BytesIO()
+    flat.save_compressed(buf)
+    data = buf.getvalue()
+    version = hashlib.sha1(data).hexdigest()[:12]
+
+    model_dir(models_dir, name).mkdir(parents=True, exist_ok=True)
+    path = artifact_path(models_dir, name, version)
+    entry = {
+        "version": version,
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "kind": flat.kind,
+        "features": flat.feature_names,
+        "rows": None if rows is None else int(rows),
+        "mae": None if mae is None else float(mae),
+        "data_fingerprint": fingerprint,
+        "pruned": bool(prune),
+        "bytes": len(data),
+        **(extra or {}),
+    }
+    # the artifact is written under the lock too: _remove_unlisted deletes whatever another saver's
+    # manifest doesn't list, which would include an artifact written before this save took the lock
+    with _locked(models_dir, name):
+        if not path.exists():
+            _write_atomic(path, data)
+        if not path.exists():
+            raise OSError(f"artifact {path} vanished before the manifest was written")
+        manifest = read_manifest(models_dir, name) or {"name": name, "live": None, "versions": []}
+        versions = [v for v in manifest["versions"] if v["version"] != version] + [entry]
+        manifest["versions"], manifest["live"] = versions[-max(keep, 1):], version
+        _write_manifest(models_dir, name, manifest)
+        _remove_unlisted(models_dir, name, manifest)
+    return entry
+
+
+def _write_manifest(models_dir, name, manifest):
+    _write_atomic(manifest_path(models_dir, name), json.dumps(manifest, indent=2).encode())
+
+
+def _remove_unlisted(models_dir, name, manifest):
+    """Delete artifacts (and their flat copies) of versions that dropped out of the manifest."""
+    listed = {v["version"] for v in manifest["versions"]}
+    for p in model_dir(models_dir, name).iterdir():
+        if p.name.startswith("."):
+            continue
+        version = p.name.split(".", 1)[0]
+        if p.suffix not in (".npz", FLAT_SUFFIX) or version in listed:
+            continue
+        if p.is_dir():
+            shutil.rmtree(p, ignore_errors=True)
+        else:
+            p.unlink(missing_ok=True)
+
+
+def load(models_dir, name, version=None):
+    """FlatForest of `version` (default: the live one); None if the model isn't in the store."""
+    if version is None:
+        manifest = read_manifest(models_dir, name)
+        if manifest is None:
+            return None
+        version = manifest["live"]
+    return FlatForest.load_compressed(artifact_path(models_dir, name, version))
+
+
+def rollback(models_dir, name, version=None):
+    """Make `version` (default: the one before the live version) live. Returns its manifest entry."""
+    if read_manifest(models_dir, name) is None:
+        raise KeyError(f"no stored versions of {name}")
+    with _locked(models_dir, name):
+        manifest = read_manifest(models_dir, name)
+        listed = [v["version"] for v in manifest["versions"]]
+        if version is None:
+            at = listed.index(manifest["live"])
+            if at == 0:
+                raise ValueError(f"{name} has no version before {manifest['live']}")
+            version = listed[at - 1]
+        elif version not in listed:
+            raise KeyError(f"{name} has no version {version}")
+        manifest["live"] = version
+        _write_manifest(models_dir, name, manifest)
+    return live_entry(manifest)
+
+
+def import_joblib(path, models_dir=None, remove=False):
+    """Store a legacy <name>.joblib model; remove=True deletes it (and its .flat/ copy) afterwards."""
+    import joblib
+    path = Path(path)
+    models_dir = Path(models_dir) if models_dir is not None else path.parent
+    name = path.name.replace(".joblib", "")
+    entry = save(joblib.load(path), models_dir, name)
+    if remove:
+        path.unlink()
+        shutil.rmtree(path.with_name(name + FLAT_SUFFIX), ignore_errors=True)
+    return name, entry
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Versioned model store")
+    parser.add_argument("--models-dir", default=str(MODELS_DIR))
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list")
+    rb = sub.add_parser("rollback")
+    rb.add_argument("name")
+    rb.add_argument("version", nargs="?")
+    imp = sub.add_parser("import")
+    imp.add_argument("models", nargs="+", help=".joblib files")
+    imp.add_argument("--remove", action="store_true", help="delete the .joblib files once stored")
+    args = parser.parse_args()
+    if args.cmd == "list":
+        for n in names(args.models_dir):
+            m = read_manifest(args.models_dir, n)
+            e = live_entry(m)
+            print(f"📦 {n}: {e['version']} ({len(m['versions'])} versions, rows={e['rows']}, mae={e['mae']}, "
+                  f"{e['bytes'] / 1024:.0f} KiB)")
+    elif args.cmd == "rollback":
+        e = rollback(args.models_dir, args.name, args.version)
+        print(f"↩️ {args.name} -> {e['version']} (created {e['created']})")
+    else:
+        for p in args.models:
+            n, e = import_joblib(p, remove=args.remove)
+            print(f"💾 {p} -> {n}/{e['version']}.npz ({e['bytes'] / 1024:.0f} KiB)")
@@ -0,0 +1,175 @@
+# backend/pipeline.py
+# Price-model retraining as cached stages: merge -> lags -> train (per crop).
+# Every stage is keyed by a fingerprint of its inputs' content and its parameters. The last
+# fingerprints live in data/pipeline_state.json; a stage whose fingerprint matches and whose outputs
+# still exist is skipped, and only crops whose slice of the training table changed are retrained.
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+import sklearn
+
+try:
+    from data_store import load_table, write_csv_atomic
+    from data_prep import merge_prices_weather, make_price_lags
+    import train_price_model as tpm
+except ImportError:  # imported as backend.pipeline from the repo root
+    from backend.data_store import load_table, write_csv_atomic
+    from backend.data_prep import merge_prices_weather, make_price_lags
+    import backend.train_price_model as tpm
+
+BASE = Path(__file__).resolve().parents[0]
+DATA_DIR = BASE / "data"
+MODELS_DIR = BASE / "models"
+STATE_VERSION = 1
+
+
+def digest(obj):
+    """sha1 of a JSON-serialisable value (keys sorted)."""
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def frame_digest(df):
+    """Content hash of a DataFrame's values (row order matters, the index does not)."""
+    h = hashlib.sha1(json.dumps([str(c) for c in df.columns]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class Pipeline:
+    """Stage bookkeeping: fingerprints from the previous run, and this run's report."""
+
+    def __init__(self, data_dir=DATA_DIR, state_file=None, force=False):
+        self.data_dir = Path(data_dir)
+        self.state_file = Path(state_file or self.data_dir / "pipeline_state.json")
+        self.force = force
+        self.state = self._load_state()
+        self.stages = []
+
+    def _load_state(self):
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+            if state.get("version") == STATE_VERSION:
+                return state
+        except (OSError, ValueError):
+            pass
+        return {"version": STATE_VERSION, "files": {}, "stages": {}, "crops": {}}
+
+    def save_state(self):
+        tmp = self.state_file.with_name(f".{self.state_file.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.state_file)
+
+    def file_fingerprint(self, path):
+        """Content sha1 of a file; re-hashed only when its mtime/size changed since the last run."""
+        path = Path(path)
+        st = os.stat(path)
+        stat = [st.st_mtime_ns, st.st_size]
+        known = self.state["files"].get(str(path))
+        if known and known["stat"] == stat:
+            return known["sha1"]
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        self.state["files"][str(path)] = {"stat": stat, "sha1": h.hexdigest()}
+        return h.hexdigest()
+
+    def _decision(self, previous, fingerprint, outputs):
+        if self.force:
+            return "forced"
+        if previous is None:
+            return "no previous run"
+        if previous["fingerprint"] != fingerprint:
+            return "inputs changed"
+        if not all(Path(o).exists() for o in outputs):
+            return "output missing"
+        return None
+
+    def stage(self, name, fingerprint, outputs, run):
+        """Run `run()` unless the stage's fingerprint and outputs match the last run."""
+        t0 = time.perf_counter()
+        reason = self._decision(self.state["stages"].get(name), fingerprint, outputs)
+        if reason is None:
+            print(f"⏭️  {name}: inputs unchanged, skipping")
+        else:
+            print(f"▶️  {name}: {reason}")
+            run()
+            self.state["stages"][name] = {"fingerprint": fingerprint, "outputs": [str(o) for o in outputs]}
+        self.stages.append({
+            "stage": name, "action": "skipped" if reason is None else "ran",
+            "reason": reason or "inputs unchanged", "seconds": round(time.perf_counter() - t0, 3),
+            "fingerprint": fingerprint[:12],
+        })
+
+
+def run_price_pipeline(prices_path, weather_paths, n_lags=7, force=False, data_dir=DATA_DIR,
+                       models_dir=MODELS_DIR, state_file=None, workers=None, forest_jobs=None):
+    """
+    merge -> merged_prices_weather.csv, lags -> prices_model_ready.csv, train -> models/price_rf_<crop>/ (model_store).
+    Returns the run report: per-stage timings/decisions and per-crop train/skip results
+    (wall seconds and peak RSS for trained crops). workers/forest_jobs: see train_price_model.train_crops.
+    """
+    p = Pipeline(data_dir, state_file=state_file, force=force)
+    data_dir = Path(data_dir)
+    merged_path = data_dir / "merged_prices_weather.csv"
+    ready_path = data_dir / "prices_model_ready.csv"
+    weather_paths = sorted(Path(w) for w in weather_paths)
+
+    merge_fp = digest({
+        "stage": "merge",
+        "prices": p.file_fingerprint(prices_path),
+        "weather": [[w.name, p.file_fingerprint(w)] for w in weather_paths],
+    })
+
+    def merge():
+        prices = load_table(prices_path, copy=False)
+        weather = pd.concat([load_table(w, copy=False) for w in weather_paths], ignore_index=True)
+        write_csv_atomic(merge_prices_weather(prices, weather), merged_path)
+
+    p.stage("merge", merge_fp, [merged_path], merge)
+
+    lags_fp = digest({"stage": "lags", "merge": merge_fp, "n_lags": n_lags})
+    p.stage("lags", lags_fp, [ready_path],
+            lambda: write_csv_atomic(make_price_lags(load_table(merged_path, copy=False), n_lags=n_lags), ready_path))
+
+    # train: one fingerprint per crop over that crop's training rows
+    t0 = time.perf_counter()
+    params = {"n_lags": n_lags, "features": tpm.feature_columns(n_lags), "rf": tpm.RF_PARAMS,
+              "sklearn": sklearn.__version__}
+    ready = load_table(ready_path, copy=False)
+    crops, previous, changed = {}, p.state["crops"], []
+    for crop, sub in tpm.crop_frames(ready, n_lags):
+        crop = str(crop)
+        fp = digest({"params": params, "data": frame_digest(sub[tpm.feature_columns(n_lags) + ["price"]])})
+        reason = p._decision(previous.get(crop), fp, [tpm.model_path(crop, models_dir)])
+        if reason is None:
+            crops[crop] = {"action": "skipped", "reason": "data unchanged", "rows": len(sub),
+                           "mae": previous[crop].get("mae")}
+        else:
+            crops[crop] = {"action": "trained", "reason": reason, "fingerprint": fp}
+            changed.append((crop, sub))
+    # changed crops are fitted together so they can share the process pool
+    for crop, res in tpm.train_crops(changed, n_lags, models_dir, workers=workers, forest_jobs=forest_jobs).items():
+        previous[crop] = {"fingerprint": crops[crop].pop("fingerprint"), "mae": res["mae"]}
+        crops[crop].update(res)
+    n_trained = sum(1 for c in crops.values() if c["action"] == "trained")
+    p.stages.append({
+        "stage": "train", "action": "ran" if n_trained else "skipped",
+        "reason": f"{n_trained} of {len(crops)} crops retrained", "seconds": round(time.perf_counter() - t0, 3),
+        "fingerprint": digest(params)[:12],
+    })
+    p.save_state()
+    return {
+        "models_trained": n_trained,
+        "models_skipped": len(crops) - n_trained,
+        "records_used": int(len(ready)),
+        "stages": p.stages,
+        "crops": crops,
+    }
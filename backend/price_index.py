@@ -0,0 +1,146 @@
+# backend/price_index.py
+# In-memory time-series index behind /api/prices.
+# Prices are grouped once per crop into date-sorted arrays (rebuilt only when the DataStore hands
+# back a new frame, i.e. the CSV changed), so a query is two binary searches plus a slice.
+# Long ranges can be downsampled server-side for charts: LTTB (largest triangle three buckets),
+# per-bucket min/max, or per-bucket mean.
+
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    from data_store import load_table
+except ImportError:  # imported as backend.price_index from the repo root
+    from backend.data_store import load_table
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax", "mean")
+MAX_POINTS = 5000
+
+
+def crop_key(crop):
+    return str(crop).strip().lower()
+
+
+# --------------------------------------------------------------------------------
+# DOWNSAMPLING (x: int64 ns timestamps, y: float64, both sorted by x)
+# --------------------------------------------------------------------------------
+def _bucket_edges(n, n_buckets):
+    return np.linspace(0, n, n_buckets + 1).astype(np.int64)
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: keeps first/last points and the visually dominant point per bucket."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    xf = x.astype(np.float64)
+    edges = _bucket_edges(n - 2, n_out - 2) + 1
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # average of the next bucket (or the last point) is the third triangle vertex
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i < n_out - 3 else (n - 1, n)
+        cx, cy = xf[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((xf[a] - cx) * (y[lo:hi] - y[a]) - (xf[a] - xf[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def minmax(x, y, n_out):
+    """Min and max of each of n_out/2 buckets, in time order (preserves spikes)."""
+    n = len(x)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+    edges = _bucket_edges(n, n_out // 2)
+    idx = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            seg = y[lo:hi]
+            idx.extend(sorted({lo + int(np.argmin(seg)), lo + int(np.argmax(seg))}))
+    return np.asarray(idx, dtype=np.int64)
+
+
+def bucket_mean(x, y, n_out):
+    """Mean date and price of n_out equal-count buckets. Returns (x, y) rather than indices."""
+    n = len(x)
+    if n_out >= n:
+        return x, y
+    edges = _bucket_edges(n, n_out)[:-1]
+    counts = np.diff(np.append(edges, n))
+    mx = (np.add.reduceat(x.astype(np.float64), edges) / counts).astype(np.int64)
+    return mx, np.add.reduceat(y, edges) / counts
+
+
+def downsample(x, y, n_out, method="lttb"):
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"unknown downsample method {method!r} (expected one of {', '.join(DOWNSAMPLE_METHODS)})")
+    if method == "mean":
+        return bucket_mean(x, y, n_out)
+    idx = lttb(x, y, n_out) if method == "lttb" else minmax(x, y, n_out)
+    return x[idx], y[idx]
+
+
+# --------------------------------------------------------------------------------
+# INDEX
+# --------------------------------------------------------------------------------
+class PriceIndex:
+    """Per-crop date-sorted (dates, prices) arrays over a prices CSV (crop or commodity column)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._df = None
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _index(self):
+        df = load_table(self.path, copy=False)
+        if df is not self._df:
+            with self._lock:
+                if df is not self._df:
+                    self._series = self._build(df)
+                    self._df = df
+        return self._series
+
+    @staticmethod
+    def _build(df):
+        col = "crop" if "crop" in df.columns else "commodity"
+        dates = pd.to_datetime(df["date"]).to_numpy(dtype="datetime64[ns]").view(np.int64)
+        prices = df["price"].to_numpy(dtype=np.float64)
+        keys = df[col].astype(str).str.strip().str.lower().to_numpy()
+        series = {}
+        for key, idx in pd.Series(keys).groupby(keys, sort=False).indices.items():
+            order = idx[np.argsort(dates[idx], kind="stable")]
+            series[key] = (dates[order], prices[order])
+        return series
+
+    def crops(self):
+        return sorted(self._index())
+
+    def query(self, crop, start=None, end=None, limit=None):
+        """
+        (dates as int64 ns, prices) for `crop` with start <= date <= end, keeping the most recent
+        `limit` rows. Returns None for an unknown crop.
+        """
+        hit = self._index().get(crop_key(crop))
+        if hit is None:
+            return None
+        dates, prices = hit
+        lo = 0 if start is None else np.searchsorted(dates, pd.Timestamp(start).value, side="left")
+        hi = len(dates) if end is None else np.searchsorted(dates, pd.Timestamp(end).value, side="right")
+        if limit is not None:
+            lo = max(lo, hi - limit)
+        return dates[lo:hi], prices[lo:hi]
+
+
+def etag(*arrays, extra=""):
+    """ETag value (unquoted) over the response arrays and any response parameters."""
+    h = hashlib.sha1(extra.encode())
+    for a in arrays:
+        h.update(np.ascontiguousarray(a).tobytes())
+    return h.hexdigest()[:20]
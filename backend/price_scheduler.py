@@ -3,10 +3,9 @@
 
 from apscheduler.schedulers.blocking import BlockingScheduler
 from datetime import date
-from pathlib import Path
-from backend.data_ingest import fetch_weather_for_coords, save_weather, fetch_prices_agmarknet, save_prices
-from backend.data_prep import merge_prices_weather, make_price_lags
-from backend.train_price_model import train_all_crops
+from backend.data_ingest import ingest_weather_incremental, fetch_prices_agmarknet, save_prices
+from backend.pipeline import DATA_DIR, run_price_pipeline
+from backend.retrain_scheduler import log_status
 
 # configure here
 LAT = 19.0760
@@ -16,9 +15,8 @@ COMMODITY = "Wheat"
 def job_daily_update():
     print("Daily job start -", date.today().isoformat())
     try:
-        # fetch last 365 days weather for sample coords
-        w = fetch_weather_for_coords(LAT, LON, days=365)
-        save_weather(w)
+        # bring the last 365 days of weather for sample coords up to date (only missing days are fetched)
+        ingest_weather_incremental(LAT, LON, filename="weather_recent.csv", days=365)
     except Exception as e:
         print("Weather fetch error:", e)
     try:
@@ -27,19 +25,14 @@ def job_daily_update():
         save_prices(p)
     except Exception as e:
         print("Agmarknet fetch failed:", e)
-    # prepare and train (you can call the other scripts or functions)
+    # prepare and train; stages and crops whose inputs didn't change are skipped
     try:
-        import backend.data_prep as dp
-        prices = dp.load_prices()
-        weather = dp.load_weather()
-        merged = dp.merge_prices_weather(prices, weather)
-        merged.to_csv(Path("backend/data/merged_prices_weather.csv"), index=False)
-        df_lags = dp.make_price_lags(merged, n_lags=7)
-        df_lags.to_csv(Path("backend/data/prices_model_ready.csv"), index=False)
-        train_all_crops(input_csv=Path("backend/data/prices_model_ready.csv"))
+        report = run_price_pipeline(DATA_DIR / "market_prices_real.csv", [DATA_DIR / "weather_recent.csv"], n_lags=7)
+        log_status("success", details=report)
         print("Daily update done.")
     except Exception as e:
         print("Prepare/train step failed:", e)
+        log_status("failed", str(e))
 
 if __name__ == "__main__":
     sched = BlockingScheduler()
@@ -1,19 +1,16 @@
 import schedule
 import time
-import pandas as pd
-import os
 import json
 from pathlib import Path
 from datetime import datetime
 
 # Import core modules
-from backend.data_prep import merge_prices_weather, make_price_lags
-from backend.train_price_model import train_all_crops
+from backend import metrics
+from backend.pipeline import run_price_pipeline
 from backend.data_ingest import (
     fetch_prices_csv,
-    fetch_weather_for_coords,
+    ingest_weather_incremental,
     save_prices,
-    save_weather,
 )
 
 # --- Paths ---
@@ -26,38 +23,18 @@ STATUS_FILE = DATA_DIR / "retrain_status.json"
 DEFAULT_LAT, DEFAULT_LON = 19.0760, 72.8777
 
 
-def log_status(status: str, error: str = None):
-    """Save retraining status and timestamp for frontend dashboard."""
+def log_status(status: str, error: str = None, details: dict = None):
+    """Save retraining status, timestamp and the pipeline report (stages, crops) for the dashboard."""
     data = {
         "last_run": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "status": status if not error else f"failed: {error}",
     }
+    if details:
+        data["details"] = details
     with open(STATUS_FILE, "w") as f:
         json.dump(data, f, indent=2)
 
 
-def ensure_datasets():
-    """Ensure both price and weather data exist. Auto-fetch if missing."""
-    price_path = DATA_DIR / "market_prices_real.csv"
-    weather_path = DATA_DIR / "weather_recent.csv"
-
-    # ✅ Ensure price dataset
-    if not price_path.exists():
-        print("⚠️  Price dataset not found — attempting fallback load...")
-        csv_path = BASE / "Agriculture_price_dataset.csv"
-        if csv_path.exists():
-            dfp = fetch_prices_csv(str(csv_path))
-            save_prices(dfp)
-        else:
-            raise FileNotFoundError("❌ Missing both market_prices_real.csv and fallback CSV!")
-
-    # ✅ Ensure weather dataset
-    if not weather_path.exists():
-        print("🌦  Weather dataset missing — fetching from Open-Meteo API...")
-        dfw = fetch_weather_for_coords(DEFAULT_LAT, DEFAULT_LON, days=365)
-        save_weather(dfw)
-
-
 def retrain_models():
     """Main retraining process — merges, trains and updates status."""
     try:
@@ -66,48 +43,42 @@ def retrain_models():
 
         ensure_datasets()
 
-        # Load datasets
-        prices = pd.read_csv(DATA_DIR / "market_prices_real.csv", parse_dates=["date"])
-        weather_files = list(DATA_DIR.glob("weather_*.csv"))
+        weather_files = sorted(DATA_DIR.glob("weather_*.csv"))
         if not weather_files:
             weather_files = [DATA_DIR / "weather_recent.csv"]
 
-        weather = pd.concat(
-            [pd.read_csv(f, parse_dates=["date"]) for f in weather_files],
-            ignore_index=True,
-        )
-
-        # Merge and prepare model dataset
-        merged = merge_prices_weather(prices, weather)
-        df_lags = make_price_lags(merged, n_lags=7)
-        df_lags.to_csv(DATA_DIR / "prices_model_ready.csv", index=False)
-
-        # Train models
-        train_all_crops(input_csv=DATA_DIR / "prices_model_ready.csv")
+        # merge -> lags -> train, skipping stages and crops whose inputs are unchanged
+        with metrics.stage("retrain_models"):
+            report = run_price_pipeline(DATA_DIR / "market_prices_real.csv", weather_files, n_lags=7)
 
         print("✅ Model retraining complete!")
-        log_status("success")
+        log_status("success", details=report)
 
     except Exception as e:
         print(f"❌ Retraining failed: {e}")
         log_status("failed", str(e))
+    finally:
+        # the scheduler runs for weeks; don't wait for exit to publish the numbers
+        metrics.flush()
 
 def ensure_datasets():
-    """Ensure both price and weather data exist before training."""
+    """Ensure price data exists and weather is current before training."""
     price_path = DATA_DIR / "market_prices_real.csv"
     weather_path = DATA_DIR / "weather_recent.csv"
 
     if not price_path.exists():
         print("⚠️  Price dataset not found — generating fallback CSV...")
-        from backend.data_ingest import fetch_prices_csv, save_prices
         dfp = fetch_prices_csv(BASE / "Agriculture_price_dataset.csv")
         save_prices(dfp)
 
-    if not weather_path.exists():
-        print("🌦  Weather dataset missing — fetching via Open-Meteo API...")
-        from backend.data_ingest import fetch_weather_for_coords, save_weather
-        dfw = fetch_weather_for_coords(19.0760, 72.8777, days=365)
-        save_weather(dfw)
+    # incremental: only days after the stored watermark are fetched
+    print("🌦  Updating weather dataset via Open-Meteo API...")
+    try:
+        ingest_weather_incremental(DEFAULT_LAT, DEFAULT_LON, filename=weather_path.name, days=365)
+    except Exception as e:
+        if not weather_path.exists():
+            raise
+        print(f"⚠️  Weather update failed ({e}) — training on the stored data.")
 
 
 
@@ -1,20 +1,470 @@
-import pandas as pd
+# backend/supply_analytics.py
+# Supply vs demand per region, behind /api/supply/summary and /api/supply/regions.
+# Warehouse capacity (supply.csv: warehouse_id, region or location, capacity) and demand
+# (demand.csv: region, demand) are aggregated once into per-region arrays; summary totals and
+# deficit/surplus counts are kept as running values. Changing one warehouse's capacity or one
+# region's demand adjusts its region and the totals in O(1) instead of re-merging the tables.
+# The CSVs are re-read only when they change on disk behind our back (e.g. another worker wrote them).
+#
+# Updates from the PUT endpoints are appended to a journal next to supply.csv (supply_updates.jsonl,
+# one JSON object per update) instead of rewriting the 300k-row tables each time; every worker
+# replays the journal lines it hasn't seen on sync(). Once JOURNAL_MAX updates have accumulated they
+# are folded into the CSVs and the journal is removed. Updates, flushes and saves run under a file
+# lock (fcntl, like model_store), so concurrent workers never drop each other's writes.
+#
+#   python supply_analytics.py   -> data/supply_analysis.csv (one row per region)
+
+import json
+import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: updates aren't serialised between processes
+    fcntl = None
+
+try:
+    from data_store import load_table, write_csv_atomic
+except ImportError:  # imported as backend.supply_analytics from the repo root
+    from backend.data_store import load_table, write_csv_atomic
+
 BASE = Path(__file__).resolve().parents[0]
 DATA_DIR = BASE / "data"
+SORT_KEYS = ("deficit", "demand", "capacity", "region")
+JOURNAL_MAX = int(os.environ.get("SUPPLY_JOURNAL_MAX", 1000))
+
+
+def region_column(df):
+    return "region" if "region" in df.columns else "location"
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except FileNotFoundError:
+        return None
+
+
+def _journal_stat(path):
+    try:
+        st = os.stat(path)
+        return st.st_ino, st.st_size
+    except FileNotFoundError:
+        return None
+
+
+def _status(deficit):
+    # no spare capacity counts as a deficit, as in the original report
+    return "surplus" if deficit < 0 else "deficit"
+
+
+class SupplyIndex:
+    """
+    Per-region capacity/demand aggregates over a supply and a demand table.
+    Regions and warehouses own slots in growable arrays; names are looked up through dicts.
+    """
+
+    def __init__(self, supply_path=DATA_DIR / "supply.csv", demand_path=DATA_DIR / "demand.csv", journal_path=None):
+        self.supply_path = Path(supply_path)
+        self.demand_path = Path(demand_path)
+        self.journal_path = Path(journal_path) if journal_path else self.supply_path.with_name("supply_updates.jsonl")
+        self._stats = None
+        # (inode, bytes replayed, entries replayed) of the journal; inode None when there is none
+        self._journal = (None, 0, 0)
+        self._lock = threading.RLock()
+        self._reset(0, 0)
+
+    # ------------------------------------------------------------------
+    # BUILD
+    # ------------------------------------------------------------------
+    def _reset(self, n_regions, n_warehouses):
+        self._regions = {}
+        self._region_names = []
+        self._capacity = np.zeros(max(n_regions, 16))
+        self._demand = np.zeros(max(n_regions, 16))
+        self._n_wh = np.zeros(max(n_regions, 16), dtype=np.int64)
+        self._warehouses = {}
+        self._wh_ids = []
+        self._wh_capacity = np.zeros(max(n_warehouses, 16))
+        self._wh_region = np.zeros(max(n_warehouses, 16), dtype=np.int64)
+        self._supply_extra = None
+        self._supply_dtypes = {}
+        self._region_col = "region"
+        # demand.csv as loaded (every column and row), each row's region slot and numeric demand
+        self._demand_table = pd.DataFrame(columns=["region", "demand"])
+        self._demand_row_slot = np.zeros(0, dtype=np.int64)
+        self._demand_row_value = np.zeros(0)
+        self.totals = {"capacity": 0.0, "demand": 0.0, "deficit_regions": 0, "surplus_regions": 0,
+                       "shortfall": 0.0, "spare": 0.0}
+
+    def _region_slot(self, name):
+        slot = self._regions.get(name)
+        if slot is None:
+            slot = self._regions[name] = len(self._region_names)
+            self._region_names.append(name)
+            if slot >= len(self._capacity):
+                grow = len(self._capacity)
+                self._capacity = np.concatenate([self._capacity, np.zeros(grow)])
+                self._demand = np.concatenate([self._demand, np.zeros(grow)])
+                self._n_wh = np.concatenate([self._n_wh, np.zeros(grow, dtype=np.int64)])
+            self._count(slot, +1)
+        return slot
+
+    def _count(self, slot, sign):
+        """Add (sign=+1) or remove (-1) one region's contribution to the running totals."""
+        t = self.totals
+        cap, dem = self._capacity[slot], self._demand[slot]
+        t["capacity"] += sign * cap
+        t["demand"] += sign * dem
+        t[f"{_status(dem - cap)}_regions"] += sign
+        t["shortfall"] += sign * max(dem - cap, 0.0)
+        t["spare"] += sign * max(cap - dem, 0.0)
+
+    def load(self, supply, demand):
+        """Rebuild every aggregate from full tables (vectorised)."""
+        with self._lock:
+            rcol = region_column(supply)
+            s_regions = supply[rcol].astype(str).to_numpy() if len(supply) else np.array([], dtype=object)
+            d_regions = demand["region"].astype(str).to_numpy() if len(demand) else np.array([], dtype=object)
+            codes, names = pd.factorize(np.concatenate([s_regions, d_regions]))
+            s_codes, d_codes = codes[:len(s_regions)], codes[len(s_regions):]
+            n = len(names)
+            wh_cap = pd.to_numeric(supply["capacity"], errors="coerce").fillna(0).to_numpy(np.float64) if len(supply) else np.zeros(0)
+            dem = pd.to_numeric(demand["demand"], errors="coerce").fillna(0).to_numpy(np.float64) if len(demand) else np.zeros(0)
+            self._reset(n, len(supply))
+            self._region_names = [str(x) for x in names]
+            self._regions = {name: i for i, name in enumerate(self._region_names)}
+            self._capacity[:n] = np.bincount(s_codes, weights=wh_cap, minlength=n)
+            self._demand[:n] = np.bincount(d_codes, weights=dem, minlength=n)
+            self._n_wh[:n] = np.bincount(s_codes, minlength=n)
+            self._wh_ids = supply["warehouse_id"].astype(str).tolist() if len(supply) else []
+            self._warehouses = {w: i for i, w in enumerate(self._wh_ids)}
+            self._wh_capacity[:len(wh_cap)] = wh_cap
+            self._wh_region[:len(s_codes)] = s_codes
+            # other supply columns (lat/lon, names) are carried along for save()
+            self._region_col = rcol
+            self._supply_extra = supply.drop(columns=[rcol, "warehouse_id", "capacity"], errors="ignore").reset_index(drop=True)
+            self._supply_dtypes = supply.dtypes.to_dict()
+            self._demand_table = demand.reset_index(drop=True)
+            self._demand_row_slot = np.asarray(d_codes, dtype=np.int64)
+            self._demand_row_value = dem
+            cap, d = self._capacity[:n], self._demand[:n]
+            deficit = d - cap
+            self.totals = {
+                "capacity": float(cap.sum()), "demand": float(d.sum()),
+                "deficit_regions": int((deficit >= 0).sum()), "surplus_regions": int((deficit < 0).sum()),
+                "shortfall": float(np.clip(deficit, 0, None).sum()), "spare": float(np.clip(-deficit, 0, None).sum()),
+            }
+
+    def _stale(self, stats, journal):
+        """(rebuild, replay): whether the CSVs must be re-read, whether the journal has unseen lines."""
+        ino, offset, _ = self._journal
+        if stats != self._stats:
+            return True, journal is not None
+        if journal is None:
+            return ino is not None, False
+        if ino is not None and (journal[0] != ino or journal[1] < offset):
+            return True, True
+        return False, journal[1] > offset
+
+    def sync(self):
+        """
+        Rebuild from the CSVs if either changed on disk since the last build or save, then apply
+        journalled updates this process hasn't seen yet.
+        """
+        stats = (_stat(self.supply_path), _stat(self.demand_path))
+        if self._stale(stats, _journal_stat(self.journal_path)) == (False, False):
+            return False
+        with self._lock:
+            journal = _journal_stat(self.journal_path)
+            rebuild, replay = self._stale(stats, journal)
+            if rebuild:
+                supply = load_table(self.supply_path, copy=False) if stats[0] else pd.DataFrame(columns=["warehouse_id", "region", "capacity"])
+                demand = load_table(self.demand_path, copy=False) if stats[1] else pd.DataFrame(columns=["region", "demand"])
+                self.load(supply, demand)
+                self._stats = stats
+                self._journal = (None, 0, 0)
+            if replay:
+                self._replay()
+            return rebuild or replay
 
-def analyze_supply_chain():
-    supply = pd.read_csv(DATA_DIR / "supply.csv")
-    demand = pd.read_csv(DATA_DIR / "demand.csv")
-    merged = pd.merge(supply, demand, on="region", how="outer").fillna(0)
-    merged["deficit"] = merged["demand"] - merged["capacity"]
-    merged["status"] = merged["deficit"].apply(lambda x: "surplus" if x < 0 else "deficit")
-    summary = merged.groupby("status")["region"].count().to_dict()
-    print("🚚 Supply chain summary:", summary)
-    merged.to_csv(DATA_DIR / "supply_analysis.csv", index=False)
+    def _replay(self):
+        """Apply journal lines past the replayed offset; a line still being written is left for later."""
+        ino, offset, entries = self._journal
+        try:
+            with open(self.journal_path, "rb") as f:
+                ino = os.fstat(f.fileno()).st_ino
+                if ino != self._journal[0]:
+                    offset, entries = 0, 0
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        data = data[:data.rfind(b"\n") + 1]
+        for line in data.splitlines():
+            self._apply(json.loads(line))
+        self._journal = (ino, offset + len(data), entries + data.count(b"\n"))
+
+    def _apply(self, update):
+        if "demand" in update:
+            return self.set_demand(update["region"], update["demand"])
+        return self.set_capacity(update["warehouse_id"], update["capacity"], region=update.get("region"))
+
+    # ------------------------------------------------------------------
+    # INCREMENTAL UPDATES
+    # ------------------------------------------------------------------
+    def set_demand(self, region, demand):
+        """Set one region's demand. Returns the region's row."""
+        with self._lock:
+            slot = self._region_slot(str(region))
+            self._count(slot, -1)
+            self._demand[slot] = float(demand)
+            self._count(slot, +1)
+            return self.region_row(slot)
+
+    def set_capacity(self, warehouse_id, capacity, region=None):
+        """
+        Set one warehouse's capacity, moving it to `region` if given (a new warehouse needs one).
+        Returns the warehouse's region row.
+        """
+        with self._lock:
+            warehouse_id = str(warehouse_id)
+            w = self._warehouses.get(warehouse_id)
+            if w is None:
+                if region is None:
+                    raise KeyError(f"unknown warehouse {warehouse_id!r}; give its region to add it")
+                w = self._warehouses[warehouse_id] = len(self._wh_ids)
+                self._wh_ids.append(warehouse_id)
+                if w >= len(self._wh_capacity):
+                    grow = len(self._wh_capacity)
+                    self._wh_capacity = np.concatenate([self._wh_capacity, np.zeros(grow)])
+                    self._wh_region = np.concatenate([self._wh_region, np.zeros(grow, dtype=np.int64)])
+                old_slot = None
+            else:
+                old_slot = int(self._wh_region[w])
+            new_slot = self._region_slot(str(region)) if region is not None else old_slot
+            if old_slot is not None:
+                self._count(old_slot, -1)
+                self._capacity[old_slot] -= self._wh_capacity[w]
+                self._n_wh[old_slot] -= 1
+                self._count(old_slot, +1)
+            self._count(new_slot, -1)
+            self._capacity[new_slot] += float(capacity)
+            self._n_wh[new_slot] += 1
+            self._count(new_slot, +1)
+            self._wh_capacity[w] = float(capacity)
+            self._wh_region[w] = new_slot
+            return self.region_row(new_slot)
+
+    def update_demand(self, region, demand):
+        """set_demand, persisted: journalled under the file lock, visible to every worker on sync()."""
+        return self._update({"region": str(region), "demand": float(demand)})
+
+    def update_capacity(self, warehouse_id, capacity, region=None):
+        """set_capacity, persisted like update_demand. KeyError (nothing written) for an unknown warehouse without a region."""
+        return self._update({"warehouse_id": str(warehouse_id), "capacity": float(capacity), "region": region})
+
+    def _update(self, update):
+        with self._lock, self._locked():
+            self.sync()
+            row = self._apply(update)
+            if "warehouse_id" in update:
+                update["region"] = row["region"]
+            with open(self.journal_path, "ab") as f:
+                f.write(json.dumps(update).encode() + b"\n")
+                ino, offset = os.fstat(f.fileno()).st_ino, f.tell()
+            self._journal = (ino, offset, self._journal[2] + 1)
+            if self._journal[2] >= JOURNAL_MAX:
+                self._write_tables()
+        return row
+
+    # ------------------------------------------------------------------
+    # QUERIES
+    # ------------------------------------------------------------------
+    def region_row(self, slot):
+        cap, dem = float(self._capacity[slot]), float(self._demand[slot])
+        return {"region": self._region_names[slot], "capacity": cap, "demand": dem, "deficit": dem - cap,
+                "status": _status(dem - cap), "warehouses": int(self._n_wh[slot])}
+
+    def summary(self, top=10):
+        """Running totals plus the `top` regions with the largest deficit."""
+        with self._lock:
+            n = len(self._region_names)
+            out = {"regions": n, "warehouses": len(self._wh_ids),
+                   **{k: (round(v, 3) if isinstance(v, float) else v) for k, v in self.totals.items()}}
+            deficit = self._demand[:n] - self._capacity[:n]
+            k = min(top, n)
+            idx = np.argpartition(-deficit, k - 1)[:k] if 0 < k < n else np.arange(k)
+            idx = idx[np.argsort(-deficit[idx], kind="stable")]
+            out["top_deficits"] = [self.region_row(i) for i in idx if deficit[i] > 0]
+        return out
+
+    def region(self, name):
+        """One region with its warehouses, or None if unknown."""
+        with self._lock:
+            slot = self._regions.get(str(name))
+            if slot is None:
+                return None
+            row = self.region_row(slot)
+            members = np.flatnonzero(self._wh_region[:len(self._wh_ids)] == slot)
+            row["warehouse_list"] = [{"warehouse_id": self._wh_ids[w], "capacity": float(self._wh_capacity[w])}
+                                     for w in members]
+        return row
+
+    def regions(self, status=None, sort="deficit", limit=50, offset=0):
+        """(total matching, page of region rows) sorted descending by `sort` (ascending for "region")."""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"unknown sort {sort!r} (expected one of {', '.join(SORT_KEYS)})")
+        if status not in (None, "deficit", "surplus"):
+            raise ValueError(f"unknown status {status!r}")
+        with self._lock:
+            n = len(self._region_names)
+            cap, dem = self._capacity[:n], self._demand[:n]
+            idx = np.arange(n)
+            if status is not None:
+                deficit = dem - cap
+                idx = idx[deficit >= 0] if status == "deficit" else idx[deficit < 0]
+            total = len(idx)
+            if sort == "region":
+                names = np.asarray(self._region_names, dtype=object)[idx]
+                idx = idx[np.argsort(names, kind="stable")]
+            else:
+                key = {"deficit": dem - cap, "demand": dem, "capacity": cap}[sort][idx]
+                if offset + limit < len(idx):
+                    # only the requested page needs ordering
+                    part = np.argpartition(-key, offset + limit - 1)[:offset + limit]
+                    idx, key = idx[part], key[part]
+                idx = idx[np.argsort(-key, kind="stable")]
+            page = [self.region_row(i) for i in idx[offset:offset + limit]]
+        return total, page
+
+    def frame(self):
+        """One row per region: region, capacity, demand, deficit, status, warehouses."""
+        with self._lock:
+            n = len(self._region_names)
+            cap, dem = self._capacity[:n].copy(), self._demand[:n].copy()
+            df = pd.DataFrame({"region": self._region_names, "capacity": cap, "demand": dem,
+                               "deficit": dem - cap, "warehouses": self._n_wh[:n].copy()})
+        df.insert(4, "status", np.where(df["deficit"] < 0, "surplus", "deficit"))
+        return df
+
+    # ------------------------------------------------------------------
+    # PERSISTENCE
+    # ------------------------------------------------------------------
+    @contextmanager
+    def _locked(self):
+        """Serialise journal appends and table rewrites between processes sharing these CSVs."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.supply_path.with_name(f".{self.supply_path.name}.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def save(self):
+        """Write the current capacity/demand (every worker's updates included) back to the CSVs."""
+        with self._lock, self._locked():
+            self.sync()
+            self._write_tables()
+
+    def flush(self):
+        """Fold journalled updates into the CSVs, if there are any, so plain readers of the files see them."""
+        if _journal_stat(self.journal_path) is None:
+            return False
+        with self._lock, self._locked():
+            self.sync()
+            if self._journal[0] is None:
+                return False
+            self._write_tables()
+        return True
+
+    def _write_tables(self):
+        """Rewrite both CSVs from memory and drop the journal they now include; callers hold the file lock."""
+        with self._lock:
+            n = len(self._wh_ids)
+            supply = pd.DataFrame({"warehouse_id": self._wh_ids,
+                                   self._region_col: [self._region_names[r] for r in self._wh_region[:n]],
+                                   "capacity": _like(self._supply_dtypes.get("capacity"), self._wh_capacity[:n])})
+            if self._supply_extra is not None and len(self._supply_extra.columns):
+                extra = self._supply_extra.reindex(range(n))
+                supply = pd.concat([supply, extra], axis=1)
+            # the file's own column order, new columns (none, normally) last
+            order = [c for c in self._supply_dtypes if c in supply.columns]
+            supply = supply[order + [c for c in supply.columns if c not in order]]
+            write_csv_atomic(supply, self.supply_path)
+            write_csv_atomic(self._demand_frame(), self.demand_path)
+            self.journal_path.unlink(missing_ok=True)
+            self._stats = (_stat(self.supply_path), _stat(self.demand_path))
+            self._journal = (None, 0, 0)
+
+
+    def _demand_frame(self):
+        """
+        demand.csv as loaded, with only the demand values of regions whose total changed rewritten:
+        spread over the region's rows in proportion to their old values (all to its first row if
+        they summed to 0). A region with demand but no row gets one; other columns are kept as is.
+        """
+        n = len(self._region_names)
+        table, slots, values = self._demand_table, self._demand_row_slot, self._demand_row_value.copy()
+        new = self._demand[:n]
+        old = np.bincount(slots, weights=values, minlength=n)
+        changed = old != new
+        add = np.flatnonzero(changed & (np.bincount(slots, minlength=n) == 0) & (new != 0))
+        if len(add):
+            extra = pd.DataFrame({"region": [self._region_names[r] for r in add], "demand": 0})
+            table = pd.concat([table, extra.astype({"demand": table["demand"].dtype}, errors="ignore")],
+                              ignore_index=True)
+            slots = np.concatenate([slots, add])
+            values = np.concatenate([values, np.zeros(len(add))])
+            old[add] = 0.0
+        rows = np.flatnonzero(changed[slots])
+        if len(rows):
+            s = slots[rows]
+            first = np.full(n, -1)
+            first[slots[::-1]] = np.arange(len(slots))[::-1]
+            share = np.where(old[s] != 0, values[rows] / np.where(old[s] != 0, old[s], 1.0),
+                             (rows == first[s]).astype(np.float64))
+            values[rows] = new[s] * share
+            column = table["demand"]
+            written = _like(column.dtype, values[rows])
+            if written.dtype != column.dtype and not pd.api.types.is_object_dtype(column):
+                column = column.astype(written.dtype)
+            else:
+                column = column.copy()
+            column.iloc[rows] = written
+            table = table.assign(demand=column)
+        self._demand_table, self._demand_row_slot, self._demand_row_value = table, slots, values
+        return table
+
+
+def _like(dtype, values):
+    """float values as an integer column when the original column was integer and they still are."""
+    values = np.asarray(values, dtype=np.float64)
+    if dtype is not None and pd.api.types.is_integer_dtype(dtype) and np.array_equal(values, np.round(values)):
+        return values.astype(np.int64)
+    return values
+
+
+def analyze_supply_chain(data_dir=DATA_DIR):
+    """Per-region supply vs demand, written to data/supply_analysis.csv."""
+    data_dir = Path(data_dir)
+    index = SupplyIndex(data_dir / "supply.csv", data_dir / "demand.csv")
+    index.sync()
+    merged = index.frame()
+    print("🚚 Supply chain summary:", merged["status"].value_counts().to_dict())
+    write_csv_atomic(merged, data_dir / "supply_analysis.csv")
     return merged
 
+
 if __name__ == "__main__":
     df = analyze_supply_chain()
     print(df.head())
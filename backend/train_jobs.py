@@ -0,0 +1,268 @@
+# backend/train_jobs.py
+# Background training jobs for /api/train.
+# A job prepares the datasets, then fits the health classifier and one price regressor per crop
+# in a process pool. Progress, per-crop timings and MAE are kept in memory and mirrored to
+# data/train_status.json (same idea as retrain_scheduler.log_status).
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only requests within one process are coalesced
+    fcntl = None
+
+from data_store import load_table
+import model_store
+from features import add_lag_features, feature_columns
+from model_registry import HEALTH_MODEL, price_model_name
+
+BASE = Path(__file__).resolve().parents[0]
+DATA_DIR = BASE / "data"
+MODELS_DIR = BASE / "models"
+STATUS_FILE = DATA_DIR / "train_status.json"
+
+HEALTH_FEATURES = ["ndvi", "evi", "soil_moisture", "pest_index", "temp_max", "temp_min", "precip_mm", "humidity", "wind_speed"]
+PRICE_WEATHER = ["temp_max", "temp_min", "precip_mm", "humidity", "wind_speed"]
+N_LAGS = 7
+N_ESTIMATORS = 50
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)  # signal 0: existence check only (POSIX; see _running_elsewhere)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive flock on <path>.lock, held by one thread of one process at a time."""
+    if fcntl is None:
+        yield
+        return
+    with open(path.with_name(path.name + ".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _oob_mae(model, y):
+    pred = getattr(model, "oob_prediction_", None)
+    if pred is None:
+        return None
+    pred = np.ravel(pred)
+    ok = np.isfinite(pred)
+    return float(np.mean(np.abs(pred[ok] - np.asarray(y)[ok]))) if ok.any() else None
+
+
+# --------------------------------------------------------------------------------
+# WORKER TASKS (run in the process pool, so they must stay top-level and picklable)
+# --------------------------------------------------------------------------------
+def fit_health_model(X, y, models_dir):
+    from sklearn.ensemble import RandomForestClassifier
+    t0 = time.perf_counter()
+    clf = RandomForestClassifier(n_estimators=N_ESTIMATORS, random_state=42, oob_score=True)
+    clf.fit(X, y)
+    acc = float(clf.oob_score_)
+    entry = model_store.save(clf, models_dir, HEALTH_MODEL, rows=len(y), fingerprint=model_store.data_fingerprint(X, y),
+                             extra={"oob_accuracy": acc})
+    return {"seconds": round(time.perf_counter() - t0, 3), "rows": len(y), "oob_accuracy": acc, "version": entry["version"]}
+
+
+def fit_price_model(crop, X, y, models_dir):
+    from sklearn.ensemble import RandomForestRegressor
+    t0 = time.perf_counter()
+    # oob_score doesn't change the fitted trees; it gives an MAE without holding data out
+    reg = RandomForestRegressor(n_estimators=N_ESTIMATORS, random_state=42, oob_score=True)
+    reg.fit(X, y)
+    mae = _oob_mae(reg, y)
+    entry = model_store.save(reg, models_dir, price_model_name(crop), rows=len(y), mae=mae,
+                             fingerprint=model_store.data_fingerprint(X, y))
+    return {"seconds": round(time.perf_counter() - t0, 3), "rows": len(y), "mae": mae, "version": entry["version"]}
+
+
+# --------------------------------------------------------------------------------
+# DATA PREP
+# --------------------------------------------------------------------------------
+def make_lags(dfprices, n=N_LAGS):
+    return add_lag_features(dfprices, n, key="crop").dropna()
+
+
+def prepare_tasks(data_dir=DATA_DIR, models_dir=MODELS_DIR):
+    """Read the CSVs and return [(task_name, fn, args)] for every model to fit."""
+    sat = load_table(data_dir / "satellite.csv", copy=False)
+    w = load_table(data_dir / "weather.csv", copy=False)
+    prices = load_table(data_dir / "prices.csv", copy=False)
+    df = sat.merge(w, on="date", how="left").dropna(subset=HEALTH_FEATURES)
+    tasks = [("health", fit_health_model,
+              (df[HEALTH_FEATURES], (df["health_label"] == "healthy").astype(int), models_dir))]
+    pdf = make_lags(prices.merge(w, on="date", how="left"))
+    feats = feature_columns(N_LAGS) + PRICE_WEATHER
+    for c in pdf["crop"].unique():
+        sub = pdf[pdf["crop"] == c]
+        tasks.append((str(c), fit_price_model, (str(c), sub[feats], sub["price"], models_dir)))
+    return tasks
+
+
+# --------------------------------------------------------------------------------
+# JOB MANAGER
+# --------------------------------------------------------------------------------
+class TrainJobManager:
+    """
+    Runs at most one training job at a time. A train request that arrives while a job is
+    queued or running is coalesced into that job instead of starting a duplicate fit.
+    Under several server workers each has its own manager; they coalesce through the status
+    file: a submit takes a file lock, and joins the job recorded there if it is still queued or
+    running in a live process.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, models_dir=MODELS_DIR, status_file=STATUS_FILE,
+                 max_workers=None, on_complete=None, keep=20):
+        self.data_dir = Path(data_dir)
+        self.models_dir = Path(models_dir)
+        self.status_file = Path(status_file)
+        self.max_workers = max_workers or int(os.environ.get("TRAIN_WORKERS", 0)) or os.cpu_count() or 1
+        self.on_complete = on_complete
+        self.keep = keep
+        self._jobs = {}
+        self._active = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def submit(self):
+        """Start a job, or join the active one (in this process or another). Returns (job snapshot, coalesced)."""
+        with self._lock:
+            if self._active is not None:
+                self._jobs[self._active]["requests"] += 1
+                return self._snapshot(self._active), True
+        with _file_lock(self.status_file):
+            other = self._read_status()
+            if self._running_elsewhere(other):
+                return other, True
+            with self._lock:
+                if self._active is not None:
+                    self._jobs[self._active]["requests"] += 1
+                    return self._snapshot(self._active), True
+                job_id = uuid.uuid4().hex[:12]
+                self._jobs[job_id] = {
+                    "job_id": job_id, "status": "queued", "submitted": _now(), "started": None, "finished": None,
+                    "progress": {"done": 0, "total": None}, "models": {}, "error": None, "requests": 1,
+                    "pid": os.getpid(),
+                }
+                self._active = job_id
+                for old in list(self._jobs)[:-self.keep]:
+                    self._jobs.pop(old)
+                snap = self._snapshot(job_id)
+            # written before the file lock is released, so the next submit anywhere sees this job
+            self._write_status(job_id)
+        threading.Thread(target=self._run, args=(job_id,), name=f"train-{job_id}", daemon=True).start()
+        return snap, False
+
+    @staticmethod
+    def _running_elsewhere(job):
+        """True if `job` (from the status file) is queued or running in another live process."""
+        if fcntl is None or not job or job.get("status") not in ("queued", "running") or job.get("finished"):
+            return False
+        pid = job.get("pid")
+        return pid is not None and pid != os.getpid() and _pid_alive(pid)
+
+    def get(self, job_id):
+        with self._lock:
+            if job_id in self._jobs:
+                return self._snapshot(job_id)
+        # under several server workers the job may be running in another process
+        job = self._read_status()
+        return job if job and job.get("job_id") == job_id else None
+
+    def latest(self):
+        # the status file holds the newest job of any server worker (its owner rewrites it on every update)
+        job = self._read_status()
+        if job is not None:
+            return job
+        with self._lock:
+            if self._jobs:
+                return self._snapshot(next(reversed(self._jobs)))
+        return None
+
+    def _read_status(self):
+        try:
+            with open(self.status_file) as f:
+                return json.load(f).get("job")
+        except (OSError, ValueError):
+            return None
+
+    def _snapshot(self, job_id):
+        return json.loads(json.dumps(self._jobs[job_id]))
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+        self._write_status(job_id)
+
+    def _write_status(self, job_id):
+        with self._lock:
+            job = self._snapshot(job_id)
+        data = {"last_run": _now(), "status": job["status"] if not job["error"] else f"failed: {job['error']}", "job": job}
+        tmp = self.status_file.with_name(f".{self.status_file.name}.{os.getpid()}.tmp")
+        with self._write_lock:
+            with open(tmp, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp, self.status_file)
+
+    def _run(self, job_id):
+        t0 = time.perf_counter()
+        self._update(job_id, status="running", started=_now())
+        try:
+            tasks = prepare_tasks(self.data_dir, self.models_dir)
+            with self._lock:
+                self._jobs[job_id]["progress"]["total"] = len(tasks)
+            ctx = multiprocessing.get_context("spawn")
+            failed = []
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(tasks)), mp_context=ctx) as pool:
+                futures = {pool.submit(fn, *args): name for name, fn, args in tasks}
+                for fut in as_completed(futures):
+                    name = futures[fut]
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        result = {"error": str(e)}
+                        failed.append(name)
+                    with self._lock:
+                        job = self._jobs[job_id]
+                        job["models"][name] = result
+                        job["progress"]["done"] += 1
+                    self._write_status(job_id)
+            error = f"{len(failed)} model(s) failed: {', '.join(failed)}" if failed else None
+            status = "failed" if failed else "success"
+            self._update(job_id, status=status, error=error)
+        except Exception as e:
+            print(f"❌ Training job {job_id} failed: {e}")
+            self._update(job_id, status="failed", error=str(e))
+        finally:
+            with self._lock:
+                self._jobs[job_id]["finished"] = _now()
+                self._jobs[job_id]["seconds"] = round(time.perf_counter() - t0, 3)
+                self._active = None
+            self._write_status(job_id)
+            if self.on_complete is not None:
+                self.on_complete(self.get(job_id))
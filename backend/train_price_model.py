@@ -1,43 +1,184 @@
 # backend/train_price_model.py
 # Trains one RandomForestRegressor per commodity using lag features + weather features.
-# Saves models to backend/models/
+# Saves models to backend/models/ through model_store (versioned, compressed, with a manifest)
+# Crops are partitioned in one groupby pass; with workers > 1 their feature matrices are written
+# once to a memory-mapped .npy (in /dev/shm when it has room, else the temp dir; TRAIN_MATRIX_DIR
+# overrides) and fitted across a process pool.
 
-import pandas as pd, joblib
+import os, time, tempfile, multiprocessing
+import numpy as np, pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
 from pathlib import Path
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error
 
-BASE = Path(__file__).resolve().parents[1]
+try:
+    import features, metrics, model_store
+    from data_store import load_table
+except ImportError:  # imported as backend.train_price_model from the repo root
+    from backend import features, metrics, model_store
+    from backend.data_store import load_table
+
+BASE = Path(__file__).resolve().parents[0]
 DATA_DIR = BASE / "data"
 MODELS_DIR = BASE / "models"
 MODELS_DIR.mkdir(exist_ok=True)
 
-def train_all_crops(input_csv=None, n_lags=7):
-    if input_csv is None:
-        input_csv = DATA_DIR / "prices_model_ready.csv"
-    df = pd.read_csv(input_csv, parse_dates=["date"])
+WEATHER_FEATS = ["temp_max", "temp_min", "precip_mm", "wind_speed"]
+RF_PARAMS = {"n_estimators": 200, "random_state": 42}
+MIN_ROWS = 50
+SHM_DIR = "/dev/shm"
+MATRIX_DIR = os.environ.get("TRAIN_MATRIX_DIR") or None
+
+def feature_columns(n_lags=7):
     # features: lag_1..lag_n + weather features
-    lag_cols = [f"lag_{i}" for i in range(1, n_lags+1)]
-    weather_feats = ["temp_max", "temp_min", "precip_mm", "wind_speed"]
-    results = {}
-    for crop in df["commodity"].unique():
-        sub = df[df["commodity"] == crop].dropna(subset=lag_cols + weather_feats + ["price"])
-        if len(sub) < 50:
+    return features.feature_columns(n_lags) + WEATHER_FEATS
+
+def model_path(crop, models_dir=MODELS_DIR):
+    # the manifest names the live version, so it stands for the model as a whole
+    return model_store.manifest_path(models_dir, model_store.price_model_name(crop))
+
+def crop_frames(df, n_lags=7):
+    """Yields (crop, complete training rows) for every commodity with enough data, in one groupby pass."""
+    cols = feature_columns(n_lags)
+    groups = df.groupby("commodity", observed=True, sort=False).indices
+    for crop, idx in groups.items():
+        sub = df.iloc[idx].dropna(subset=cols + ["price"])
+        if len(sub) < MIN_ROWS:
             print(f"Skipping {crop} - not enough rows ({len(sub)})")
             continue
-        X = sub[lag_cols + weather_feats]
-        y = sub["price"]
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-        model = RandomForestRegressor(n_estimators=200, random_state=42, n_jobs=-1)
-        model.fit(X_train, y_train)
-        preds = model.predict(X_test)
-        mae = mean_absolute_error(y_test, preds)
-        print(f"Trained {crop}: MAE = {mae:.2f} ({len(sub)} rows)")
-        joblib.dump(model, MODELS_DIR / f"price_rf_{crop.replace(' ','_')}.joblib")
-        results[crop] = {"mae": mae, "rows": len(sub)}
+        yield crop, sub
+
+def _reset_peak_rss():
+    # Linux: writing 5 to clear_refs resets VmHWM, so the next read is this crop's peak
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    import resource  # not on Windows; ru_maxrss is the process-lifetime peak (KiB on Linux)
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def train_crop(crop, sub, n_lags=7, models_dir=MODELS_DIR, n_jobs=-1):
+    t0 = time.perf_counter()
+    _reset_peak_rss()
+    X = sub[feature_columns(n_lags)]
+    y = sub["price"]
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    model = RandomForestRegressor(**RF_PARAMS, n_jobs=n_jobs)
+    model.fit(X_train, y_train)
+    preds = model.predict(X_test)
+    mae = mean_absolute_error(y_test, preds)
+    print(f"Trained {crop}: MAE = {mae:.2f} ({len(sub)} rows)")
+    model_store.save(model, models_dir, model_store.price_model_name(crop), rows=len(sub), mae=mae,
+                     fingerprint=model_store.data_fingerprint(X, y))
+    return {"mae": mae, "rows": len(sub), "seconds": round(time.perf_counter() - t0, 3), "peak_rss_mb": _peak_rss_mb()}
+
+def matrix_dir(nbytes):
+    """
+    Directory for a memory-mapped matrix of nbytes: TRAIN_MATRIX_DIR if set, else /dev/shm when it
+    has room for it (Docker's default /dev/shm is 64 MB, and overrunning a tmpfs mapping is a
+    SIGBUS, not an error), else the temp dir.
+    """
+    if MATRIX_DIR:
+        return MATRIX_DIR
+    try:
+        st = os.statvfs(SHM_DIR)
+        if st.f_bavail * st.f_frsize >= nbytes + (1 << 20):  # + the .npy header, with slack
+            return SHM_DIR
+    except (AttributeError, OSError):  # no statvfs (Windows) or no /dev/shm
+        pass
+    return tempfile.gettempdir()
+
+@contextmanager
+def mapped_matrix(blocks, n_cols, prefix="matrix_"):
+    """
+    Writes row blocks one after another into a float64 .npy (see matrix_dir) that spawn workers
+    open with np.load(mmap_mode="r"). Yields (path, row bounds); removed on exit.
+    """
+    bounds = np.cumsum([0] + [len(b) for b in blocks])
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix=".npy", dir=matrix_dir(int(bounds[-1]) * n_cols * 8))
+    os.close(fd)
+    try:
+        matrix = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=(int(bounds[-1]), n_cols))
+        for block, start, stop in zip(blocks, bounds[:-1], bounds[1:]):
+            matrix[start:stop] = np.asarray(block, dtype=np.float64)
+        matrix.flush()
+        del matrix
+        yield path, bounds
+    finally:
+        os.remove(path)
+
+def _train_mapped(crop, matrix_path, start, stop, columns, n_lags, models_dir, n_jobs):
+    """Worker: fit one crop from its row range of the shared memory-mapped matrix."""
+    data = np.load(matrix_path, mmap_mode="r")[start:stop]
+    sub = pd.DataFrame(data, columns=columns, copy=False)
+    return train_crop(crop, sub, n_lags, models_dir, n_jobs=n_jobs)
+
+def parallel_plan(n_crops, workers=None, forest_jobs=None):
+    """(crop processes, n_jobs per forest). Defaults split the cores across crops first."""
+    cpus = os.cpu_count() or 1
+    workers = workers or int(os.environ.get("TRAIN_CROP_WORKERS", 0)) or min(cpus, max(n_crops, 1))
+    forest_jobs = forest_jobs or int(os.environ.get("TRAIN_FOREST_JOBS", 0)) or max(1, cpus // workers)
+    return workers, forest_jobs
+
+def train_crops(frames, n_lags=7, models_dir=MODELS_DIR, workers=None, forest_jobs=None):
+    """
+    Fits every (crop, rows) in `frames`. workers=1 fits in this process with n_jobs=forest_jobs;
+    otherwise the rows go to one float64 memory-mapped matrix and crops are fitted in a spawn pool.
+    Models are the same either way (fixed random_state; float32 inputs widen to float64 exactly).
+    Returns {crop: {"mae", "rows", "seconds", "peak_rss_mb"}} in `frames` order.
+    """
+    frames = list(frames)
+    if not frames:
+        return {}
+    workers, forest_jobs = parallel_plan(len(frames), workers, forest_jobs)
+    if workers == 1:
+        return {crop: train_crop(crop, sub, n_lags, models_dir, n_jobs=forest_jobs) for crop, sub in frames}
+
+    columns = feature_columns(n_lags) + ["price"]
+    results = {}
+    with mapped_matrix([sub[columns] for _, sub in frames], len(columns), "price_train_") as (matrix_path, bounds):
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(frames)), mp_context=ctx) as pool:
+            futures = {
+                pool.submit(_train_mapped, crop, matrix_path, int(start), int(stop), columns, n_lags,
+                            str(models_dir), forest_jobs): crop
+                for (crop, _), start, stop in zip(frames, bounds[:-1], bounds[1:])
+            }
+            for fut in as_completed(futures):
+                results[futures[fut]] = fut.result()
+    return {crop: results[crop] for crop, _ in frames}
+
+def train_all_crops(input_csv=None, n_lags=7, workers=None, forest_jobs=None, models_dir=MODELS_DIR):
+    if input_csv is None:
+        input_csv = DATA_DIR / "prices_model_ready.csv"
+    df = load_table(input_csv, copy=False)
+    t0 = time.perf_counter()
+    with metrics.stage("train_all_crops"):
+        results = train_crops(crop_frames(df, n_lags), n_lags, models_dir, workers=workers, forest_jobs=forest_jobs)
+    for res in results.values():
+        # crops may be fitted in pool workers, so their timings are recorded here
+        metrics.STAGE_SECONDS.observe(res["seconds"], "train_crop")
+    print(f"Trained {len(results)} crops in {time.perf_counter() - t0:.1f}s")
     return results
 
 if __name__ == "__main__":
-    res = train_all_crops()
+    import argparse
+    parser = argparse.ArgumentParser(description="Train one price model per commodity")
+    parser.add_argument("--workers", type=int, default=None, help="crops fitted in parallel (TRAIN_CROP_WORKERS)")
+    parser.add_argument("--forest-jobs", type=int, default=None, help="n_jobs inside each forest (TRAIN_FOREST_JOBS)")
+    args = parser.parse_args()
+    res = train_all_crops(workers=args.workers, forest_jobs=args.forest_jobs)
     print("Training complete:", res)
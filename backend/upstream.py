@@ -0,0 +1,202 @@
+# backend/upstream.py
+# Cached client for the third-party APIs behind /api/geocode and /api/weather.
+# Responses are cached per normalized key with a TTL, concurrent misses for the same key share a
+# single upstream call, connections are pooled in one requests.Session, and an expired entry is
+# served (stale-while-revalidate) when the upstream call fails.
+# async_proxy.py serves the same routes from an event loop with the same keys and cache.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import geo_grid
+    import metrics
+except ImportError:  # imported as backend.upstream from the repo root
+    from backend import geo_grid, metrics
+
+NOMINATIM_URL = os.environ.get("GEOCODE_URL", "https://nominatim.openstreetmap.org/search")
+OPEN_METEO_URL = os.environ.get("WEATHER_URL", "https://api.open-meteo.com/v1/forecast")
+GEOCODE_TTL = float(os.environ.get("GEOCODE_TTL", 7 * 24 * 3600))
+WEATHER_TTL = float(os.environ.get("WEATHER_TTL", 3 * 3600))
+STALE_TTL = float(os.environ.get("UPSTREAM_STALE_TTL", 24 * 3600))
+UPSTREAM_TIMEOUT = float(os.environ.get("UPSTREAM_TIMEOUT", 10))
+USER_AGENT = "agro-vision"
+DAILY_PARAMS = "temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max"
+
+
+class UpstreamError(Exception):
+    """Upstream call failed (network error or non-2xx status)."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class TTLCache:
+    """
+    Thread-safe LRU of key -> (value, expires_at). Entries are kept past expiry for
+    `stale_ttl` seconds so they can be served if the upstream is down.
+    """
+
+    def __init__(self, max_entries=10000, stale_ttl=STALE_TTL):
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now=None):
+        """Returns (value, is_fresh), or None if the key is absent or too stale to use."""
+        now = time.time() if now is None else now
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if now > expires + self.stale_ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value, now <= expires
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class CachedUpstream:
+    """
+    `fetch(key, ttl, call)` returns (value, cache_status) where cache_status is one of
+    HIT, MISS, COALESCED (waited on another request's call) or STALE.
+    """
+
+    def __init__(self, cache=None, session=None, pool_size=32):
+        self.cache = cache or TTLCache()
+        self.session = session or make_session(pool_size)
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, key, ttl, call):
+        try:
+            value, status = self._fetch(key, ttl, call)
+        except UpstreamError:
+            metrics.cache_result(service_of(key), "error")
+            raise
+        metrics.cache_result(service_of(key), status.lower())
+        return value, status
+
+    def _fetch(self, key, ttl, call):
+        hit = self.cache.get(key)
+        if hit is not None and hit[1]:
+            return hit[0], "HIT"
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is None:
+                return flight.value, "COALESCED"
+            if hit is not None and isinstance(flight.error, UpstreamError):
+                return hit[0], "STALE"
+            raise flight.error
+        try:
+            with metrics.upstream_call(service_of(key)):
+                flight.value = call(self.session)
+            self.cache.set(key, flight.value, ttl)
+            return flight.value, "MISS"
+        except Exception as e:
+            # recorded whatever it is, so waiting followers re-raise it instead of returning None
+            flight.error = e
+            if hit is not None and isinstance(e, UpstreamError):
+                print(f"⚠️ Upstream failed for {key} ({e}); serving stale response")
+                return hit[0], "STALE"
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+
+def service_of(key):
+    """Metrics label for a cache key: "geocode" or "weather"."""
+    return key.split(":", 1)[0]
+
+
+def make_session(pool_size=32):
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    s.headers["User-Agent"] = USER_AGENT
+    return s
+
+
+def _get_json(session, url, params):
+    try:
+        r = session.get(url, params=params, timeout=UPSTREAM_TIMEOUT)
+    except requests.RequestException as e:
+        raise UpstreamError(str(e))
+    if r.status_code >= 400:
+        raise UpstreamError(f"{url} returned {r.status_code}", status=r.status_code)
+    try:
+        return r.json()
+    except ValueError:
+        raise UpstreamError(f"{url} returned invalid JSON", status=r.status_code)
+
+
+# --------------------------------------------------------------------------------
+# GEOCODE / WEATHER
+# --------------------------------------------------------------------------------
+def geocode_key(q):
+    return "geocode:" + " ".join(q.lower().split())
+
+
+def weather_coords(lat, lon, res=geo_grid.GRID_DEG):
+    """Centre of the weather grid cell holding lat/lon, so nearby requests share a cache entry and a fetch."""
+    _, lat, lon = geo_grid.snap(lat, lon, res)
+    return lat, lon
+
+
+def geocode_request(q):
+    """(cache key, url, params) for a place search; shared with the async proxy."""
+    return geocode_key(q), NOMINATIM_URL, {"q": " ".join(q.split()), "format": "json", "limit": 1}
+
+
+def forecast_request(lat, lon):
+    """(cache key, url, params) for a daily forecast. Raises ValueError on bad coordinates."""
+    lat, lon = weather_coords(lat, lon)
+    params = {"latitude": lat, "longitude": lon, "daily": DAILY_PARAMS, "timezone": "auto"}
+    return f"weather:{lat},{lon}", OPEN_METEO_URL, params
+
+
+def geocode(client, q):
+    key, url, params = geocode_request(q)
+    return client.fetch(key, GEOCODE_TTL, lambda s: _get_json(s, url, params))
+
+
+def forecast(client, lat, lon):
+    key, url, params = forecast_request(lat, lon)
+    return client.fetch(key, WEATHER_TTL, lambda s: _get_json(s, url, params))
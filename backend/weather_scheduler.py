@@ -1,14 +1,67 @@
 import schedule, time, datetime, requests, pandas as pd
+import json, os, random, threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from pathlib import Path
 
+try:
+    from data_store import write_csv_atomic
+    import geo_grid
+except ImportError:  # imported as backend.weather_scheduler from the repo root
+    from backend.data_store import write_csv_atomic
+    from backend import geo_grid
+
 BASE = Path(__file__).resolve().parents[0]
 DATA_DIR = BASE / "data"
 DATA_DIR.mkdir(exist_ok=True)
+REGIONS_FILE = Path(os.environ.get("WEATHER_REGIONS_FILE", BASE / "regions.json"))
+STATUS_FILE = DATA_DIR / "weather_scheduler_status.json"
+FORECAST_URL = os.environ.get("WEATHER_URL", "https://api.open-meteo.com/v1/forecast")
+
+MAX_WORKERS = int(os.environ.get("WEATHER_WORKERS", 8))
+RATE_PER_SEC = float(os.environ.get("WEATHER_RATE_PER_SEC", 5))
+MAX_RETRIES = int(os.environ.get("WEATHER_RETRIES", 3))
+BACKOFF_SEC = float(os.environ.get("WEATHER_BACKOFF_SEC", 1.0))
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Token bucket shared by all worker threads: at most `rate` calls/sec, bursts up to `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
 
-def fetch_weather(lat, lon, region_name="unknown"):
-    """Fetch daily forecast for the past 7 days and next 7 days."""
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def load_regions(path=REGIONS_FILE):
+    """Region list from JSON: [{"name": ..., "lat": ..., "lon": ...}, ...]."""
+    with open(path) as f:
+        regions = json.load(f)
+    for r in regions:
+        r["lat"], r["lon"] = float(r["lat"]), float(r["lon"])
+    return regions
+
+
+def fetch_daily(lat, lon, region_name="unknown", session=None, limiter=None, retries=MAX_RETRIES):
+    """Daily forecast for the past 7 days and next 7 days as a DataFrame (date, temp_max, ...)."""
     print(f"Fetching weather for {region_name} ({lat},{lon})")
-    url = "https://api.open-meteo.com/v1/forecast"
     params = {
         "latitude": lat,
         "longitude": lon,
@@ -17,27 +70,111 @@ def fetch_weather(lat, lon, region_name="unknown"):
         "forecast_days": 7,
         "timezone": "auto"
     }
-    r = requests.get(url, params=params, timeout=15)
-    r.raise_for_status()
+    http = session or requests
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            r = http.get(FORECAST_URL, params=params, timeout=15)
+            if r.status_code in RETRY_STATUS and attempt < retries:
+                raise requests.HTTPError(f"{r.status_code} from upstream", response=r)
+            r.raise_for_status()
+            break
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+            status = e.response.status_code if getattr(e, "response", None) is not None else None
+            if attempt >= retries or (status is not None and status not in RETRY_STATUS):
+                raise
+            delay = BACKOFF_SEC * (2 ** attempt) * (0.5 + random.random())
+            print(f"⚠️ {region_name}: {e} — retrying in {delay:.1f}s")
+            time.sleep(delay)
     j = r.json()
     daily = j["daily"]
-    df = pd.DataFrame({
-        "region": region_name,
+    return pd.DataFrame({
         "date": pd.to_datetime(daily["time"]),
         "temp_max": daily["temperature_2m_max"],
         "temp_min": daily["temperature_2m_min"],
         "precip_mm": daily["precipitation_sum"],
         "wind_speed": daily["windspeed_10m_max"],
     })
+
+
+def save_region_weather(df, region_name):
     path = DATA_DIR / f"weather_{region_name}.csv"
-    df.to_csv(path, index=False)
+    # atomic, so retrain_scheduler's weather_*.csv glob never sees a half-written file
+    out = df.copy()
+    out.insert(0, "region", region_name)
+    write_csv_atomic(out, path)
     print(f"✅ Weather saved to {path}")
+    return len(df)
+
+
+def fetch_weather(lat, lon, region_name="unknown", session=None, limiter=None, retries=MAX_RETRIES):
+    """Fetch and store one region's weather. Returns the number of rows written."""
+    return save_region_weather(fetch_daily(lat, lon, region_name, session, limiter, retries), region_name)
+
+
+def _fetch_cell(cell, members, session, limiter):
+    """One upstream call at the grid cell's centre, written out for every region in the cell."""
+    t0 = time.perf_counter()
+    names = members["member"].tolist()
+    stats = {n: {"lat": float(la), "lon": float(lo), "cell": cell}
+             for n, la, lo in zip(names, members["lat"], members["lon"])}
+    try:
+        df = fetch_daily(float(members["cell_lat"].iloc[0]), float(members["cell_lon"].iloc[0]), "/".join(names),
+                         session=session, limiter=limiter)
+        for n in names:
+            stats[n].update(rows=save_region_weather(df, n), status="success")
+    except Exception as e:
+        print(f"❌ Weather fetch failed for {', '.join(names)}: {e}")
+        for n in names:
+            stats[n].update(status="failed", error=str(e), rows=0)
+    for n in names:
+        stats[n]["latency_sec"] = round(time.perf_counter() - t0, 3)
+    return stats
+
+
+def write_status(status, path=STATUS_FILE):
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(status, f, indent=2)
+    os.replace(tmp, path)
+
 
 # --- Schedule updates ---
-def job():
-    fetch_weather(19.0760, 72.8777, "mumbai")
-    fetch_weather(26.8467, 80.9462, "lucknow")
-    fetch_weather(23.2599, 77.4126, "bhopal")
+def job(regions=None, max_workers=MAX_WORKERS, rate_per_sec=RATE_PER_SEC, grid_deg=geo_grid.GRID_DEG):
+    """
+    Fetch all configured regions concurrently and record per-region results. Regions in the same
+    weather grid cell (geo_grid) share one upstream call.
+    """
+    regions = regions if regions is not None else load_regions()
+    index = geo_grid.GridIndex(pd.DataFrame({
+        "member": [r["name"] for r in regions], "kind": "region",
+        "lat": [r["lat"] for r in regions], "lon": [r["lon"] for r in regions]}), res=grid_deg)
+    cells = list(index.table.groupby("cell", sort=False))
+    limiter = RateLimiter(rate_per_sec)
+    started = datetime.datetime.now()
+    t0 = time.perf_counter()
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    with session, ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="weather") as pool:
+        results = {}
+        for stats in pool.map(lambda c: _fetch_cell(c[0], c[1], session, limiter), cells):
+            results.update(stats)
+    ok = sum(1 for s in results.values() if s["status"] == "success")
+    status = {
+        "last_run": started.strftime("%Y-%m-%d %H:%M:%S"),
+        "seconds": round(time.perf_counter() - t0, 3),
+        "regions_ok": ok,
+        "regions_failed": len(results) - ok,
+        "cells": len(cells),
+        "rows": sum(s["rows"] for s in results.values()),
+        "regions": results,
+    }
+    write_status(status)
+    print(f"🌤 Weather cycle done: {ok}/{len(results)} regions ({len(cells)} upstream cells) in {status['seconds']}s")
+    return status
 
 if __name__ == "__main__":
     job()  # run once immediately
@@ -45,4 +182,4 @@ if __name__ == "__main__":
     print("🌤 Weather scheduler running...")
     while True:
         schedule.run_pending()
-        time.sleep(60)
+        time.sleep(60)
\ No newline at end of file
@@ -0,0 +1,14 @@
+# backend/wsgi.py
+# Production entry point:  gunicorn -c gunicorn.conf.py wsgi:app   (run from backend/)
+# With preload_app (see gunicorn.conf.py) this module is imported once in the master, so models and
+# tables are loaded before the workers are forked and every worker starts ready.
+
+import gc
+
+from app import create_app
+
+app = create_app(warm=True)
+
+# move everything loaded so far out of the GC's reach, so collections in the workers don't
+# write to (and un-share) the pages inherited from the master
+gc.freeze()
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer } from "recharts";
 import { Card, CardContent, Typography } from "@mui/material";
 import axios from "axios";
@@ -6,13 +6,28 @@ import axios from "axios";
 export default function PriceChart({ crop }) {
   const [data, setData] = useState([]);
 
+  const etag = useRef(null);
+
   useEffect(() => {
-    axios.get("http://127.0.0.1:5000/api/prices")
-      .then(res => {
-        const formatted = res.data.map((p, i) => ({ day: `Day ${i + 1}`, price: p }));
-        setData(formatted);
-      });
-  }, []);
+    etag.current = null;
+    // poll with If-None-Match so unchanged series come back as an empty 304
+    const load = () =>
+      axios.get("http://127.0.0.1:5000/api/prices/series", {
+        params: { crop, points: 300 },
+        headers: etag.current ? { "If-None-Match": etag.current } : {},
+        validateStatus: s => s === 200 || s === 304,
+      })
+        .then(res => {
+          if (res.status === 304) return;
+          etag.current = res.headers.etag || null;
+          setData(res.data.points.map(p => ({ day: p.date, price: p.price })));
+        })
+        .catch(err => console.error(err));
+
+    load();
+    const interval = setInterval(load, 60000);
+    return () => clearInterval(interval);
+  }, [crop]);
 
   return (
     <Card sx={{ boxShadow: 3, borderRadius: 3 }}>
@@ -1,4 +1,4 @@
-import React, { useState } from "react";
+import React, { useEffect, useState } from "react";
 import {
   BarChart,
   Bar,
@@ -9,11 +9,22 @@ import {
   ResponsiveContainer,
   Legend,
 } from "recharts";
+import { getSupplySummary } from "./api";
 
 export default function SupplyAnalytics({ city }) {
   const [allocations, setAllocations] = useState([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  const [summary, setSummary] = useState(null);
+
+  const loadSummary = () =>
+    getSupplySummary()
+      .then(setSummary)
+      .catch((e) => console.error(e));
+
+  useEffect(() => {
+    loadSummary();
+  }, []);
 
   const fetchSupplyData = async () => {
     if (!city) {
@@ -23,6 +34,7 @@ export default function SupplyAnalytics({ city }) {
 
     setLoading(true);
     setError(null);
+    loadSummary();
 
     try {
       const response = await fetch("http://127.0.0.1:5000/api/supply", {
@@ -95,6 +107,32 @@ export default function SupplyAnalytics({ city }) {
         🔄 {loading ? "Loading..." : "Refresh Live Data"}
       </button>
 
+      {summary && (
+        <div style={{ display: "flex", gap: 24, flexWrap: "wrap", marginBottom: 12 }}>
+          <div>
+            <b>{summary.capacity.toLocaleString()}</b> capacity
+          </div>
+          <div>
+            <b>{summary.demand.toLocaleString()}</b> demand
+          </div>
+          <div>
+            🔴 <b>{summary.deficit_regions}</b> regions in deficit (
+            {summary.shortfall.toLocaleString()} short)
+          </div>
+          <div>
+            🟢 <b>{summary.surplus_regions}</b> regions in surplus
+          </div>
+          {summary.top_deficits.length > 0 && (
+            <div className="small">
+              Worst:{" "}
+              {summary.top_deficits
+                .map((r) => `${r.region} (−${r.deficit.toLocaleString()})`)
+                .join(", ")}
+            </div>
+          )}
+        </div>
+      )}
+
       {error && (
         <div
           style={{
@@ -1,13 +1,13 @@
 import React, { useEffect, useState } from "react";
 import { Card, CardContent, Typography } from "@mui/material";
-import axios from "axios";
+import { fetchWeather } from "./api";
 
 export default function WeatherPanel({ lat = 19.076, lon = 72.8777 }) {
   const [weather, setWeather] = useState(null);
 
   useEffect(() => {
-    axios.get(`http://127.0.0.1:5000/api/weather?lat=${lat}&lon=${lon}`)
-      .then(res => setWeather(res.data.daily))
+    fetchWeather(lat, lon)
+      .then(data => setWeather(data.daily))
       .catch(() => setWeather(null));
   }, [lat, lon]);
 
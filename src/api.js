@@ -1,14 +1,16 @@
 import axios from 'axios';
 const API_BASE = 'http://127.0.0.1:5000';
+// geocode/weather can be served by backend/async_proxy.py; defaults to the Flask app
+const PROXY_BASE = process.env.REACT_APP_PROXY_BASE || API_BASE;
 
 export async function geocodeCity(city){
-  const res = await axios.get(`${API_BASE}/api/geocode`, { params: { q: city } });
+  const res = await axios.get(`${PROXY_BASE}/api/geocode`, { params: { q: city } });
   if(res.data && res.data.length>0) return res.data[0];
   return null;
 }
 
 export async function fetchWeather(lat, lon){
-  const res = await axios.get(`${API_BASE}/api/weather`, { params: { lat, lon } });
+  const res = await axios.get(`${PROXY_BASE}/api/weather`, { params: { lat, lon } });
   return res.data;
 }
 
@@ -22,8 +24,13 @@ export async function predictPrice(crop, recent_prices, weather){
   return res.data;
 }
 
-export async function getRecentPrices(crop){
-  const res = await axios.get(`${API_BASE}/api/prices`);
+export async function forecastPrice(crop, recent_prices, weather, horizon = 7, interval = true){
+  const res = await axios.post(`${API_BASE}/api/forecast/price`, { crop, recent_prices, weather, horizon, interval });
+  return res.data.results[0];
+}
+
+export async function getRecentPrices(crop, limit = 7){
+  const res = await axios.get(`${API_BASE}/api/prices`, { params: { crop, limit } });
   return res.data;
 }
 
@@ -42,3 +49,8 @@ export async function getSupplyAllocations(demand) {
   if (!res.ok) throw new Error("Failed to fetch supply allocation");
   return await res.json();
 }
+
+export async function getSupplySummary(top = 5){
+  const res = await axios.get(`${API_BASE}/api/supply/summary`, { params: { top } });
+  return res.data;
+}
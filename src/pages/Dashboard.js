@@ -36,10 +36,10 @@ export default function Dashboard({ user }) {
 
   useEffect(() => {
     (async () => {
-      const r = await getRecentPrices("wheat");
+      const r = await getRecentPrices(crop);
       setRecent(r || []);
     })();
-  }, []);
+  }, [crop]);
 
   const handlePredict = async () => {
     setLoading(true);